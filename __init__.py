@@ -1,16 +1,19 @@
 from .node import NODE_CLASS_MAPPINGS as BASE_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as BASE_DISPLAY_MAPPINGS
 from .power_lora_loader import NODE_CLASS_MAPPINGS as LOADER_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LOADER_DISPLAY_MAPPINGS
 from .power_lora_stacker import NODE_CLASS_MAPPINGS as STACKER_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as STACKER_DISPLAY_MAPPINGS
+from .power_lora_baker import NODE_CLASS_MAPPINGS as BAKER_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as BAKER_DISPLAY_MAPPINGS
 
-# 导入 API 模块，使其在启动时注册路由
+# 注册 API 路由（处理函数在首次请求时才导入 lora_api）
 try:
-    from . import lora_api
+    from . import lora_routes
 except Exception as e:
-    print(f"[Easy Setting Pipes] Failed to import lora_api: {e}")
+    print(f"[Easy Setting Pipes] Failed to import lora_routes: {e}")
 
 # 合并所有节点映射
-NODE_CLASS_MAPPINGS = {**BASE_MAPPINGS, **LOADER_MAPPINGS, **STACKER_MAPPINGS}
-NODE_DISPLAY_NAME_MAPPINGS = {**BASE_DISPLAY_MAPPINGS, **LOADER_DISPLAY_MAPPINGS, **STACKER_DISPLAY_MAPPINGS}
+NODE_CLASS_MAPPINGS = {**BASE_MAPPINGS, **LOADER_MAPPINGS, **STACKER_MAPPINGS, **BAKER_MAPPINGS}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    **BASE_DISPLAY_MAPPINGS, **LOADER_DISPLAY_MAPPINGS, **STACKER_DISPLAY_MAPPINGS, **BAKER_DISPLAY_MAPPINGS
+}
 
 # 导出必要的映射，让 ComfyUI 能够识别自定义节点
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS"]
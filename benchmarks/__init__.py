@@ -0,0 +1,6 @@
+"""
+离线基准测试 - 在没有完整 ComfyUI 环境的情况下测量节点和 API 的热点路径
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.run --output bench_results.json
+"""
@@ -0,0 +1,361 @@
+"""
+ComfyUI 模块的轻量替身
+
+提供 folder_paths、comfy.utils、comfy.sd、comfy.lora、comfy.samplers、nodes
+和 server.PromptServer 的最小实现，使插件可以脱离 ComfyUI 导入和计时。
+替身的行为尽量贴近 ComfyUI 的真实实现（例如 load_lora_for_models 会遍历
+模型的全部 state dict key 构建映射），以便基准结果有参考意义。
+"""
+
+import os
+import sys
+import types
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from .fixtures import read_safetensors
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "easy_setting_pipes"
+
+SUPPORTED_PT_EXTENSIONS = {'.ckpt', '.pt', '.pt2', '.bin', '.pth', '.safetensors', '.pkl', '.sft'}
+
+
+# ===== 模型替身 =====
+
+class FakeDiffusionModel:
+    """只有 state dict key 的扩散模型替身"""
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        self._state_dict = dict.fromkeys(keys)
+
+    def state_dict(self) -> Dict[str, Any]:
+        return self._state_dict
+
+
+class FakeModelPatcher:
+    """ModelPatcher 替身：记录补丁但不做张量运算"""
+
+    def __init__(self, model: Any, patches: Optional[Dict[str, Any]] = None) -> None:
+        self.model = model
+        self.patches = patches or {}
+
+    def clone(self) -> "FakeModelPatcher":
+        return self.__class__(self.model, dict(self.patches))
+
+    def add_patches(self, patches: Dict[str, Any], strength: float = 1.0) -> List[str]:
+        keys = self.model.state_dict()
+        added = []
+        for key, patch in patches.items():
+            if key in keys:
+                self.patches.setdefault(key, []).append((strength, patch))
+                added.append(key)
+        return added
+
+
+class FakeClip:
+    """CLIP 替身，cond_stage_model 同样只有 state dict key"""
+
+    def __init__(self, cond_stage_model: Any, patcher: Optional[FakeModelPatcher] = None) -> None:
+        self.cond_stage_model = cond_stage_model
+        self.patcher = patcher or FakeModelPatcher(cond_stage_model)
+
+    def clone(self) -> "FakeClip":
+        return self.__class__(self.cond_stage_model, self.patcher.clone())
+
+    def add_patches(self, patches: Dict[str, Any], strength: float = 1.0) -> List[str]:
+        return self.patcher.add_patches(patches, strength)
+
+
+def make_unet_keys(count: int) -> List[str]:
+    """生成 count 个类似 SD UNet 的权重 key"""
+    keys = []
+    block = 0
+    while len(keys) < count:
+        for layer in ("to_q", "to_k", "to_v", "to_out.0", "ff.net.0.proj", "ff.net.2"):
+            prefix = f"diffusion_model.blocks.{block}.attn.{layer}"
+            keys.append(f"{prefix}.weight")
+            keys.append(f"{prefix}.bias")
+        block += 1
+    return keys[:count]
+
+
+def make_clip_keys(count: int) -> List[str]:
+    """生成 count 个类似 CLIP-L 的权重 key"""
+    keys = []
+    layer = 0
+    while len(keys) < count:
+        for proj in ("q_proj", "k_proj", "v_proj", "out_proj"):
+            prefix = f"clip_l.transformer.text_model.encoder.layers.{layer}.self_attn.{proj}"
+            keys.append(f"{prefix}.weight")
+            keys.append(f"{prefix}.bias")
+        layer += 1
+    return keys[:count]
+
+
+def make_model(unet_keys: int = 5000, clip_keys: int = 800):
+    """创建 (model, clip) 替身"""
+    model = FakeModelPatcher(FakeDiffusionModel(make_unet_keys(unet_keys)))
+    clip = FakeClip(FakeDiffusionModel(make_clip_keys(clip_keys)))
+    return model, clip
+
+
+def unet_lora_name(key: str) -> str:
+    """diffusion_model.xxx.weight -> lora_unet_xxx"""
+    return "lora_unet_" + key[len("diffusion_model."):-len(".weight")].replace(".", "_")
+
+
+def clip_lora_name(key: str) -> str:
+    """clip_l.transformer.text_model.xxx.weight -> lora_te_text_model_xxx"""
+    return "lora_te_" + key[len("clip_l.transformer."):-len(".weight")].replace(".", "_")
+
+
+# ===== comfy.lora 替身（与 ComfyUI 的实现结构一致） =====
+
+def model_lora_keys_unet(model: Any, key_map: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    if key_map is None:
+        key_map = {}
+    for key in model.state_dict().keys():
+        if key.startswith("diffusion_model.") and key.endswith(".weight"):
+            key_map[unet_lora_name(key)] = key
+            key_map[key[:-len(".weight")]] = key
+    return key_map
+
+
+def model_lora_keys_clip(model: Any, key_map: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    if key_map is None:
+        key_map = {}
+    for key in model.state_dict().keys():
+        if key.startswith("clip_l.transformer.") and key.endswith(".weight"):
+            key_map[clip_lora_name(key)] = key
+    return key_map
+
+
+def load_lora(lora: Dict[str, Any], to_load: Dict[str, str], log_missing: bool = True) -> Dict[str, Any]:
+    patch_dict = {}
+    for lora_key, model_key in to_load.items():
+        up = lora.get(f"{lora_key}.lora_up.weight")
+        down = lora.get(f"{lora_key}.lora_down.weight")
+        if up is not None and down is not None:
+            patch_dict[model_key] = ("lora", (up, down, lora.get(f"{lora_key}.alpha"), None, None, None))
+    return patch_dict
+
+
+# ===== comfy.sd 替身 =====
+
+def load_lora_for_models(model, clip, lora, strength_model, strength_clip):
+    comfy_lora = sys.modules["comfy.lora"]
+    key_map = {}
+    if model is not None:
+        key_map = comfy_lora.model_lora_keys_unet(model.model, key_map)
+    if clip is not None:
+        key_map = comfy_lora.model_lora_keys_clip(clip.cond_stage_model, key_map)
+
+    lora = sys.modules["comfy.lora_convert"].convert_lora(lora)
+    loaded = comfy_lora.load_lora(lora, key_map)
+    if model is not None:
+        new_modelpatcher = model.clone()
+        new_modelpatcher.add_patches(loaded, strength_model)
+    else:
+        new_modelpatcher = None
+
+    if clip is not None:
+        new_clip = clip.clone()
+        new_clip.add_patches(loaded, strength_clip)
+    else:
+        new_clip = None
+
+    return (new_modelpatcher, new_clip)
+
+
+# ===== comfy.utils 替身 =====
+
+def load_torch_file(ckpt: str, safe_load: bool = False, device: Any = None, return_metadata: bool = False):
+    """读取 safetensors 文件；安装了 torch + safetensors 时返回真实张量"""
+    try:
+        import safetensors.torch
+        state_dict = safetensors.torch.load_file(ckpt)
+        metadata = None
+        if return_metadata:
+            metadata = read_safetensors(ckpt)[1]
+    except ImportError:
+        state_dict, metadata = read_safetensors(ckpt)
+    if return_metadata:
+        return state_dict, metadata
+    return state_dict
+
+
+# ===== folder_paths 替身 =====
+
+def _make_folder_paths(lora_dirs: List[str], user_dir: str) -> types.ModuleType:
+    module = types.ModuleType("folder_paths")
+    module.supported_pt_extensions = set(SUPPORTED_PT_EXTENSIONS)
+    module.folder_names_and_paths = {"loras": (list(lora_dirs), set(SUPPORTED_PT_EXTENSIONS))}
+
+    def get_folder_paths(folder_name: str) -> List[str]:
+        return module.folder_names_and_paths[folder_name][0][:]
+
+    def get_filename_list(folder_name: str) -> List[str]:
+        paths, extensions = module.folder_names_and_paths[folder_name]
+        result = set()
+        for root in paths:
+            for dirpath, _, filenames in os.walk(root, followlinks=True):
+                for filename in filenames:
+                    if os.path.splitext(filename)[1].lower() in extensions:
+                        result.add(os.path.relpath(os.path.join(dirpath, filename), root))
+        return sorted(result)
+
+    def get_full_path(folder_name: str, filename: str) -> Optional[str]:
+        for root in module.folder_names_and_paths[folder_name][0]:
+            full_path = os.path.join(root, os.path.normpath(filename))
+            if os.path.isfile(full_path):
+                return full_path
+        return None
+
+    def get_full_path_or_raise(folder_name: str, filename: str) -> str:
+        full_path = get_full_path(folder_name, filename)
+        if full_path is None:
+            raise FileNotFoundError(f"Model in folder '{folder_name}' with filename '{filename}' not found.")
+        return full_path
+
+    module.get_folder_paths = get_folder_paths
+    module.get_filename_list = get_filename_list
+    module.get_full_path = get_full_path
+    module.get_full_path_or_raise = get_full_path_or_raise
+    module.get_user_directory = lambda: user_dir
+    module.get_temp_directory = lambda: os.path.join(user_dir, "temp")
+    return module
+
+
+# ===== server.PromptServer 替身 =====
+
+class _RecordingRoutes:
+    """未安装 aiohttp 时使用的路由表，只记录注册的处理函数"""
+
+    def __init__(self) -> None:
+        self.routes: List[Any] = []
+
+    def _register(self, method: str, path: str):
+        def decorator(handler):
+            self.routes.append((method, path, handler))
+            return handler
+        return decorator
+
+    def get(self, path: str, **kwargs):
+        return self._register("GET", path)
+
+    def post(self, path: str, **kwargs):
+        return self._register("POST", path)
+
+    def delete(self, path: str, **kwargs):
+        return self._register("DELETE", path)
+
+    def __iter__(self):
+        return iter(self.routes)
+
+
+def _make_server() -> types.ModuleType:
+    module = types.ModuleType("server")
+    try:
+        from aiohttp import web
+        routes = web.RouteTableDef()
+    except ImportError:
+        routes = _RecordingRoutes()
+
+    class PromptServer:
+        instance: "PromptServer"
+
+        def __init__(self) -> None:
+            self.routes = routes
+
+    PromptServer.instance = PromptServer()
+    module.PromptServer = PromptServer
+    return module
+
+
+def install_stubs(lora_dirs: List[str], user_dir: str) -> None:
+    """
+    安装全部 ComfyUI 模块替身
+
+    Args:
+        lora_dirs: 作为 loras 模型目录的路径列表
+        user_dir: folder_paths.get_user_directory() 返回的目录
+    """
+    comfy = types.ModuleType("comfy")
+    comfy.__path__ = []
+
+    comfy_utils = types.ModuleType("comfy.utils")
+    comfy_utils.load_torch_file = load_torch_file
+
+    comfy_lora = types.ModuleType("comfy.lora")
+    comfy_lora.model_lora_keys_unet = model_lora_keys_unet
+    comfy_lora.model_lora_keys_clip = model_lora_keys_clip
+    comfy_lora.load_lora = load_lora
+
+    comfy_lora_convert = types.ModuleType("comfy.lora_convert")
+    comfy_lora_convert.convert_lora = lambda sd: sd
+
+    comfy_sd = types.ModuleType("comfy.sd")
+    comfy_sd.load_lora_for_models = load_lora_for_models
+
+    comfy_samplers = types.ModuleType("comfy.samplers")
+
+    class KSampler:
+        SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2m", "dpmpp_sde"]
+        SCHEDULERS = ["normal", "karras", "exponential", "simple"]
+
+    comfy_samplers.KSampler = KSampler
+
+    for name, module in (
+        ("utils", comfy_utils), ("lora", comfy_lora), ("lora_convert", comfy_lora_convert),
+        ("sd", comfy_sd), ("samplers", comfy_samplers),
+    ):
+        setattr(comfy, name, module)
+        sys.modules[f"comfy.{name}"] = module
+    sys.modules["comfy"] = comfy
+
+    nodes = types.ModuleType("nodes")
+    nodes.MAX_RESOLUTION = 16384
+    sys.modules["nodes"] = nodes
+
+    sys.modules["folder_paths"] = _make_folder_paths(lora_dirs, user_dir)
+    sys.modules["server"] = _make_server()
+
+
+def load_package(name: str = PACKAGE_NAME) -> types.ModuleType:
+    """
+    以包的形式导入插件（仓库目录名可能不是合法的模块名）
+
+    必须在 install_stubs 之后调用。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(REPO_ROOT, "__init__.py"), submodule_search_locations=[REPO_ROOT]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_submodule(name: str, package: str = PACKAGE_NAME) -> Optional[types.ModuleType]:
+    """导入插件子模块，依赖缺失时返回 None"""
+    try:
+        return importlib.import_module(f"{package}.{name}")
+    except ImportError:
+        return None
+
+
+@asynccontextmanager
+async def app_client() -> AsyncIterator[Any]:
+    """挂载插件全部路由（PromptServer 替身）的 aiohttp 测试客户端，必须在 load_package 之后使用"""
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from server import PromptServer
+
+    app = web.Application()
+    app.add_routes(PromptServer.instance.routes)
+    async with TestClient(TestServer(app)) as client:
+        yield client
@@ -0,0 +1,215 @@
+"""
+本地 Civitai 替身服务器
+
+实现 /api/v1/model-versions/by-hash/{hash}、示例图片（/images/...）和重定向（/redirect?to=地址），
+记录收到的请求数和连接数，
+可配置响应延迟和失败率，用于在离线环境下测试请求合并、限流、重试和缩略图代理。
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .fixtures import make_png
+
+BY_HASH_PATH = "/api/v1/model-versions/by-hash"
+IMAGES_PATH = "/images"
+REDIRECT_PATH = "/redirect"
+FAKE_IMAGE_BASE = "https://image.civitai.com/fake"
+
+
+def make_model_version(file_hash: str, image_base: str = FAKE_IMAGE_BASE) -> Dict[str, Any]:
+    """生成与 Civitai 返回格式一致的模型版本数据"""
+    short = file_hash[:8]
+    return {
+        "id": int(short, 16) % 100000,
+        "modelId": int(short, 16) % 10000,
+        "name": f"v{short}",
+        "baseModel": "SDXL 1.0",
+        "trainedWords": [f"trigger_{short}", "style word"],
+        "model": {"name": f"Model {short}", "type": "LORA"},
+        "files": [{"hashes": {"SHA256": file_hash.upper()}}],
+        "images": [
+            {
+                "url": f"{image_base}/{short}/{i}.png",
+                "type": "image",
+                "width": 832,
+                "height": 1216,
+                "meta": {"seed": i, "prompt": "a prompt", "steps": 20, "cfgScale": 7},
+            }
+            for i in range(3)
+        ],
+    }
+
+
+class FakeCivitaiServer:
+    """
+    在后台线程运行的 Civitai 替身
+
+    Args:
+        delay: 每个请求的响应延迟（秒）
+        failure_rate: 返回 500 的概率
+        known_hashes: 只对这些哈希返回数据（None 表示全部已知），其余返回 404
+        image_size: 示例图片的 (宽, 高)，返回数据中的图片地址指向本服务器
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        failure_rate: float = 0.0,
+        known_hashes: Optional[List[str]] = None,
+        seed: int = 0,
+        image_size: Tuple[int, int] = (768, 1152)
+    ) -> None:
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.known_hashes = {h.lower() for h in known_hashes} if known_hashes is not None else None
+        self.image_size = image_size
+        self.requests: List[str] = []
+        self.connections = 0
+        self._images: Dict[str, bytes] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def request_count(self) -> int:
+        with self._lock:
+            return len(self.requests)
+
+    @property
+    def connection_count(self) -> int:
+        with self._lock:
+            return self.connections
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def by_hash_url(self) -> str:
+        return self.base_url + BY_HASH_PATH
+
+    @property
+    def image_base(self) -> str:
+        return self.base_url + IMAGES_PATH
+
+    def _lookup(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        file_hash = file_hash.lower()
+        if self.known_hashes is not None and file_hash not in self.known_hashes:
+            return None
+        return make_model_version(file_hash, self.image_base)
+
+    def _image(self, path: str) -> bytes:
+        with self._lock:
+            data = self._images.get(path)
+            if data is None:
+                data = make_png(*self.image_size, seed=len(self._images))
+                self._images[path] = data
+            return data
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.failure_rate
+
+    def start(self) -> "FakeCivitaiServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 头和正文分两次写出，keep-alive 连接上 Nagle 与延迟 ACK 会让每个请求多等约 40 ms
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def _send(self, status: int, payload: Any) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _record(self) -> bool:
+                with fake._lock:
+                    fake.requests.append(f"{self.command} {self.path}")
+                if fake.delay:
+                    time.sleep(fake.delay)
+                if fake._should_fail():
+                    self._send(500, {"error": "Internal Server Error"})
+                    return False
+                return True
+
+            def do_GET(self) -> None:
+                if not self._record():
+                    return
+                if self.path.startswith(IMAGES_PATH + "/"):
+                    body = fake._image(self.path)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/png")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                parts = urlsplit(self.path)
+                if parts.path == REDIRECT_PATH:
+                    self.send_response(302)
+                    self.send_header("Location", parse_qs(parts.query).get("to", ["/"])[0])
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if not self.path.startswith(BY_HASH_PATH + "/"):
+                    self._send(404, {"error": "Not found"})
+                    return
+                data = fake._lookup(self.path[len(BY_HASH_PATH) + 1:])
+                if data is None:
+                    self._send(404, {"error": "Model not found"})
+                else:
+                    self._send(200, data)
+
+            def do_POST(self) -> None:
+                # 批量查询：POST /api/v1/model-versions/by-hash，请求体为哈希数组
+                length = int(self.headers.get("Content-Length", 0))
+                payload = self.rfile.read(length)
+                if not self._record():
+                    return
+                if self.path != BY_HASH_PATH:
+                    self._send(404, {"error": "Not found"})
+                    return
+                try:
+                    hashes = json.loads(payload)
+                except ValueError:
+                    self._send(400, {"error": "Invalid body"})
+                    return
+                results = [data for data in map(fake._lookup, hashes) if data is not None]
+                self._send(200, results)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeCivitaiServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
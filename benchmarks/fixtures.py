@@ -0,0 +1,200 @@
+"""
+合成的 safetensors LoRA 测试数据
+
+只依赖标准库：张量数据用 struct 打包，不需要 torch / numpy。
+"""
+
+import os
+import json
+import random
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+# safetensors dtype -> (struct 格式字符, 每个元素字节数)
+DTYPES = {
+    "F32": ("f", 4),
+    "F16": ("e", 2),
+}
+
+
+def pack_tensor(values: List[float], dtype: str = "F32") -> bytes:
+    fmt, _ = DTYPES[dtype]
+    return struct.pack(f"<{len(values)}{fmt}", *values)
+
+
+def write_safetensors(
+    path: str,
+    tensors: Dict[str, Tuple[str, List[int], bytes]],
+    metadata: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    写入 safetensors 文件
+
+    Args:
+        path: 输出路径
+        tensors: name -> (dtype, shape, 原始字节)
+        metadata: __metadata__ 字段（值必须是字符串）
+    """
+    header: Dict[str, Any] = {}
+    if metadata:
+        header["__metadata__"] = metadata
+    offset = 0
+    for name, (dtype, shape, data) in tensors.items():
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [offset, offset + len(data)]}
+        offset += len(data)
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # 头部按 8 字节对齐
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, _, data in tensors.values():
+            f.write(data)
+
+
+def read_safetensors(path: str) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+    """读取 safetensors 文件，返回 (name -> 原始字节, 元数据)"""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        data = f.read()
+    metadata = header.pop("__metadata__", {}) or {}
+    tensors = {
+        name: data[info["data_offsets"][0]:info["data_offsets"][1]]
+        for name, info in header.items()
+    }
+    return tensors, metadata
+
+
+def make_tag_frequency(tag_count: int, buckets: int = 2, seed: int = 0) -> Dict[str, Dict[str, int]]:
+    """生成 kohya 风格的 ss_tag_frequency"""
+    rng = random.Random(seed)
+    result: Dict[str, Dict[str, int]] = {}
+    for bucket in range(buckets):
+        tags = {}
+        for i in range(tag_count):
+            # 让不同 bucket 有部分重叠的标签
+            if rng.random() < 0.7:
+                tags[f"tag_{i}"] = rng.randint(1, 500)
+        result[f"{bucket + 1}_dataset"] = tags
+    return result
+
+
+def make_lora_tensors(
+    lora_names: List[str],
+    rank: int = 4,
+    dim: int = 32,
+    dtype: str = "F32",
+    seed: int = 0
+) -> Dict[str, Tuple[str, List[int], bytes]]:
+    """
+    为给定的 lora key 名称生成 kohya 格式的 up/down/alpha 张量
+
+    Args:
+        lora_names: 如 "lora_unet_blocks_0_attn_to_q"
+        rank: LoRA 秩
+        dim: 输入/输出维度（合成数据使用方阵）
+    """
+    rng = random.Random(seed)
+    tensors: Dict[str, Tuple[str, List[int], bytes]] = {}
+    for name in lora_names:
+        down = [rng.uniform(-0.1, 0.1) for _ in range(rank * dim)]
+        up = [rng.uniform(-0.1, 0.1) for _ in range(dim * rank)]
+        tensors[f"{name}.lora_down.weight"] = (dtype, [rank, dim], pack_tensor(down, dtype))
+        tensors[f"{name}.lora_up.weight"] = (dtype, [dim, rank], pack_tensor(up, dtype))
+        tensors[f"{name}.alpha"] = ("F32", [], pack_tensor([float(rank)], "F32"))
+    return tensors
+
+
+def write_lora(
+    path: str,
+    lora_names: List[str],
+    tag_count: int = 0,
+    rank: int = 4,
+    dim: int = 32,
+    seed: int = 0,
+    extra_metadata: Optional[Dict[str, str]] = None
+) -> str:
+    """写入一个合成 LoRA 文件，返回路径"""
+    metadata = {
+        "ss_output_name": os.path.splitext(os.path.basename(path))[0],
+        "ss_base_model_version": "sdxl_base_v1-0",
+        "ss_clip_skip": "2",
+    }
+    if tag_count:
+        metadata["ss_tag_frequency"] = json.dumps(make_tag_frequency(tag_count, seed=seed))
+    if extra_metadata:
+        metadata.update(extra_metadata)
+    write_safetensors(path, make_lora_tensors(lora_names, rank=rank, dim=dim, seed=seed), metadata)
+    return path
+
+
+def write_large_lora(path: str, size_mb: int, tensor_mb: int = 4, seed: int = 0) -> str:
+    """写入指定大小的 F16 safetensors 文件（随机数据，用于加载和哈希的 I/O 基准）"""
+    rng = random.Random(seed)
+    count = max(1, size_mb // tensor_mb)
+    elements = (tensor_mb << 20) // 2
+    chunk = rng.randbytes(elements * 2)
+    # 清除指数位的最高位，避免随机数据中出现 inf / nan
+    data = bytes(b & 0xBF if i % 2 else b for i, b in enumerate(chunk))
+    tensors = {
+        f"lora_unet_block_{i}.lora_down.weight": ("F16", [elements], data)
+        for i in range(count)
+    }
+    write_safetensors(path, tensors, {"ss_output_name": os.path.basename(path)})
+    return path
+
+
+def write_blob(path: str, size: int, seed: int = 0) -> str:
+    """写入指定大小的伪随机文件（用于哈希基准）"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    chunk = rng.randbytes(1 << 20)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(chunk[:min(remaining, len(chunk))])
+            remaining -= len(chunk)
+    return path
+
+
+def make_lora_library(
+    root: str,
+    count: int,
+    lora_names: Optional[List[str]] = None,
+    per_dir: int = 100,
+    tag_count: int = 20
+) -> List[str]:
+    """
+    生成一个包含 count 个小型 LoRA 的模型库，每 per_dir 个文件放在一个子目录
+
+    Returns:
+        相对于 root 的文件名列表（与 folder_paths 的格式一致）
+    """
+    lora_names = lora_names or ["lora_unet_blocks_0_attn_to_q"]
+    names = []
+    for i in range(count):
+        name = os.path.join(f"group_{i // per_dir:03d}", f"lora_{i:05d}.safetensors")
+        path = os.path.join(root, name)
+        if not os.path.exists(path):
+            write_lora(path, lora_names, tag_count=tag_count, rank=2, dim=8, seed=i)
+        names.append(name)
+    return names
+
+
+def make_png(width: int, height: int, seed: int = 0) -> bytes:
+    """生成指定尺寸的 RGB PNG（带噪声，压缩率接近真实照片）"""
+    rng = random.Random(seed)
+    stride = width * 3
+    pixels = rng.randbytes(stride * height)
+    raw = b"".join(b"\x00" + pixels[y * stride:(y + 1) * stride] for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
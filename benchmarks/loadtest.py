@@ -0,0 +1,316 @@
+"""
+LoRA 信息接口的并发负载测试
+
+在进程内启动 aiohttp 测试服务器（使用替身 PromptServer 注册的路由）和本地 Civitai 替身，
+由若干个并发客户端在固定时长内循环发送请求（闭环：每个客户端收到响应后才发送下一个），
+报告每类请求的 p50/p95/p99 延迟、吞吐量，以及事件循环延迟。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.loadtest                                   # 默认：并发 1,8,32，每档 5 秒
+    python -m benchmarks.loadtest --concurrency 16,64 --duration 10
+    python -m benchmarks.loadtest --mix info=0.5,list=0.3,civitai=0.2 --library 5000
+    python -m benchmarks.loadtest --requests 2000 --seed 1         # 固定请求总数，结果可复现
+    python -m benchmarks.loadtest --cold --output loadtest.json
+
+请求类型：
+    list     GET /loras/list（完整列表、fields=name、按关键字搜索三种随机选择）
+    info     GET /loras/info?file=...
+    civitai  GET /loras/info?file=...&civitai=true（本地没有缓存时请求 Civitai 替身）
+    etag     GET /loras/info，带上一次响应的 If-None-Match
+
+事件循环延迟由一个每 10ms 醒来一次的任务测量（实际醒来时间与预期之差）。
+客户端与服务器共用同一个事件循环，处理函数在循环中阻塞的时间会直接体现为延迟。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import shutil
+import statistics
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from . import comfy_stubs
+from .fixtures import make_lora_library
+from .fake_civitai import FakeCivitaiServer
+
+# 默认请求比例
+DEFAULT_MIX = {"info": 0.5, "list": 0.2, "civitai": 0.2, "etag": 0.1}
+# 事件循环延迟的采样间隔（秒）
+LAG_INTERVAL = 0.01
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """解析 "info=0.5,list=0.3" 形式的请求比例"""
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"未知的请求类型: {kind}")
+        mix[kind] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("请求比例为空")
+    return mix
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """已排序样本的百分位数（最近秩）"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, Any]:
+    """将耗时样本（秒）转换为毫秒统计和吞吐量"""
+    ordered = sorted(samples)
+    return {
+        "requests": len(ordered),
+        "rps": len(ordered) / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+async def run_load(
+    client: Any,
+    names: List[str],
+    concurrency: int,
+    duration: float,
+    mix: Dict[str, float],
+    seed: int = 0,
+    max_requests: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    以 concurrency 个闭环客户端发送请求
+
+    Args:
+        client: aiohttp TestClient
+        names: 模型库中的文件名
+        duration: 持续时间（秒），max_requests 先达到时提前结束
+        mix: 请求类型 -> 比例
+        seed: 随机种子（每个客户端使用 seed + 序号）
+        max_requests: 请求总数上限（可选）
+
+    Returns:
+        {"overall": 统计, "kinds": {类型: 统计}, "errors": {类型: 数量}, "loop_lag": 统计, "elapsed_s": 秒}
+    """
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    samples: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    errors: Dict[str, int] = {kind: 0 for kind in kinds}
+    etags: Dict[str, str] = {}
+    issued = [0]
+
+    async def request(kind: str, rng: random.Random) -> int:
+        name = rng.choice(names)
+        headers = {}
+        if kind == "list":
+            path = "/api/easy_setting/loras/list"
+            params = rng.choice([{}, {"fields": "name"}, {"q": f"lora_{rng.randrange(len(names)):05d}", "limit": "50"}])
+        else:
+            path = "/api/easy_setting/loras/info"
+            params = {"file": name}
+            if kind == "civitai":
+                params["civitai"] = "true"
+            elif kind == "etag" and name in etags:
+                headers["If-None-Match"] = etags[name]
+        response = await client.get(path, params=params, headers=headers)
+        await response.read()
+        if kind in ("info", "etag") and response.headers.get("ETag"):
+            etags[name] = response.headers["ETag"]
+        return response.status
+
+    async def worker(index: int, deadline: float) -> None:
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            if max_requests is not None:
+                if issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            kind = rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = await request(kind, rng)
+            except Exception:
+                status = 0
+            samples[kind].append(time.perf_counter() - start)
+            if status not in (200, 304):
+                errors[kind] += 1
+
+    lag: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.ensure_future(_monitor_loop_lag(lag, stop))
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker(i, deadline) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    lag.sort()
+    return {
+        "overall": summarize([value for values in samples.values() for value in values], elapsed),
+        "kinds": {kind: summarize(values, elapsed) for kind, values in samples.items() if values},
+        "errors": errors,
+        "loop_lag": {
+            "p50_ms": percentile(lag, 0.50) * 1000,
+            "p99_ms": percentile(lag, 0.99) * 1000,
+            "max_ms": (lag[-1] if lag else 0.0) * 1000,
+        },
+        "elapsed_s": elapsed,
+    }
+
+
+async def run_scenarios(
+    api: Any,
+    names: List[str],
+    concurrencies: List[int],
+    duration: float,
+    mix: Dict[str, float],
+    seed: int = 0,
+    max_requests: Optional[int] = None,
+    warm: bool = True,
+    civitai: Optional[FakeCivitaiServer] = None
+) -> List[Dict[str, Any]]:
+    """
+    对每个并发数运行一次负载
+
+    Args:
+        api: 已导入的 lora_api 模块
+        warm: 先顺序请求一遍全部文件的信息，使文件哈希和元数据进入缓存
+
+    Returns:
+        每个并发数的 run_load 结果（附带 concurrency 和 upstream_requests）
+    """
+    results = []
+    async with comfy_stubs.app_client() as client:
+        if warm:
+            for name in names:
+                response = await client.get("/api/easy_setting/loras/info", params={"file": name})
+                await response.read()
+        for concurrency in concurrencies:
+            before = civitai.request_count if civitai is not None else 0
+            result = await run_load(client, names, concurrency, duration, mix, seed, max_requests)
+            result["concurrency"] = concurrency
+            result["upstream_requests"] = (civitai.request_count if civitai is not None else 0) - before
+            results.append(result)
+    return results
+
+
+def prepare_library(ctx: Any, size: int) -> List[str]:
+    """生成模型库并切换 loras 目录"""
+    root = os.path.join(ctx.workdir, f"library_{size}")
+    names = make_lora_library(root, size)
+    ctx.set_lora_root(root)
+    ctx.lora_api.lora_index.refresh(force=True)
+    return names
+
+
+def format_result(result: Dict[str, Any]) -> List[str]:
+    """一个并发档位的结果表格"""
+    lines = []
+    lag = result["loop_lag"]
+    rows = [("all", result["overall"])] + sorted(result["kinds"].items())
+    for kind, stats in rows:
+        error_count = sum(result["errors"].values()) if kind == "all" else result["errors"].get(kind, 0)
+        lines.append(
+            f"  c={result['concurrency']:<4} {kind:<8} n={stats['requests']:<6} {stats['rps']:8.1f} req/s "
+            f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms "
+            f"errors={error_count}"
+        )
+    lines.append(
+        f"  c={result['concurrency']:<4} loop lag p50={lag['p50_ms']:.2f}ms p99={lag['p99_ms']:.2f}ms "
+        f"max={lag['max_ms']:.2f}ms upstream={result['upstream_requests']}"
+    )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="LoRA 信息接口并发负载测试")
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发客户端数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个并发档位的持续时间（秒）")
+    parser.add_argument("--requests", type=int, default=None, help="每个档位的请求总数上限（可选）")
+    parser.add_argument("--library", type=int, default=1000, help="模型库中的 LoRA 数量")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="请求比例，如 info=0.5,list=0.3,civitai=0.2")
+    parser.add_argument("--civitai-delay", type=float, default=0.05, help="Civitai 替身的响应延迟（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--cold", action="store_true", help="不预热缓存，直接开始负载")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径（可选）")
+    parser.add_argument("--workdir", default=None, help="测试数据目录（默认使用临时目录并在结束后删除）")
+    args = parser.parse_args(argv)
+
+    try:
+        concurrencies = [int(value) for value in args.concurrency.split(",") if value.strip()]
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # 延迟导入：BenchContext 会安装 ComfyUI 替身并导入插件
+    from .run import BenchContext, _git_commit
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="easy_setting_load_")
+    try:
+        ctx = BenchContext(workdir, quick=False)
+        if ctx.lora_api is None:
+            print("无法导入 lora_api（需要 aiohttp 和 requests）")
+            return 1
+        names = prepare_library(ctx, args.library)
+        with FakeCivitaiServer(delay=args.civitai_delay) as civitai:
+            ctx.lora_api.civitai_client.base_url = civitai.base_url
+            results = asyncio.run(run_scenarios(
+                ctx.lora_api, names, concurrencies, args.duration, mix,
+                seed=args.seed, max_requests=args.requests, warm=not args.cold, civitai=civitai
+            ))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in results:
+        for line in format_result(result):
+            print(line)
+
+    if args.output:
+        output = {
+            "meta": {
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "commit": _git_commit(),
+                "library": args.library,
+                "mix": mix,
+                "duration": args.duration,
+                "requests": args.requests,
+                "seed": args.seed,
+                "cold": args.cold,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.output}")
+    errors = sum(sum(result["errors"].values()) for result in results)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
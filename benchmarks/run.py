@@ -0,0 +1,1245 @@
+"""
+节点与 API 热点路径的离线基准测试
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.run                         # 全部基准
+    python -m benchmarks.run --quick                 # 缩小规模，快速检查
+    python -m benchmarks.run --only loader,routes    # 只运行部分分组
+    python -m benchmarks.run --output bench_results.json
+    python -m benchmarks.loadtest                    # 信息接口的并发负载测试（见 loadtest.py）
+
+import 分组会检查插件的启动导入耗时，超出预算时以退出码 1 结束。
+功能正确性由 tests/ 中的测试覆盖（python -m pytest），这里只记录耗时。
+
+结果以 JSON 写入 --output 指定的文件，格式：
+    {
+        "meta": {"python": "...", "platform": "...", "commit": "...", ...},
+        "results": [
+            {"group": "loader", "name": "load_loras", "params": {"slots": 8},
+             "runs": 20, "mean_ms": 1.2, "p50_ms": 1.1, "p95_ms": 1.6, "min_ms": 1.0, "max_ms": 2.0},
+            ...
+        ]
+    }
+不同提交之间可以直接比较同一 (group, name, params) 的 p50_ms 来发现性能回退。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import itertools
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from . import comfy_stubs, loadtest
+from .comfy_stubs import REPO_ROOT
+from .fixtures import write_lora, write_blob, write_large_lora, make_lora_library, make_tag_frequency, make_png
+from .fake_civitai import FakeCivitaiServer
+
+
+def _stats(samples: List[float]) -> Dict[str, Any]:
+    """将耗时样本（秒）转换为毫秒统计"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "runs": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[p95_index] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """同步函数计时"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+async def measure_async(func: Callable[[], Awaitable[Any]], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """异步函数计时"""
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+class BenchContext:
+    """基准测试的公共状态：临时目录、已导入的插件模块和结果列表"""
+
+    def __init__(self, workdir: str, quick: bool) -> None:
+        self.workdir = workdir
+        self.quick = quick
+        self.lora_root = os.path.join(workdir, "loras")
+        self.user_dir = os.path.join(workdir, "user")
+        os.makedirs(self.lora_root, exist_ok=True)
+        os.makedirs(self.user_dir, exist_ok=True)
+        self.results: List[Dict[str, Any]] = []
+        # 预算检查失败的说明，非空时以退出码 1 结束
+        self.failures: List[str] = []
+
+        # 关闭后台监听线程，避免干扰计时
+        os.environ.setdefault("EASY_SETTING_WATCH_MODE", "off")
+        comfy_stubs.install_stubs([self.lora_root], self.user_dir)
+        comfy_stubs.load_package()
+        self.loader = comfy_stubs.import_submodule("power_lora_loader")
+        self.stacker = comfy_stubs.import_submodule("power_lora_stacker")
+        self.lora_api = comfy_stubs.import_submodule("lora_api")
+
+    def repeat(self, full: int, quick: Optional[int] = None) -> int:
+        return (quick if quick is not None else max(1, full // 5)) if self.quick else full
+
+    def set_lora_root(self, root: str) -> None:
+        """切换 folder_paths 中的 loras 目录"""
+        import folder_paths
+        os.makedirs(root, exist_ok=True)
+        extensions = folder_paths.folder_names_and_paths["loras"][1]
+        folder_paths.folder_names_and_paths["loras"] = ([root], extensions)
+
+    def record(self, group: str, name: str, params: Dict[str, Any], stats: Dict[str, Any], **extra: Any) -> None:
+        entry = {"group": group, "name": name, "params": params}
+        entry.update(stats)
+        entry.update(extra)
+        self.results.append(entry)
+        param_text = ", ".join(f"{k}={v}" for k, v in params.items())
+        extra_text = "".join(f" {k}={v}" for k, v in extra.items())
+        print(f"  {group:<14} {name:<32} {param_text:<28} "
+              f"p50={stats['p50_ms']:9.3f}ms p95={stats['p95_ms']:9.3f}ms{extra_text}")
+
+
+# ===== 基准分组 =====
+
+def _lora_widgets(names: List[str]) -> Dict[str, Any]:
+    """生成与前端序列化格式一致的 LoRA widget 参数"""
+    return {
+        f"lora_{i + 1}": {"on": True, "lora": name, "strength": 0.8, "strengthTwo": 0.6}
+        for i, name in enumerate(names)
+    }
+
+
+def bench_loader(ctx: BenchContext) -> None:
+    if ctx.loader is None:
+        print("  跳过 loader：无法导入 power_lora_loader")
+        return
+    ctx.set_lora_root(ctx.lora_root)
+    model, clip = comfy_stubs.make_model(unet_keys=5000, clip_keys=800)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    lora_names = [comfy_stubs.unet_lora_name(k) for k in unet_keys[:64]]
+
+    for slots in (1, 8, 32):
+        names = []
+        for i in range(slots):
+            name = f"slot_{i:03d}.safetensors"
+            path = os.path.join(ctx.lora_root, name)
+            if not os.path.exists(path):
+                write_lora(path, lora_names, rank=4, dim=16, seed=i)
+            names.append(name)
+        kwargs = _lora_widgets(names)
+
+        loader = ctx.loader.PowerLoraLoader()
+        stats = measure(lambda: loader.load_loras(model, clip, **kwargs), ctx.repeat(20, 3))
+        ctx.record("loader", "load_loras", {"slots": slots}, stats)
+
+
+def bench_keymap(ctx: BenchContext) -> None:
+    """对 5k key 的模型依次应用 20 个 LoRA：比较每次重建 key 映射与缓存映射"""
+    keymap = comfy_stubs.import_submodule("lora_keymap")
+    if keymap is None:
+        print("  跳过 keymap：无法导入 lora_keymap")
+        return
+    import comfy.lora
+    import comfy.utils
+
+    model, clip = comfy_stubs.make_model(unet_keys=5000, clip_keys=800)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    lora_names = [comfy_stubs.unet_lora_name(k) for k in unet_keys[:64]]
+    loras = []
+    for i in range(20):
+        path = os.path.join(ctx.workdir, "keymap", f"keymap_{i:02d}.safetensors")
+        if not os.path.exists(path):
+            write_lora(path, lora_names, rank=4, dim=16, seed=i)
+        loras.append(comfy.utils.load_torch_file(path, safe_load=True))
+
+    builds = [0]
+    original = comfy.lora.model_lora_keys_unet
+
+    def counting(*args: Any, **kwargs: Any) -> Dict[str, str]:
+        builds[0] += 1
+        return original(*args, **kwargs)
+
+    def apply_stack() -> Any:
+        current_model, current_clip = model, clip
+        for lora in loras:
+            current_model, current_clip = keymap.load_lora_for_models(current_model, current_clip, lora, 0.8, 0.6)
+        return current_model
+
+    comfy.lora.model_lora_keys_unet = counting
+    try:
+        for mode in ("off", "cold", "warm"):
+            keymap.KEY_MAP_CACHE = mode != "off"
+
+            def run() -> None:
+                if mode == "cold":
+                    keymap.lora_key_maps.clear()
+                apply_stack()
+
+            run()
+            builds[0] = 0
+            repeat = ctx.repeat(20, 5)
+            stats = measure(run, repeat, warmup=0)
+            ctx.record("keymap", "apply 20 LoRAs", {"unet_keys": 5000, "cache": mode}, stats,
+                       key_map_builds=round(builds[0] / repeat, 1))
+    finally:
+        comfy.lora.model_lora_keys_unet = original
+        keymap.KEY_MAP_CACHE = True
+
+
+def bench_weight_cache(ctx: BenchContext) -> None:
+    """fp32 LoRA 以不同精度放入权重缓存：比较内存占用和 LoRA 增量（up @ down）的数值误差"""
+    weight_cache = comfy_stubs.import_submodule("lora_weight_cache")
+    try:
+        import torch
+    except ImportError:
+        torch = None
+    if weight_cache is None or torch is None:
+        print("  跳过 weight_cache：需要 torch 和 lora_weight_cache")
+        return
+    import comfy.utils
+
+    lora_names = [f"lora_unet_blocks_{i}_attn_to_q" for i in range(64)]
+    paths = []
+    for i in range(4):
+        path = os.path.join(ctx.workdir, "precision", f"fp32_{i}.safetensors")
+        if not os.path.exists(path):
+            write_lora(path, lora_names, rank=16, dim=128, seed=i)
+        paths.append(path)
+    originals = [comfy.utils.load_torch_file(path, safe_load=True) for path in paths]
+
+    def deltas(lora: Dict[str, Any]) -> List[Any]:
+        return [lora[f"{name}.lora_up.weight"].float() @ lora[f"{name}.lora_down.weight"].float()
+                for name in lora_names]
+
+    references = [deltas(lora) for lora in originals]
+    original_bytes = sum(weight_cache.state_dict_nbytes(lora) for lora in originals)
+
+    for precision in ("", "fp16", "bf16"):
+        cache = weight_cache.LoraWeightCache(max_bytes=1 << 40, precision=precision)
+
+        def fill() -> None:
+            cache.invalidate()
+            for path, lora in zip(paths, originals):
+                cache.put(path, (0, 0), lora)
+
+        stats = measure(fill, ctx.repeat(10, 3))
+        cached = [cache.get(path, (0, 0)) for path in paths]
+        max_abs = max_rel = 0.0
+        for reference, lora in zip(references, cached):
+            for expected, actual in zip(reference, deltas(lora)):
+                error = (actual - expected).abs().max().item()
+                max_abs = max(max_abs, error)
+                max_rel = max(max_rel, error / expected.abs().max().item())
+        ctx.record("weight_cache", "put 4 LoRAs", {"precision": precision or "original"}, stats,
+                   cache_kb=cache.total_bytes // 1024,
+                   saved_pct=round(100.0 * (1 - cache.total_bytes / original_bytes), 1),
+                   capacity_x=round(original_bytes / cache.total_bytes, 2),
+                   max_abs_delta=f"{max_abs:.2e}", max_rel_delta=f"{max_rel:.2e}")
+
+
+def bench_stacker(ctx: BenchContext) -> None:
+    if ctx.stacker is None:
+        print("  跳过 stacker：无法导入 power_lora_stacker")
+        return
+    stacker = ctx.stacker.PowerLoraStacker()
+    for slots in (8, 32, 100):
+        kwargs = _lora_widgets([f"lora_{i}.safetensors" for i in range(slots)])
+        upstream = [("upstream.safetensors", 1.0, 1.0)]
+        stats = measure(lambda: stacker.create_stack(lora_stack=upstream, **kwargs), ctx.repeat(2000, 200))
+        ctx.record("stacker", "create_stack", {"slots": slots}, stats)
+
+
+def bench_hash(ctx: BenchContext) -> None:
+    if ctx.lora_api is None:
+        print("  跳过 hash：无法导入 lora_api")
+        return
+    sizes_mb = (1, 16) if ctx.quick else (1, 16, 128)
+    for size_mb in sizes_mb:
+        path = os.path.join(ctx.workdir, "blobs", f"blob_{size_mb}mb.safetensors")
+        if not os.path.exists(path):
+            write_blob(path, size_mb << 20, seed=size_mb)
+        stats = measure(lambda: ctx.lora_api.get_file_hash(path), ctx.repeat(5, 2))
+        ctx.record("hash", "get_file_hash", {"size_mb": size_mb}, stats,
+                   mb_per_s=round(size_mb / (stats["p50_ms"] / 1000), 1))
+        stats = measure(lambda: ctx.lora_api.get_quick_hash(path), ctx.repeat(50, 10))
+        ctx.record("hash", "get_quick_hash", {"size_mb": size_mb}, stats)
+
+
+def bench_metadata(ctx: BenchContext) -> None:
+    if ctx.lora_api is None:
+        print("  跳过 metadata：无法导入 lora_api")
+        return
+    tag_counts = (100, 10000) if ctx.quick else (100, 10000, 50000)
+    for tag_count in tag_counts:
+        path = os.path.join(ctx.workdir, "meta", f"tags_{tag_count}.safetensors")
+        if not os.path.exists(path):
+            write_lora(path, ["lora_unet_blocks_0_attn_to_q"], tag_count=tag_count, rank=2, dim=8)
+        stats = measure(lambda: ctx.lora_api.get_lora_metadata(path), ctx.repeat(20, 3))
+        ctx.record("metadata", "get_lora_metadata", {"tags": tag_count}, stats,
+                   file_kb=os.path.getsize(path) // 1024)
+
+
+def bench_trained_words(ctx: BenchContext) -> None:
+    if ctx.lora_api is None:
+        print("  跳过 trained_words：无法导入 lora_api")
+        return
+    api = ctx.lora_api
+    tag_counts = (1000, 50000)
+    for tag_count in tag_counts:
+        metadata = {"ss_tag_frequency": make_tag_frequency(tag_count, buckets=3)}
+        stats = measure(lambda: api.extract_trained_words(metadata), ctx.repeat(10, 2))
+        ctx.record("trained_words", "extract_trained_words", {"tags": tag_count, "top_k": "all"}, stats)
+        stats = measure(lambda: api.extract_trained_words(metadata, top_k=200), ctx.repeat(10, 2))
+        ctx.record("trained_words", "extract_trained_words", {"tags": tag_count, "top_k": 200}, stats)
+
+        path = os.path.join(ctx.workdir, "meta", f"cache_{tag_count}.safetensors")
+        if not os.path.exists(path):
+            write_blob(path, 1024)
+        cache = api.TrainedWordsCache()
+        cache.get_page(path, metadata, top_k=200)
+        stats = measure(lambda: cache.get_page(path, metadata, top_k=200, offset=0), ctx.repeat(200, 20))
+        ctx.record("trained_words", "TrainedWordsCache.get_page", {"tags": tag_count, "top_k": 200}, stats)
+
+
+async def _bench_routes_async(ctx: BenchContext, library_size: int, civitai: FakeCivitaiServer) -> None:
+    api = ctx.lora_api
+    root = os.path.join(ctx.workdir, f"library_{library_size}")
+    names = make_lora_library(root, library_size)
+    ctx.set_lora_root(root)
+    api.lora_index.refresh(force=True)
+
+    async with comfy_stubs.app_client() as client:
+        params = {"size": library_size}
+
+        async def get(path: str, **kwargs: Any) -> int:
+            response = await client.get(path, **kwargs)
+            await response.read()
+            return response.status
+
+        stats = await measure_async(lambda: get("/api/easy_setting/loras/list"), ctx.repeat(50, 5))
+        ctx.record("routes", "GET /loras/list", params, stats)
+
+        stats = await measure_async(lambda: get("/api/easy_setting/loras/list?fields=name"), ctx.repeat(50, 5))
+        ctx.record("routes", "GET /loras/list?fields=name", params, stats)
+
+        stats = await measure_async(lambda: get("/api/easy_setting/loras/list?q=lora_0001&limit=50"), ctx.repeat(50, 5))
+        ctx.record("routes", "GET /loras/list?q=...", params, stats)
+
+        target = names[len(names) // 2]
+        api.file_hash_cache.invalidate()
+        api.trained_words_cache.invalidate()
+
+        def info_cold() -> Awaitable[int]:
+            api.file_hash_cache.invalidate()
+            api.trained_words_cache.invalidate()
+            return get("/api/easy_setting/loras/info", params={"file": target})
+
+        stats = await measure_async(info_cold, ctx.repeat(20, 3))
+        ctx.record("routes", "GET /loras/info (cold)", params, stats)
+
+        stats = await measure_async(
+            lambda: get("/api/easy_setting/loras/info", params={"file": target}), ctx.repeat(50, 5)
+        )
+        ctx.record("routes", "GET /loras/info (warm)", params, stats)
+
+        response = await client.get("/api/easy_setting/loras/info", params={"file": target})
+        etag = response.headers.get("ETag", "")
+        await response.read()
+        stats = await measure_async(
+            lambda: get("/api/easy_setting/loras/info", params={"file": target}, headers={"If-None-Match": etag}),
+            ctx.repeat(50, 5)
+        )
+        ctx.record("routes", "GET /loras/info (304)", params, stats)
+
+        # 并发请求合并：同一 LoRA 的并发 Civitai 查询只应产生一次上游请求
+        concurrency = 16
+        api.info_etag_cache.invalidate()
+        before = civitai.request_count
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*[
+            get("/api/easy_setting/loras/info", params={"file": names[0], "civitai": "true"})
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+        ctx.record("routes", "GET /loras/info civitai x16", params, _stats([elapsed]),
+                   upstream_requests=civitai.request_count - before,
+                   ok=sum(1 for status in statuses if status == 200))
+
+
+def bench_routes(ctx: BenchContext) -> None:
+    if ctx.lora_api is None:
+        print("  跳过 routes：无法导入 lora_api（需要 aiohttp 和 requests）")
+        return
+    try:
+        import aiohttp.test_utils  # noqa: F401
+    except ImportError:
+        print("  跳过 routes：未安装 aiohttp")
+        return
+
+    with FakeCivitaiServer(delay=0.05) as civitai:
+        ctx.lora_api.civitai_client.base_url = civitai.base_url
+        sizes = (100, 1000) if ctx.quick else (100, 1000, 5000)
+        for library_size in sizes:
+            asyncio.run(_bench_routes_async(ctx, library_size, civitai))
+    ctx.set_lora_root(ctx.lora_root)
+
+
+def bench_load(ctx: BenchContext) -> None:
+    """信息与列表接口的并发负载（详细参数见 python -m benchmarks.loadtest --help）"""
+    if ctx.lora_api is None:
+        print("  跳过 load：无法导入 lora_api（需要 aiohttp 和 requests）")
+        return
+    try:
+        import aiohttp.test_utils  # noqa: F401
+    except ImportError:
+        print("  跳过 load：未安装 aiohttp")
+        return
+
+    library_size = 200 if ctx.quick else 1000
+    concurrencies = [8, 32] if ctx.quick else [1, 8, 32, 64]
+    duration = 1.0 if ctx.quick else 3.0
+    names = loadtest.prepare_library(ctx, library_size)
+    try:
+        with FakeCivitaiServer(delay=0.05) as civitai:
+            ctx.lora_api.civitai_client.base_url = civitai.base_url
+            results = asyncio.run(loadtest.run_scenarios(
+                ctx.lora_api, names, concurrencies, duration, loadtest.DEFAULT_MIX, civitai=civitai
+            ))
+    finally:
+        ctx.set_lora_root(ctx.lora_root)
+
+    for result in results:
+        params = {"size": library_size, "concurrency": result["concurrency"]}
+        overall = result["overall"]
+        errors = sum(result["errors"].values())
+        ctx.record("load", "mixed info/list", params, overall,
+                   p99_ms=round(overall["p99_ms"], 2), rps=round(overall["rps"], 1),
+                   loop_lag_p99_ms=round(result["loop_lag"]["p99_ms"], 2), errors=errors)
+    for kind, stats in sorted(results[-1]["kinds"].items()):
+        ctx.record("load", f"{kind} (c={results[-1]['concurrency']})", {"size": library_size}, stats,
+                   p99_ms=round(stats["p99_ms"], 2))
+
+
+def _run_enrich_job(enricher: Any, timeout: float = 120.0) -> Dict[str, Any]:
+    enricher.start()
+    enricher.wait(timeout)
+    return enricher.progress()
+
+
+def bench_enrich(ctx: BenchContext) -> None:
+    enrich = comfy_stubs.import_submodule("civitai_enrich")
+    if enrich is None:
+        print("  跳过 enrich：无法导入 civitai_enrich（需要 aiohttp 和 requests）")
+        return
+    store = comfy_stubs.import_submodule("persistent_cache")
+    api = ctx.lora_api
+
+    count = 200 if ctx.quick else 2000
+    root = os.path.join(ctx.workdir, f"library_{count}")
+    make_lora_library(root, count)
+    ctx.set_lora_root(root)
+    api.lora_index.refresh(force=True)
+    # 预先计算哈希，补全任务只使用已知哈希
+    hashes = [
+        api.get_cached_file_hash(entry.path, (entry.mtime_ns, entry.size))
+        for entry in api.lora_index.entries()
+    ]
+    store.hash_store.flush()
+    # 让退避在基准中保持短暂
+    enrich.ENRICH_BACKOFF_BASE = 0.01
+
+    def make_enricher(name: str, civitai: FakeCivitaiServer, **kwargs: Any) -> Any:
+        directory = os.path.join(ctx.workdir, "enrich", name)
+        return enrich.CivitaiEnricher(
+            cache=store.CivitaiCache(os.path.join(directory, "civitai")),
+            client=enrich.CivitaiClient(base_url=civitai.base_url, cooldown=0.05),
+            state_path=os.path.join(directory, "state.json"),
+            **kwargs
+        )
+
+    params = {"loras": count}
+    known = hashes[::2]
+
+    # 1. 有失败的批量查询：不限速，4 并发，20% 请求返回 500
+    with FakeCivitaiServer(delay=0.02, failure_rate=0.2, known_hashes=known, seed=1) as civitai:
+        enricher = make_enricher("cold", civitai, rate=0, concurrency=4, batch_size=10)
+        start = time.perf_counter()
+        progress = _run_enrich_job(enricher)
+        elapsed = time.perf_counter() - start
+    ctx.record("enrich", "bulk lookup (20% failures)", params, _stats([elapsed]),
+               requests=progress["requests"], retries=progress["retries"],
+               found=progress["found"], missing=progress["missing"], status=progress["status"])
+
+    # 2. 取消后模拟重启，新实例从状态文件继续
+    with FakeCivitaiServer(delay=0.01, known_hashes=known) as civitai:
+        enricher = make_enricher("resume", civitai, rate=10, concurrency=2, batch_size=10)
+        enricher.start()
+        time.sleep(0.5)
+        enricher.cancel()
+        enricher.wait(30)
+        first = enricher.progress()
+        restarted = make_enricher("resume", civitai, rate=0, concurrency=2, batch_size=10)
+        start = time.perf_counter()
+        progress = _run_enrich_job(restarted)
+        elapsed = time.perf_counter() - start
+        upstream = civitai.request_count
+    ctx.record("enrich", "resume after cancel", params, _stats([elapsed]),
+               done_before=first["done"], done=progress["done"], requests=upstream,
+               batches=-(-count // 10), status=progress["status"])
+
+    # 3. 限流：实际请求速率
+    rate = 20.0
+    with FakeCivitaiServer(known_hashes=known) as civitai:
+        enricher = make_enricher("rate", civitai, rate=rate, concurrency=4, batch_size=max(1, count // 40))
+        start = time.perf_counter()
+        progress = _run_enrich_job(enricher)
+        elapsed = time.perf_counter() - start
+    achieved = progress["requests"] / elapsed
+    ctx.record("enrich", "rate limited", dict(params, rate=rate), _stats([elapsed]),
+               requests=progress["requests"], achieved_rate=round(achieved, 1))
+
+    ctx.set_lora_root(ctx.lora_root)
+
+
+async def _bench_thumbnail_async(ctx: BenchContext, civitai: FakeCivitaiServer) -> None:
+    api = ctx.lora_api
+    root = os.path.join(ctx.workdir, "library_thumbnail")
+    names = make_lora_library(root, 4)
+    ctx.set_lora_root(root)
+    api.lora_index.refresh(force=True)
+
+    async with comfy_stubs.app_client() as client:
+        response = await client.get("/api/easy_setting/loras/info", params={"file": names[0], "civitai": "true"})
+        images = (await response.json())["images"]
+        urls = [image["url"] for image in images]
+
+        async def get(url: str, **kwargs: Any) -> int:
+            response = await client.get(url, allow_redirects=False, **kwargs)
+            body = await response.read()
+            sizes.append(len(body))
+            return response.status
+
+        sizes: List[int] = []
+        before = civitai.request_count
+        samples = []
+        for url in urls:
+            start = time.perf_counter()
+            await get(url)
+            samples.append(time.perf_counter() - start)
+        params = {"source": "x".join(map(str, civitai.image_size))}
+        ctx.record("thumbnail", "GET /thumbnail (cold)", params, _stats(samples),
+                   source_kb=len(make_png(*civitai.image_size)) // 1024, thumb_kb=max(sizes) // 1024,
+                   downloads=civitai.request_count - before)
+
+        # 缓存上限只够保存两张，最早的一张已被淘汰，之后只请求最近的一张
+        recent = urls[-1]
+        stats = await measure_async(lambda: get(recent), ctx.repeat(50, 5))
+        ctx.record("thumbnail", "GET /thumbnail (warm)", params, stats)
+
+        response = await client.get(recent)
+        etag = response.headers.get("ETag", "")
+        await response.read()
+        stats = await measure_async(lambda: get(recent, headers={"If-None-Match": etag}), ctx.repeat(50, 5))
+        ctx.record("thumbnail", "GET /thumbnail (304)", params, stats)
+
+
+def bench_civitai_client(ctx: BenchContext) -> None:
+    client_module = comfy_stubs.import_submodule("civitai_client")
+    if client_module is None or ctx.lora_api is None:
+        print("  跳过 civitai_client：无法导入 civitai_client（需要 requests）")
+        return
+    import requests
+
+    file_hash = "ab" * 32
+    count = ctx.repeat(50, 20)
+
+    # 1. 连接复用：共享连接池与每次新建连接
+    with FakeCivitaiServer() as civitai:
+        client = client_module.CivitaiClient(base_url=civitai.base_url)
+        url = client.url(f"{client_module.BY_HASH_PATH}/{file_hash}")
+
+        def unpooled() -> None:
+            with requests.Session() as session:
+                session.get(url, timeout=client.timeout()).json()
+
+        connections = {}
+        for name, func in (("pooled session", lambda: client.get_model_version_by_hash(file_hash)),
+                           ("new connection per request", unpooled)):
+            before = civitai.connection_count
+            stats = measure(func, count, warmup=0)
+            connections[name] = civitai.connection_count - before
+            ctx.record("civitai_client", name, {"requests": count}, stats, connections=connections[name])
+        client.close()
+
+    # 2. 熔断：上游持续返回 500，达到阈值后不再发出请求，直接失败
+    threshold = 5
+    with FakeCivitaiServer(failure_rate=1.0) as civitai:
+        client = client_module.CivitaiClient(base_url=civitai.base_url, failure_threshold=threshold, cooldown=60.0)
+        for _ in range(threshold):
+            client.get_model_version_by_hash(file_hash)
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                client.get_model_version_by_hash(file_hash)
+            except client_module.CivitaiUnavailable:
+                pass
+            samples.append(time.perf_counter() - start)
+        stats = _stats(samples)
+        ctx.record("civitai_client", "breaker open (fast fail)", {"threshold": threshold}, stats,
+                   upstream=civitai.request_count, state=client.state)
+        client.close()
+
+
+def bench_thumbnail(ctx: BenchContext) -> None:
+    if ctx.lora_api is None:
+        print("  跳过 thumbnail：无法导入 lora_api（需要 aiohttp 和 requests）")
+        return
+    thumbnail = comfy_stubs.import_submodule("thumbnail_cache")
+    store = comfy_stubs.import_submodule("persistent_cache")
+    api = ctx.lora_api
+    with FakeCivitaiServer() as civitai:
+        api.civitai_client.base_url = civitai.base_url
+        thumbnail.ALLOWED_IMAGE_HOSTS = ("127.0.0.1",)
+        # 上限只够保存两张缩略图，验证淘汰
+        thumbs = thumbnail.ThumbnailCache(os.path.join(ctx.workdir, "thumbnails"))
+        probe, _ = thumbnail.make_thumbnail(make_png(*civitai.image_size), thumbs.size)
+        thumbs.max_bytes = len(probe) * 2 + len(probe) // 2
+        api.thumbnail_cache = thumbs
+        # 独立的 Civitai 缓存：其他分组缓存的图片地址指向已关闭的替身服务器
+        api.civitai_cache = store.CivitaiCache(os.path.join(ctx.workdir, "thumbnails", "civitai"))
+        try:
+            asyncio.run(_bench_thumbnail_async(ctx, civitai))
+        finally:
+            api.thumbnail_cache = thumbnail.thumbnail_cache
+            api.civitai_cache = store.civitai_cache
+            thumbnail.ALLOWED_IMAGE_HOSTS = ("civitai.com",)
+    ctx.set_lora_root(ctx.lora_root)
+
+
+def bench_sidecar(ctx: BenchContext) -> None:
+    if ctx.lora_api is None:
+        print("  跳过 sidecar：无法导入 lora_api（需要 aiohttp 和 requests）")
+        return
+    import hashlib
+    from .fake_civitai import make_model_version
+
+    sidecars = comfy_stubs.import_submodule("sidecars")
+    store = comfy_stubs.import_submodule("persistent_cache")
+    api = ctx.lora_api
+    size_mb = 16
+    count = 2 if ctx.quick else 8
+    root = os.path.join(ctx.workdir, "library_sidecar")
+    groups: Dict[str, List[str]] = {"with sidecars": [], "without sidecars": []}
+    for i in range(count * 2):
+        name = f"sidecar_{i:03d}.safetensors"
+        path = os.path.join(root, name)
+        if not os.path.exists(path):
+            write_blob(path, size_mb << 20, seed=1000 + i)
+        if i < count:
+            with open(path, "rb") as f:
+                file_hash = hashlib.sha256(f.read()).hexdigest()
+            paths = sidecars.sidecar_paths(path)
+            with open(paths["sha256"], "w") as f:
+                f.write(f"{file_hash.upper()} *{name}\n")
+            with open(paths["civitai"], "w") as f:
+                json.dump(make_model_version(file_hash), f)
+            groups["with sidecars"].append(name)
+        else:
+            groups["without sidecars"].append(name)
+    ctx.set_lora_root(root)
+    api.lora_index.refresh(force=True)
+
+    def cold_info(name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(root, name)
+        api.file_hash_cache.invalidate(path)
+        store.hash_store.discard(path)
+        sidecars.sidecar_reader.invalidate(path)
+        api.civitai_cache = store.CivitaiCache(tempfile.mkdtemp(dir=ctx.workdir))
+        return api.get_lora_info(name, fetch_civitai=True)
+
+    with FakeCivitaiServer(delay=0.05) as civitai:
+        api.civitai_client.base_url = civitai.base_url
+        try:
+            for label, names in groups.items():
+                before = civitai.request_count
+                samples = []
+                for name in names:
+                    start = time.perf_counter()
+                    cold_info(name)
+                    samples.append(time.perf_counter() - start)
+                ctx.record("sidecar", f"get_lora_info cold ({label})", {"size_mb": size_mb}, _stats(samples),
+                           upstream_requests=civitai.request_count - before)
+        finally:
+            api.civitai_cache = store.civitai_cache
+    ctx.set_lora_root(ctx.lora_root)
+
+
+def drop_page_cache(path: str) -> None:
+    """让系统丢弃文件的页缓存，下次读取需要访问存储设备（tmpfs 上无效）"""
+    with open(path, "rb") as f:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def bench_hash_on_load(ctx: BenchContext) -> None:
+    """执行 LoRA 后再查看信息：比较单次读取（加载时计算哈希）与分别读取"""
+    if ctx.loader is None or ctx.lora_api is None:
+        print("  跳过 hash_on_load：无法导入 power_lora_loader 或 lora_api")
+        return
+    store = comfy_stubs.import_submodule("persistent_cache")
+    metrics = comfy_stubs.import_submodule("lora_metrics")
+    loader, api = ctx.loader, ctx.lora_api
+    sizes_mb = (16, 64) if ctx.quick else (16, 64, 256)
+    # 页缓存中的文件再次读取几乎没有开销，冷缓存更接近机械硬盘和网络存储
+    caches = ("warm", "cold") if hasattr(os, "posix_fadvise") else ("warm",)
+    try:
+        for size_mb in sizes_mb:
+            path = os.path.join(ctx.workdir, "large", f"large_{size_mb}mb.safetensors")
+            if not os.path.exists(path):
+                write_large_lora(path, size_mb, seed=size_mb)
+
+            for cache, enabled in itertools.product(caches, (False, True)):
+                loader.HASH_ON_LOAD = enabled
+                reads: List[int] = []
+
+                def load_then_hash() -> None:
+                    store.hash_store.discard(path)
+                    api.file_hash_cache.invalidate(path)
+                    if cache == "cold":
+                        drop_page_cache(path)
+                    hashed = metrics.phase_seconds.count("hash")
+                    lora = loader.load_lora_file(path)
+                    # 读取全部权重，模拟应用 LoRA（load_torch_file 通过 mmap 延迟读取）
+                    for value in lora.values():
+                        if hasattr(value, "sum"):
+                            value.sum()
+                    api.get_cached_file_hash(path)
+                    reads.append(1 + metrics.phase_seconds.count("hash") - hashed)
+
+                stats = measure(load_then_hash, ctx.repeat(5, 2))
+                ctx.record("hash_on_load", f"load + info hash ({cache})",
+                           {"size_mb": size_mb, "hash_on_load": enabled}, stats, file_reads=max(reads))
+    finally:
+        loader.HASH_ON_LOAD = True
+
+
+def bench_bake(ctx: BenchContext) -> None:
+    """烘焙 8 个 LoRA 的堆栈：烘焙耗时、截断误差，以及加载器使用烘焙文件后的耗时"""
+    bake = comfy_stubs.import_submodule("lora_bake")
+    try:
+        import torch
+        import aiohttp.test_utils  # noqa: F401
+    except ImportError:
+        torch = None
+    if bake is None or torch is None or ctx.loader is None or ctx.lora_api is None:
+        print("  跳过 bake：需要 torch、aiohttp、lora_bake 和 lora_api")
+        return
+
+    root = os.path.join(ctx.workdir, "bake")
+    ctx.set_lora_root(root)
+    model, clip = comfy_stubs.make_model(unet_keys=5000, clip_keys=800)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    clip_keys = [k for k in clip.cond_stage_model.state_dict() if k.endswith(".weight")]
+    lora_names = ([comfy_stubs.unet_lora_name(k) for k in unet_keys[:64]]
+                  + [comfy_stubs.clip_lora_name(k) for k in clip_keys[:16]])
+    stack = []
+    for i in range(8):
+        name = f"bake_{i}.safetensors"
+        path = os.path.join(root, name)
+        if not os.path.exists(path):
+            write_lora(path, lora_names, rank=8, dim=64, seed=100 + i)
+        stack.append((name, round(0.5 + 0.1 * i, 2), 0.4))
+
+    baked_stacks = bake.BAKED_STACKS
+    try:
+        _bench_bake(ctx, bake, root, stack, lora_names, model, clip)
+    finally:
+        bake.BAKED_STACKS = baked_stacks
+        ctx.set_lora_root(ctx.lora_root)
+
+
+def _bench_bake(ctx: BenchContext, bake: Any, root: str, stack: List[Any], lora_names: List[str],
+                model: Any, clip: Any) -> None:
+    # 索引保留最近一次烘焙的结果，最后烘焙精确的 rank 64，供下面的 load_loras 使用
+    results = asyncio.run(_bench_bake_async(ctx, stack, ranks=(32, 64)))
+
+    # 与精确的加权和比较：rank >= 各秩之和（8 x 8）时只有 fp16 舍入误差
+    import comfy.utils
+    sources = [(comfy.utils.load_torch_file(os.path.join(root, name)), sm, sc) for name, sm, sc in stack]
+    for rank, result in results.items():
+        baked = comfy.utils.load_torch_file(result["path"])
+        max_rel = 0.0
+        for module in lora_names:
+            # 合成 LoRA 的 alpha 等于秩，缩放系数为 1
+            expected = sum(
+                (sc if bake.is_clip_module(module) else sm)
+                * (lora[f"{module}.lora_up.weight"] @ lora[f"{module}.lora_down.weight"])
+                for lora, sm, sc in sources
+            )
+            actual = baked[f"{module}.lora_up.weight"].float() @ baked[f"{module}.lora_down.weight"].float()
+            max_rel = max(max_rel, ((actual - expected).norm() / expected.norm()).item())
+        stats = measure(lambda: comfy.utils.load_torch_file(result["path"]), ctx.repeat(20, 5))
+        ctx.record("bake", "load baked file", {"loras": 8, "rank": rank}, stats,
+                   energy=result["energy"], max_rel_error=f"{max_rel:.2e}")
+
+    widgets = {
+        f"lora_{i + 1}": {"on": True, "lora": name, "strength": sm, "strengthTwo": sc}
+        for i, (name, sm, sc) in enumerate(stack)
+    }
+    loader = ctx.loader.PowerLoraLoader()
+    for substitute in (False, True):
+        bake.BAKED_STACKS = substitute
+        patched = loader.load_loras(model, clip, **widgets)[0]
+        stats = measure(lambda: loader.load_loras(model, clip, **widgets), ctx.repeat(20, 5))
+        per_key = max((len(p) for p in patched.patches.values()), default=0)
+        ctx.record("bake", "load_loras", {"loras": 8, "baked": substitute}, stats, patches_per_key=per_key)
+
+
+async def _bench_bake_async(ctx: BenchContext, stack: List[Any], ranks: Any) -> Dict[int, Dict[str, Any]]:
+    results = {}
+    async with comfy_stubs.app_client() as client:
+        for rank in ranks:
+            body = {"loras": [list(item) for item in stack], "rank": rank}
+            for label in ("cold", "cached"):
+                start = time.perf_counter()
+                response = await client.post("/api/easy_setting/loras/bake", json=body)
+                response.raise_for_status()
+                data = await response.json()
+                elapsed = time.perf_counter() - start
+                ctx.record("bake", f"POST /loras/bake ({label})", {"loras": len(stack), "rank": rank},
+                           _stats([elapsed]), cached=data["cached"], energy=data["energy"])
+            results[rank] = data
+    return results
+
+
+def bench_warm(ctx: BenchContext) -> None:
+    """调度器预热 8 个 LoRA 后的第一个任务：与冷缓存的第一个任务和稳定状态比较"""
+    try:
+        import aiohttp.test_utils  # noqa: F401
+    except ImportError:
+        aiohttp = None
+    if ctx.loader is None or ctx.lora_api is None or aiohttp is None:
+        print("  跳过 warm：需要 aiohttp、power_lora_loader 和 lora_api")
+        return
+
+    root = os.path.join(ctx.workdir, "warm")
+    ctx.set_lora_root(root)
+    model, clip = comfy_stubs.make_model(unet_keys=5000, clip_keys=800)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    lora_names = [comfy_stubs.unet_lora_name(k) for k in unet_keys[:64]]
+    names = []
+    for i in range(8):
+        name = f"warm_{i}.safetensors"
+        path = os.path.join(root, name)
+        if not os.path.exists(path):
+            write_lora(path, lora_names, rank=32, dim=256, seed=400 + i)
+        names.append(name)
+
+    # 统计真正读取文件的次数
+    original_load = ctx.loader.load_lora_file
+    file_loads = []
+
+    def counting_load(path: str) -> Dict[str, Any]:
+        file_loads.append(path)
+        return original_load(path)
+
+    # 默认预算只保留最后一个 LoRA，预热 8 个需要更大的预算
+    cache = comfy_stubs.import_submodule("lora_weight_cache").lora_weight_cache
+    budget = cache.max_bytes
+    cache.max_bytes = 1 << 30
+    ctx.loader.load_lora_file = counting_load
+    try:
+        asyncio.run(_bench_warm_async(ctx, model, clip, names, file_loads))
+    finally:
+        ctx.loader.load_lora_file = original_load
+        cache.max_bytes = budget
+        ctx.set_lora_root(ctx.lora_root)
+
+
+async def _bench_warm_async(ctx: BenchContext, model: Any, clip: Any, names: List[str],
+                            file_loads: List[str]) -> None:
+    loader = ctx.loader.PowerLoraLoader()
+    widgets = _lora_widgets(names)
+    cache = comfy_stubs.import_submodule("lora_weight_cache").lora_weight_cache
+    loop = asyncio.get_running_loop()
+
+    def run_job() -> float:
+        start = time.perf_counter()
+        loader.load_loras(model, clip, **widgets)
+        return time.perf_counter() - start
+
+    samples: Dict[str, List[float]] = {"cold first job": [], "warm request": [], "warmed first job": [],
+                                       "steady state": []}
+    warmed_loads = 0
+    async with comfy_stubs.app_client() as client:
+        for _ in range(ctx.repeat(10, 3)):
+            cache.invalidate()
+            samples["cold first job"].append(await loop.run_in_executor(None, run_job))
+
+            cache.invalidate()
+            start = time.perf_counter()
+            response = await client.post("/api/easy_setting/loras/warm", json={"loras": names, "wait": True})
+            response.raise_for_status()
+            await response.read()
+            samples["warm request"].append(time.perf_counter() - start)
+
+            before = len(file_loads)
+            samples["warmed first job"].append(await loop.run_in_executor(None, run_job))
+            warmed_loads += len(file_loads) - before
+            samples["steady state"].append(await loop.run_in_executor(None, run_job))
+
+        # 不等待：立即返回 202，轮询直到全部就绪
+        cache.invalidate()
+        start = time.perf_counter()
+        response = await client.post("/api/easy_setting/loras/warm", json={"loras": names})
+        accepted = time.perf_counter() - start
+        status = response.status
+        data = await response.json()
+        while data["pending"]:
+            await asyncio.sleep(0.005)
+            response = await client.get("/api/easy_setting/loras/warm", params={"names": ",".join(names)})
+            data = await response.json()
+        ready = time.perf_counter() - start
+
+    params = {"loras": len(names)}
+    for name, values in samples.items():
+        extra = {"file_loads": warmed_loads} if name == "warmed first job" else {}
+        ctx.record("warm", name, params, _stats(values), **extra)
+    ctx.record("warm", "POST /loras/warm (async)", params, _stats([accepted]),
+               status=status, ready_ms=round(ready * 1000, 1))
+
+
+def bench_resolve(ctx: BenchContext) -> None:
+    """解析 32 个槽位的堆栈：逐个 folder_paths.get_full_path 与目录索引（可模拟网络存储的 stat 延迟）"""
+    index_module = comfy_stubs.import_submodule("lora_index")
+    if ctx.loader is None or index_module is None:
+        print("  跳过 resolve：无法导入 power_lora_loader 和 lora_index")
+        return
+    import folder_paths
+
+    # LoRA 放在最后一个根目录中，逐个根目录查找时每个槽位都要 stat 4 次
+    roots = [os.path.join(ctx.workdir, "resolve", f"root_{i}") for i in range(4)]
+    for root in roots:
+        os.makedirs(root, exist_ok=True)
+    names = []
+    for i in range(32):
+        name = f"resolve_{i:02d}.safetensors"
+        path = os.path.join(roots[-1], name)
+        if not os.path.exists(path):
+            write_blob(path, 256, seed=i)
+        names.append(name)
+
+    extensions = folder_paths.folder_names_and_paths["loras"][1]
+    folder_paths.folder_names_and_paths["loras"] = (roots, extensions)
+    original_stat = os.stat
+    original_strict = ctx.loader.STRICT_LORAS
+    try:
+        index = index_module.lora_index
+        index.refresh(force=True)
+        _bench_resolve(ctx, index, index_module, names, original_stat)
+    finally:
+        os.stat = original_stat
+        ctx.loader.STRICT_LORAS = original_strict
+        ctx.set_lora_root(ctx.lora_root)
+
+
+def _bench_resolve(ctx: BenchContext, index: Any, index_module: Any, names: List[str],
+                   original_stat: Callable[..., Any]) -> None:
+    import folder_paths
+
+    stat_calls = [0]
+    latency = [0.0]
+
+    def counting_stat(*args: Any, **kwargs: Any) -> Any:
+        stat_calls[0] += 1
+        if latency[0]:
+            time.sleep(latency[0])
+        return original_stat(*args, **kwargs)
+
+    def per_slot() -> None:
+        for name in names:
+            folder_paths.get_full_path_or_raise("loras", name)
+
+    def single_scan() -> None:
+        entries, missing = index.resolve_many(names, refresh=False)
+        assert not missing and len(entries) == len(names)
+
+    os.stat = counting_stat
+    for latency_ms in (0, 1):
+        latency[0] = latency_ms / 1000
+        for label, func in (("per-slot get_full_path", per_slot), ("index resolve_many", single_scan)):
+            stat_calls[0] = 0
+            func()
+            calls = stat_calls[0]
+            stats = measure(func, ctx.repeat(20, 3) if latency_ms else ctx.repeat(200, 20))
+            ctx.record("resolve", label, {"slots": len(names), "stat_latency_ms": latency_ms}, stats,
+                       stat_calls=calls)
+    os.stat = original_stat
+
+    # 缺失文件一次全部报告
+    missing = ["missing_a.safetensors", "missing_b.safetensors", "missing_c.safetensors"]
+    widgets = _lora_widgets(names[:5] + missing)
+    model, clip = comfy_stubs.make_model(unet_keys=100, clip_keys=10)
+    loader = ctx.loader.PowerLoraLoader()
+    ctx.loader.STRICT_LORAS = True
+    reported: List[str] = []
+    start = time.perf_counter()
+    try:
+        loader.load_loras(model, clip, **widgets)
+    except index_module.MissingLorasError as e:
+        reported = e.names
+    elapsed = time.perf_counter() - start
+    ctx.record("resolve", "strict validation", {"slots": len(widgets), "missing": len(missing)},
+               _stats([elapsed]), reported=len(reported))
+
+
+# 多进程共享缓存基准的子进程：等待 go 文件出现后依次取得全部 LoRA，
+# 输出解析次数、校验和以及新增的进程私有内存（Linux 的 RssAnon）
+_SHARED_CACHE_SCRIPT = (
+    "import os, sys, json, time, tempfile\n"
+    "config = json.loads(sys.argv[1])\n"
+    "os.environ['EASY_SETTING_WATCH_MODE'] = 'off'\n"
+    "os.environ['EASY_SETTING_SHARED_CACHE_DIR'] = config['shared_dir']\n"
+    "from benchmarks import comfy_stubs\n"
+    "comfy_stubs.install_stubs([config['lora_dir']], tempfile.mkdtemp())\n"
+    "comfy_stubs.load_package()\n"
+    "loader = comfy_stubs.import_submodule('power_lora_loader')\n"
+    "shared = comfy_stubs.import_submodule('shared_weight_cache').shared_weight_cache\n"
+    "import torch\n"
+    "def anon_kb():\n"
+    "    try:\n"
+    "        with open('/proc/self/status') as f:\n"
+    "            return next(int(line.split()[1]) for line in f if line.startswith('RssAnon:'))\n"
+    "    except (OSError, StopIteration):\n"
+    "        return 0\n"
+    "loads = []\n"
+    "def load(path):\n"
+    "    loads.append(path)\n"
+    "    return loader.load_lora_file(path)\n"
+    "open(os.path.join(config['barrier'], f'ready.{os.getpid()}'), 'w').close()\n"
+    "while not os.path.exists(os.path.join(config['barrier'], 'go')):\n"
+    "    time.sleep(0.001)\n"
+    "anon_before = anon_kb()\n"
+    "start = time.perf_counter()\n"
+    "held = []\n"
+    "for path in config['paths']:\n"
+    "    stat = os.stat(path)\n"
+    "    stamp = (stat.st_mtime_ns, stat.st_size)\n"
+    "    held.append(shared.get_or_load(path, stamp, load) if shared.enabled else load(path))\n"
+    "elapsed = time.perf_counter() - start\n"
+    "private_mb = (anon_kb() - anon_before) / 1024\n"
+    "checksum = sum(float(v.sum(dtype=torch.float64)) for lora in held for v in lora.values())\n"
+    "print(json.dumps({'seconds': elapsed, 'loads': len(loads), 'checksum': checksum, 'private_mb': private_mb}))\n"
+)
+
+
+def bench_shared_cache(ctx: BenchContext) -> None:
+    """多个进程同时加载同一组 LoRA：比较各自解析与共享目录（每个文件只解析一次，其余进程直接映射）"""
+    shared_module = comfy_stubs.import_submodule("shared_weight_cache")
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        torch = None
+    if shared_module is None or torch is None or shared_module.fcntl is None:
+        print("  跳过 shared_cache：需要 torch 和 fcntl")
+        return
+
+    root = os.path.join(ctx.workdir, "shared_loras")
+    os.makedirs(root, exist_ok=True)
+    size_mb = 8 if ctx.quick else 32
+    paths = []
+    for i in range(4):
+        path = os.path.join(root, f"shared_{i}.safetensors")
+        if not os.path.exists(path):
+            write_large_lora(path, size_mb, seed=300 + i)
+        paths.append(path)
+
+    processes = 4
+    for label, shared_dir in (("per-process", ""), ("shared", os.path.join(ctx.workdir, "shm"))):
+        outputs = _run_shared_cache_processes(ctx, processes, root, paths, shared_dir)
+        if outputs is None:
+            return
+        loads = sum(output["loads"] for output in outputs)
+        stats = _stats([output["seconds"] for output in outputs])
+        private_mb = statistics.fmean(output["private_mb"] for output in outputs)
+        ctx.record("shared_cache", f"{processes} processes ({label})",
+                   {"loras": len(paths), "size_mb": size_mb}, stats,
+                   parses=loads, private_mb_per_process=round(private_mb, 1))
+
+
+def _run_shared_cache_processes(ctx: BenchContext, processes: int, root: str, paths: List[str],
+                                shared_dir: str) -> Optional[List[Dict[str, Any]]]:
+    barrier = tempfile.mkdtemp(dir=ctx.workdir)
+    config = json.dumps({"lora_dir": root, "shared_dir": shared_dir, "paths": paths, "barrier": barrier})
+    children = [
+        subprocess.Popen([sys.executable, "-c", _SHARED_CACHE_SCRIPT, config],
+                         cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    # 所有子进程完成导入后同时开始
+    deadline = time.monotonic() + 60
+    while len([n for n in os.listdir(barrier) if n.startswith("ready.")]) < processes:
+        if time.monotonic() > deadline or any(child.poll() is not None for child in children):
+            break
+        time.sleep(0.005)
+    open(os.path.join(barrier, "go"), "w").close()
+
+    outputs = []
+    for child in children:
+        stdout, stderr = child.communicate()
+        try:
+            outputs.append(json.loads(stdout.strip().splitlines()[-1]))
+        except (IndexError, ValueError):
+            print("  shared_cache 基准失败：子进程没有输出结果")
+            print(stderr[-2000:])
+            ctx.failures.append("shared_cache: subprocess failed")
+            return None
+    return outputs
+
+
+# 插件导入耗时预算（毫秒，不含 ComfyUI 自身模块）
+IMPORT_BUDGET_MS = 50.0
+
+_IMPORT_SCRIPT = (
+    "import os, sys, json, time, tempfile\n"
+    "os.environ['EASY_SETTING_WATCH_MODE'] = 'off'\n"
+    "from benchmarks import comfy_stubs\n"
+    "workdir = tempfile.mkdtemp()\n"
+    "comfy_stubs.install_stubs([workdir], workdir)\n"
+    "before = set(sys.modules)\n"
+    "start = time.perf_counter()\n"
+    "comfy_stubs.load_package()\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({'seconds': elapsed, 'modules': sorted(set(sys.modules) - before)}))\n"
+)
+
+
+def bench_import(ctx: BenchContext) -> None:
+    """在全新的子进程中测量插件的启动导入耗时和新加载的模块"""
+    samples = []
+    modules: List[str] = []
+    for _ in range(ctx.repeat(5, 3)):
+        result = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        try:
+            parsed = json.loads(result.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            print("  import 基准失败：子进程没有输出结果")
+            print(result.stderr[-2000:])
+            ctx.failures.append("import: subprocess failed")
+            return
+        samples.append(parsed["seconds"])
+        modules = parsed["modules"]
+
+    stats = _stats(samples)
+    ctx.record("import", "package import", {}, stats, budget_ms=IMPORT_BUDGET_MS, modules=len(modules))
+    if stats["p50_ms"] > IMPORT_BUDGET_MS:
+        ctx.failures.append(f"import: {stats['p50_ms']:.1f}ms exceeds budget {IMPORT_BUDGET_MS}ms")
+
+
+BENCHMARKS: Dict[str, Callable[[BenchContext], None]] = {
+    "import": bench_import,
+    "loader": bench_loader,
+    "keymap": bench_keymap,
+    "weight_cache": bench_weight_cache,
+    "stacker": bench_stacker,
+    "hash": bench_hash,
+    "hash_on_load": bench_hash_on_load,
+    "metadata": bench_metadata,
+    "trained_words": bench_trained_words,
+    "routes": bench_routes,
+    "load": bench_load,
+    "enrich": bench_enrich,
+    "civitai_client": bench_civitai_client,
+    "thumbnail": bench_thumbnail,
+    "sidecar": bench_sidecar,
+    "bake": bench_bake,
+    "shared_cache": bench_shared_cache,
+    "warm": bench_warm,
+    "resolve": bench_resolve,
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EasySettingPipes 离线基准测试")
+    parser.add_argument("--output", default="bench_results.json", help="结果 JSON 路径")
+    parser.add_argument("--only", default="", help=f"逗号分隔的分组：{','.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="缩小规模和重复次数")
+    parser.add_argument("--workdir", default=None, help="测试数据目录（默认使用临时目录并在结束后删除）")
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()] or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的分组: {', '.join(unknown)}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="easy_setting_bench_")
+    try:
+        ctx = BenchContext(workdir, args.quick)
+        for name in selected:
+            print(f"[{name}]")
+            BENCHMARKS[name](ctx)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "commit": _git_commit(),
+            "quick": args.quick,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": ctx.results,
+        "failures": ctx.failures,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {args.output}")
+    if ctx.failures:
+        print("预算检查失败：")
+        for failure in ctx.failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Civitai HTTP 客户端
+所有 Civitai 请求（信息接口的单个查询、批量补全、预览图下载）共用一个连接池，
+同一主机的请求复用 keep-alive 连接，不再为每次查询重新建立 TCP + TLS 连接。
+
+- 连接超时和读取超时分开设置
+- 可以通过 EASY_SETTING_CIVITAI_PROXY 指定代理（未设置时沿用 HTTP(S)_PROXY 环境变量）
+- 熔断：连续多次上游错误（超时、连接失败、429、5xx）后在冷却时间内直接失败，
+  不再让每个请求都等待超时；冷却结束后只放行一个探测请求，成功后恢复
+- 基础地址可配置（EASY_SETTING_CIVITAI_BASE_URL），测试时可指向本地替身
+
+requests 在第一次请求时才导入。requests 是阻塞的：所有调用方都必须在事件循环之外
+（run_in_executor / SingleFlight / 后台线程）调用，在事件循环线程中调用 request 会抛出 RuntimeError。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# Civitai 基础地址
+CIVITAI_BASE_URL = get_env_setting("EASY_SETTING_CIVITAI_BASE_URL", "https://civitai.com")
+# 建立连接的超时（秒）
+CIVITAI_CONNECT_TIMEOUT = get_env_setting("EASY_SETTING_CIVITAI_CONNECT_TIMEOUT", 3.05)
+# 等待响应数据的超时（秒）
+CIVITAI_READ_TIMEOUT = get_env_setting("EASY_SETTING_CIVITAI_READ_TIMEOUT", 10.0)
+# 代理地址，如 http://127.0.0.1:7890
+CIVITAI_PROXY = get_env_setting("EASY_SETTING_CIVITAI_PROXY", "")
+# 每个主机保留的连接数
+CIVITAI_POOL_SIZE = get_env_setting("EASY_SETTING_CIVITAI_POOL_SIZE", 8)
+# 连续失败多少次后熔断
+CIVITAI_BREAKER_THRESHOLD = get_env_setting("EASY_SETTING_CIVITAI_BREAKER_THRESHOLD", 5)
+# 熔断后的冷却时间（秒）
+CIVITAI_BREAKER_COOLDOWN = get_env_setting("EASY_SETTING_CIVITAI_BREAKER_COOLDOWN", 30.0)
+
+BY_HASH_PATH = "/api/v1/model-versions/by-hash"
+# 计入熔断的 HTTP 状态码（其余状态说明上游正常工作）
+FAILURE_STATUS = {429, 500, 502, 503, 504}
+# 半开状态下探测请求进行中时，其他请求建议的等待时间（秒）
+PROBE_RETRY_AFTER = 1.0
+
+
+class CivitaiUnavailable(Exception):
+    """熔断中，请求没有发出"""
+
+    def __init__(self, retry_after: float) -> None:
+        self.retry_after = retry_after
+        super().__init__(f"Civitai is unavailable after repeated errors, retry in {retry_after:.1f}s")
+
+
+class CivitaiClient:
+    """
+    带连接池和熔断的 Civitai 客户端（线程安全，阻塞，不能在事件循环线程中调用）
+
+    Args:
+        base_url: Civitai 基础地址
+        connect_timeout: 建立连接的超时（秒）
+        read_timeout: 等待响应数据的超时（秒）
+        proxy: 代理地址，为空时使用环境变量中的代理设置
+        pool_size: 每个主机保留的连接数
+        failure_threshold: 连续失败多少次后熔断
+        cooldown: 熔断后的冷却时间（秒）
+    """
+
+    def __init__(
+        self,
+        base_url: str = CIVITAI_BASE_URL,
+        connect_timeout: float = CIVITAI_CONNECT_TIMEOUT,
+        read_timeout: float = CIVITAI_READ_TIMEOUT,
+        proxy: str = CIVITAI_PROXY,
+        pool_size: int = CIVITAI_POOL_SIZE,
+        failure_threshold: int = CIVITAI_BREAKER_THRESHOLD,
+        cooldown: float = CIVITAI_BREAKER_COOLDOWN
+    ) -> None:
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.proxy = proxy
+        self.pool_size = max(1, pool_size)
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._session = None
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> Any:
+        """共享的 requests.Session（首次访问时创建；请求应通过 request 发出以经过熔断检查）"""
+        with self._lock:
+            if self._session is None:
+                import requests
+
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                if self.proxy:
+                    session.proxies.update({"http": self.proxy, "https": self.proxy})
+                self._session = session
+            return self._session
+
+    def timeout(self, read_timeout: Optional[float] = None) -> Tuple[float, float]:
+        """requests 的 (连接超时, 读取超时)"""
+        return (self.connect_timeout, read_timeout if read_timeout is not None else self.read_timeout)
+
+    def url(self, path: str) -> str:
+        return self.base_url.rstrip("/") + path
+
+    @property
+    def state(self) -> str:
+        """熔断状态：closed / open / half_open"""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() < self._opened_at + self.cooldown else "half_open"
+
+    def _acquire(self) -> None:
+        """熔断中时抛出 CivitaiUnavailable；冷却结束后只放行一个探测请求"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CivitaiUnavailable(remaining)
+            if self._probing:
+                raise CivitaiUnavailable(PROBE_RETRY_AFTER)
+            self._probing = True
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            probe = self._probing
+            self._probing = False
+            if ok:
+                if self._opened_at is not None:
+                    logger.info("Civitai 恢复响应，解除熔断")
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if probe or self._failures >= self.failure_threshold:
+                if self._opened_at is None or probe:
+                    logger.warning(
+                        f"Civitai 连续 {self._failures} 次请求失败，{self.cooldown:.0f} 秒内不再请求"
+                    )
+                self._opened_at = time.monotonic()
+
+    def request(self, method: str, url: str, read_timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        发送请求（经过熔断检查）
+
+        Args:
+            method: HTTP 方法
+            url: 完整地址，或以 / 开头的 API 路径（拼接到基础地址后）
+            read_timeout: 覆盖默认的读取超时
+            **kwargs: 传给 requests.Session.request 的其他参数
+
+        Returns:
+            requests.Response（429 / 5xx 也会返回，只是计入熔断）
+
+        Raises:
+            CivitaiUnavailable: 熔断中
+            requests.RequestException: 超时或连接失败
+            RuntimeError: 在事件循环线程中调用
+        """
+        import requests
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("CivitaiClient.request blocks, call it from an executor instead of the event loop")
+        self._acquire()
+        if url.startswith("/"):
+            url = self.url(url)
+        try:
+            response = self.session.request(method, url, timeout=self.timeout(read_timeout), **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(False)
+            raise
+        except BaseException:
+            # 未发出请求（如参数错误），释放探测名额
+            with self._lock:
+                self._probing = False
+            raise
+        self._record(response.status_code not in FAILURE_STATUS)
+        return response
+
+    def get_model_version_by_hash(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        按文件哈希查询模型版本
+
+        Returns:
+            Civitai 数据；未找到时返回 {"error": "Model not found"}；其他状态码返回 None
+
+        Raises:
+            CivitaiUnavailable: 熔断中
+            requests.RequestException: 超时或连接失败
+        """
+        response = self.request("GET", f"{BY_HASH_PATH}/{file_hash}")
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 404:
+            return {"error": "Model not found"}
+        return None
+
+    def lookup_hashes(self, hashes: List[str]) -> Any:
+        """批量按哈希查询（POST by-hash），返回原始响应，由调用方处理状态码和重试"""
+        return self.request("POST", BY_HASH_PATH, json=hashes)
+
+    def close(self) -> None:
+        """关闭连接池（之后的请求会重新创建）"""
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+# 全局 Civitai 客户端
+civitai_client = CivitaiClient()
+
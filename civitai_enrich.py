@@ -0,0 +1,480 @@
+"""
+Civitai 批量补全 - 为整个 Lora 库获取 Civitai 信息
+使用本地哈希索引中已知的哈希，分批调用 Civitai 的批量查询接口，
+受令牌桶限流和并发数限制，失败时指数退避重试。
+结果写入本地 Civitai 缓存，任务状态保存在磁盘上，重启后可以继续。
+
+本模块由 lora_routes 在第一次收到相关请求时才导入。
+"""
+
+import os
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+from . import lora_api
+from .civitai_client import CivitaiClient, CivitaiUnavailable, civitai_client
+from .lora_index import lora_index, LoraEntry
+from .lora_metrics import timed, record_error
+from .persistent_cache import (
+    CivitaiCache, HashStore, civitai_cache, hash_store, get_data_dir, read_json_file, write_json_file
+)
+from .sidecars import sidecar_reader, write_sidecars
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# 每秒最多发起的 Civitai 请求数（0 表示不限制）
+ENRICH_RATE = get_env_setting("EASY_SETTING_CIVITAI_RATE", 1.0)
+# 令牌桶容量，允许的短时突发请求数
+ENRICH_BURST = 2.0
+# 同时进行的请求数
+ENRICH_CONCURRENCY = get_env_setting("EASY_SETTING_CIVITAI_CONCURRENCY", 2)
+# 每个批量请求包含的哈希数
+ENRICH_BATCH_SIZE = get_env_setting("EASY_SETTING_CIVITAI_BATCH_SIZE", 50)
+# 单个批次的最大重试次数和退避时间（秒）
+ENRICH_MAX_RETRIES = 5
+ENRICH_BACKOFF_BASE = 1.0
+ENRICH_BACKOFF_MAX = 60.0
+# 这些状态码视为临时错误，退避后重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 这些状态的任务在重启或取消后可以继续
+RESUMABLE_STATUS = {"interrupted", "cancelled", "partial"}
+
+NOT_FOUND = {"error": "Model not found"}
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+
+    Args:
+        rate: 每秒补充的令牌数（0 表示不限制）
+        capacity: 桶容量，即允许的突发请求数
+    """
+
+    def __init__(self, rate: float, capacity: float = ENRICH_BURST) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """
+        取得一个令牌，没有令牌时等待
+
+        Returns:
+            是否取得令牌；stop 被设置时返回 False
+        """
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait = (1.0 - self._tokens) / self.rate
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
+
+
+def match_batch_results(hashes: Iterable[str], versions: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    将批量查询返回的模型版本对应回请求的哈希
+
+    批量接口只返回找到的版本，需要根据 files[].hashes 匹配；
+    没有匹配到的哈希视为 Civitai 上不存在。
+    """
+    wanted = {h.lower() for h in hashes}
+    results: Dict[str, Dict[str, Any]] = {}
+    for version in versions if isinstance(versions, list) else []:
+        if not isinstance(version, dict):
+            continue
+        for file_info in version.get("files") or []:
+            for value in (file_info.get("hashes") or {}).values():
+                file_hash = str(value).lower()
+                if file_hash in wanted and file_hash not in results:
+                    results[file_hash] = version
+    for file_hash in wanted:
+        results.setdefault(file_hash, dict(NOT_FOUND))
+    return results
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（只支持秒数形式）"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class CivitaiEnricher:
+    """
+    Civitai 批量补全任务
+
+    工作原理：
+    - 从 Lora 目录索引、磁盘哈希索引和旁路文件收集已知哈希（可选计算缺失的哈希）
+    - 跳过本地缓存中已有结果的哈希，剩余的按批次查询
+    - 每个请求先从令牌桶取令牌，并发数由线程池大小限制
+    - 429 / 5xx / 超时按指数退避重试，服务器给出 Retry-After 时以其为准
+    - 请求经过共享的 Civitai 客户端，复用连接池；客户端熔断时等到冷却结束再重试
+    - 每完成一个批次就把剩余哈希写入状态文件，进程重启后可继续
+    """
+
+    def __init__(
+        self,
+        cache: CivitaiCache = civitai_cache,
+        hashes: HashStore = hash_store,
+        client: Optional[CivitaiClient] = None,
+        rate: float = ENRICH_RATE,
+        concurrency: int = ENRICH_CONCURRENCY,
+        batch_size: int = ENRICH_BATCH_SIZE,
+        state_path: Optional[str] = None
+    ) -> None:
+        self.cache = cache
+        self.hashes = hashes
+        self.client = client or civitai_client
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.bucket = TokenBucket(rate)
+        self._state_path = state_path
+        self._state: Optional[Dict[str, Any]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def state_path(self) -> str:
+        if self._state_path is None:
+            self._state_path = os.path.join(get_data_dir(), "civitai_enrich.json")
+        return self._state_path
+
+    def _load_state(self) -> Dict[str, Any]:
+        # 调用方持有锁
+        if self._state is None:
+            state = read_json_file(self.state_path)
+            if not isinstance(state, dict):
+                state = {"status": "idle", "pending": []}
+            elif state.get("status") == "running":
+                # 上次运行时进程被中断
+                state["status"] = "interrupted"
+            self._state = state
+        return self._state
+
+    def _save_state(self) -> None:
+        with self._lock:
+            snapshot = dict(self._load_state())
+            snapshot["pending"] = list(snapshot.get("pending", []))
+        try:
+            write_json_file(self.state_path, snapshot)
+        except OSError as e:
+            logger.warning(f"无法保存 Civitai 补全任务状态: {e}")
+
+    def _update(self, **changes: Any) -> None:
+        with self._lock:
+            state = self._load_state()
+            state.update(changes)
+            state["updatedAt"] = time.time()
+
+    def _increment(self, **amounts: int) -> None:
+        with self._lock:
+            state = self._load_state()
+            for key, amount in amounts.items():
+                state[key] = state.get(key, 0) + amount
+            state["updatedAt"] = time.time()
+
+    def progress(self) -> Dict[str, Any]:
+        """获取任务进度（不含待处理哈希列表）"""
+        with self._lock:
+            state = dict(self._load_state())
+        pending = state.pop("pending", [])
+        state["remaining"] = len(pending)
+        state["resumable"] = bool(pending) and state.get("status") in RESUMABLE_STATUS
+        return state
+
+    def start(self, force: bool = False, hash_missing: bool = False, restart: bool = False) -> bool:
+        """
+        启动补全任务；上次任务未完成时默认从中断处继续
+
+        Args:
+            force: 忽略本地缓存，重新查询所有哈希
+            hash_missing: 为还没有哈希的文件计算哈希（较慢）
+            restart: 丢弃未完成的任务，重新收集哈希
+
+        Returns:
+            是否启动了新任务（已有任务在运行时返回 False）
+        """
+        with self._lock:
+            if self.running:
+                return False
+            state = self._load_state()
+            resume = (
+                not restart
+                and state.get("status") in RESUMABLE_STATUS
+                and bool(state.get("pending"))
+            )
+            if resume:
+                force = state.get("force", False)
+                state.update(status="running", error=None, failed=0, finishedAt=None)
+            else:
+                self._state = {
+                    "status": "running",
+                    "phase": "collect",
+                    "force": force,
+                    "pending": [],
+                    "total": 0,
+                    "done": 0,
+                    "found": 0,
+                    "missing": 0,
+                    "failed": 0,
+                    "hashed": 0,
+                    "requests": 0,
+                    "retries": 0,
+                    "startedAt": time.time(),
+                    "finishedAt": None,
+                    "error": None,
+                }
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(resume, force, hash_missing),
+                name="EasySettingCivitaiEnrich", daemon=True
+            )
+            self._thread.start()
+        return True
+
+    def cancel(self) -> bool:
+        """请求取消任务，已完成的批次会保留"""
+        if not self.running:
+            return False
+        self._stop.set()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待任务结束，返回任务是否已结束"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.running
+
+    def _collect(self, hash_missing: bool) -> Dict[str, List[LoraEntry]]:
+        """收集索引中每个文件的哈希，返回 哈希 -> 文件列表"""
+        targets: Dict[str, List[LoraEntry]] = {}
+        for entry in lora_index.entries():
+            if self._stop.is_set():
+                break
+            stamp = (entry.mtime_ns, entry.size)
+            file_hash = self.hashes.get(entry.path, stamp)
+            if file_hash is None:
+                # 其他工具写的旁路文件可能已经包含哈希和 Civitai 数据
+                sidecar = sidecar_reader.read(entry.path, entry.mtime_ns, entry.size)
+                file_hash = sidecar.get("sha256")
+                if file_hash:
+                    self.hashes.put(entry.path, stamp, file_hash)
+                    if sidecar.get("civitai") and not self.cache.has(file_hash):
+                        self.cache.put(file_hash, sidecar["civitai"])
+            if file_hash is None and hash_missing:
+                file_hash = lora_api.get_cached_file_hash(entry.path, stamp)
+                if file_hash:
+                    self._increment(hashed=1)
+            if file_hash:
+                targets.setdefault(file_hash.lower(), []).append(entry)
+        self.hashes.flush()
+        return targets
+
+    def _run(self, resume: bool, force: bool, hash_missing: bool) -> None:
+        try:
+            targets = self._collect(hash_missing and not resume)
+            with self._lock:
+                state = self._load_state()
+                pending = state["pending"] if resume else sorted(targets)
+            if not force:
+                pending = [h for h in pending if not self.cache.has(h)]
+            with self._lock:
+                state = self._load_state()
+                state["pending"] = pending
+                if not resume:
+                    state["total"] = len(pending)
+                state["phase"] = "lookup"
+            self._save_state()
+
+            self._lookup_all(pending, targets)
+
+            with self._lock:
+                state = self._load_state()
+                if not state["pending"]:
+                    status = "completed"
+                elif self._stop.is_set():
+                    status = "cancelled"
+                else:
+                    status = "partial"
+            self._update(status=status, phase=None, finishedAt=time.time())
+        except Exception as e:
+            logger.error(f"Civitai 补全任务失败: {e}", exc_info=True)
+            record_error("civitai_enrich")
+            self._update(status="interrupted", phase=None, error=str(e), finishedAt=time.time())
+        finally:
+            self._save_state()
+
+    def _lookup_all(self, pending: List[str], targets: Dict[str, List[LoraEntry]]) -> None:
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        if not batches:
+            return
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="EasySettingCivitai") as pool:
+            futures = {pool.submit(self._lookup_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    record_error("civitai_enrich")
+                    self._increment(failed=len(batch))
+                    self._update(error=str(e))
+                    continue
+                if results is None:
+                    continue
+                self._store_results(results, targets)
+
+    def _store_results(self, results: Dict[str, Dict[str, Any]], targets: Dict[str, List[LoraEntry]]) -> None:
+        found = 0
+        for file_hash, data in results.items():
+            self.cache.put(file_hash, data)
+            if "error" not in data:
+                found += 1
+            # 让信息接口的 ETag 失效，下一次请求即可看到补全的数据
+            for entry in targets.get(file_hash, ()):
+                lora_api.info_etag_cache.invalidate(entry.name)
+                write_sidecars(entry.path, entry.mtime_ns, civitai=data)
+        with self._lock:
+            state = self._load_state()
+            state["pending"] = [h for h in state["pending"] if h not in results]
+        self._increment(done=len(results), found=found, missing=len(results) - found)
+        self._save_state()
+
+    def _lookup_batch(self, hashes: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        查询一个批次，临时错误时退避重试
+
+        Returns:
+            哈希 -> Civitai 数据；任务被取消时返回 None
+
+        Raises:
+            RuntimeError: 重试次数用尽或遇到不可重试的错误
+        """
+        import requests
+
+        error = None
+        for attempt in range(ENRICH_MAX_RETRIES + 1):
+            if not self.bucket.acquire(self._stop):
+                return None
+            retry_after = None
+            try:
+                with timed("civitai"):
+                    response = self.client.lookup_hashes(hashes)
+                self._increment(requests=1)
+                if response.status_code == 200:
+                    return match_batch_results(hashes, response.json())
+                if response.status_code not in RETRY_STATUS:
+                    raise RuntimeError(f"Civitai returned HTTP {response.status_code}")
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                error = f"Civitai returned HTTP {response.status_code}"
+            except CivitaiUnavailable as e:
+                # 熔断中，请求没有发出
+                retry_after = min(ENRICH_BACKOFF_MAX, e.retry_after)
+                error = str(e)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self._increment(requests=1)
+                error = str(e)
+
+            if attempt == ENRICH_MAX_RETRIES:
+                break
+            self._increment(retries=1)
+            if retry_after is None:
+                retry_after = min(ENRICH_BACKOFF_MAX, ENRICH_BACKOFF_BASE * 2 ** attempt)
+                retry_after *= random.uniform(0.5, 1.0)
+            if self._stop.wait(retry_after):
+                return None
+        raise RuntimeError(error or "Civitai lookup failed")
+
+
+# 全局补全任务实例
+civitai_enricher = CivitaiEnricher()
+
+
+def _query_flag(request: web.Request, name: str) -> bool:
+    return request.rel_url.query.get(name, 'false').lower() == 'true'
+
+
+async def api_get_enrich_progress(request: web.Request) -> web.Response:
+    """
+    获取 Civitai 批量补全任务的进度
+
+    返回格式:
+        {
+            "status": "idle" | "running" | "completed" | "partial" | "cancelled" | "interrupted",
+            "phase": "collect" | "lookup" | null,
+            "total": 需要查询的哈希数,
+            "done": 已完成数, "found": 找到数, "missing": 未找到数, "failed": 失败数,
+            "remaining": 剩余数, "resumable": 是否可以继续,
+            "requests": 请求数, "retries": 重试次数, "hashed": 新计算的哈希数,
+            "startedAt": ..., "finishedAt": ..., "updatedAt": ..., "error": ...
+        }
+    """
+    try:
+        return lora_api.json_response(civitai_enricher.progress(), headers={"Cache-Control": "no-store"})
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
+
+
+async def api_start_enrich(request: web.Request) -> web.Response:
+    """
+    启动 Civitai 批量补全任务（上次任务未完成时从中断处继续）
+
+    查询参数:
+        force: 忽略本地缓存重新查询（可选，默认为 false）
+        hash_missing: 为还没有哈希的文件计算哈希（可选，默认为 false）
+        restart: 丢弃未完成的任务重新开始（可选，默认为 false）
+
+    已有任务在运行时返回 409 和当前进度，否则返回 202 和进度。
+    """
+    try:
+        started = civitai_enricher.start(
+            force=_query_flag(request, 'force'),
+            hash_missing=_query_flag(request, 'hash_missing'),
+            restart=_query_flag(request, 'restart'),
+        )
+        return lora_api.json_response(civitai_enricher.progress(), status=202 if started else 409)
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
+
+
+async def api_cancel_enrich(request: web.Request) -> web.Response:
+    """取消正在运行的补全任务，已完成的批次会保留，之后可以继续"""
+    try:
+        civitai_enricher.cancel()
+        return lora_api.json_response(civitai_enricher.progress())
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
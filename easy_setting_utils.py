@@ -3,7 +3,11 @@ ComfyUI 自定义节点工具库
 提供 rgthree 风格的灵活输入类型和其他实用工具
 """
 
-from typing import Any, Dict, Optional
+import os
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar('T')
 
 
 class AnyType(str):
@@ -114,6 +118,53 @@ class FlexibleOptionalInputType(dict):
         return True
 
 
+class SingleFlight:
+    """
+    合并相同 key 的并发调用（single-flight）
+    
+    功能：
+    - 同一时刻相同 key 的调用只执行一次，其余调用等待同一个结果
+    - 函数在线程池中执行，不阻塞事件循环
+    - 计算完成后立即移除记录，之后的调用会重新执行
+    
+    示例：
+        flight = SingleFlight()
+        info = await flight.run(("a.safetensors", True), load_info, "a.safetensors")
+    """
+    
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+    
+    def __len__(self) -> int:
+        """当前进行中的计算数量"""
+        return len(self._inflight)
+    
+    async def run(self, key: Hashable, func: Callable[..., T], *args: Any) -> T:
+        """执行 func(*args)，相同 key 的并发调用共享结果
+        
+        Args:
+            key: 用于合并调用的 key
+            func: 要在线程池中执行的同步函数
+            *args: 传给 func 的参数
+        
+        Returns:
+            func 的返回值（并发调用方得到同一个对象）
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(None, func, *args)
+            self._inflight[key] = future
+            
+            def _done(done_future: "asyncio.Future[Any]") -> None:
+                if self._inflight.get(key) is done_future:
+                    del self._inflight[key]
+            
+            future.add_done_callback(_done)
+        # shield：某个调用方被取消（如客户端断开）时不影响其他等待者
+        return await asyncio.shield(future)
+
+
 # 创建全局 any_type 实例
 any_type = AnyType("*")
 
@@ -243,3 +294,31 @@ def is_valid_lora_config(key: str, value: Any) -> bool:
         'lora' in value and
         'strength' in value
     )
+
+
+def get_env_setting(name: str, default: T) -> T:
+    """读取环境变量配置，并转换为默认值的类型
+    
+    Args:
+        name: 环境变量名（如 "EASY_SETTING_WATCH_MODE"）
+        default: 默认值，同时决定返回值类型（bool/int/float/str）
+    
+    Returns:
+        转换后的配置值，未设置或格式错误时返回默认值
+    
+    Example:
+        get_env_setting("EASY_SETTING_WATCH_INTERVAL", 10.0)  # 10.0 或环境变量中的值
+    """
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    
+    value = value.strip()
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')  # type: ignore[return-value]
+    if default is None or isinstance(default, str):
+        return value  # type: ignore[return-value]
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
@@ -1,26 +1,55 @@
 """
 Lora 信息 API - 为前端提供 Lora 详细信息接口
 基于rgthree-comfy的核心算法实现，解决训练词汇中JSON片段的问题
+
+本模块由 lora_routes 在第一次收到请求时才导入，
+启动阶段不会加载 requests 等较重的依赖。
 """
 
 import os
+import asyncio
 import json
 import hashlib
+import heapq
 import re
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
 from aiohttp import web
-from server import PromptServer
-import requests
 
-import folder_paths
-from .easy_setting_utils import get_dict_value
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .lora_index import lora_index, IndexChange, MissingLorasError
+from .lora_watcher import lora_watcher
+from .lora_metrics import timed, record_cache, record_error
+from .persistent_cache import civitai_cache, hash_store
+from .sidecars import sidecar_reader, write_sidecars
+from .lora_bake import BAKE_RANK, bake_stack, normalize_stack
+from .civitai_client import civitai_client, CivitaiUnavailable
+from .thumbnail_cache import thumbnail_cache, thumbnail_url, is_allowed_image_url, CACHE_CONTROL
+from .easy_setting_utils import get_dict_value, set_dict_value, dict_has_key, SingleFlight, get_env_setting
+
+# 哈希模式：quick（本地标识使用快速哈希，只在查询 Civitai 时计算完整 SHA256）/ full（总是计算完整 SHA256）
+HASH_MODE = get_env_setting("EASY_SETTING_HASH_MODE", "quick")
+# 计算完整哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1 << 20
+# 快速哈希：文件大小 + 均匀分布的若干固定大小采样块
+QUICK_HASH_SAMPLE_SIZE = 64 * 1024
+QUICK_HASH_SAMPLES = 4
 
-# 获取 PromptServer 实例并注册路由
-routes = PromptServer.instance.routes
+# 训练词汇配置
+DEFAULT_TRAINED_WORDS_TOP_K = 200  # 未指定 top_k 时默认返回的训练词汇数量
+TRAINED_WORDS_CACHE_SIZE = 64  # 最多缓存多少个文件的训练词汇排序结果
 
-# Civitai API 配置
-CIVITAI_API_URL = "https://civitai.com/api/v1/model-versions/by-hash"
-CIVITAI_TIMEOUT = 10  # 秒
+# 列表接口配置
+LIST_MAX_LIMIT = 5000  # 指定 limit 时单页最多返回的条目数
+
+# 信息接口 ETag 配置
+INFO_ETAG_TTL = 300  # 秒，在此时间内可直接根据 ETag 返回 304，无需访问磁盘
 
 
 def file_exists(path):
@@ -37,6 +66,12 @@ def file_exists(path):
     return False
 
 
+def _file_stamp(file_path: str) -> Tuple[int, int]:
+    """返回用于缓存校验的 (mtime_ns, size)"""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
 def get_file_hash(file_path: str, algorithm: str = 'sha256') -> str:
     """计算文件的哈希值
     
@@ -55,11 +90,173 @@ def get_file_hash(file_path: str, algorithm: str = 'sha256') -> str:
     try:
         hash_obj = hashlib.new(algorithm)
         with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
                 hash_obj.update(chunk)
         return hash_obj.hexdigest()
     except Exception as e:
+        record_error("hash")
+        return ""
+
+
+def get_quick_hash(file_path: str, size: Optional[int] = None) -> str:
+    """计算文件的快速哈希
+    
+    只读取文件开头、结尾和中间的几个采样块，与文件大小一起计算 BLAKE2b，
+    耗时与文件大小无关。用作本地标识和去重（移动或复制后的文件按快速哈希找回已知的 SHA256），
+    不能用于 Civitai 查询。
+    小文件（不超过全部采样块大小）直接对整个文件计算。
+    
+    Args:
+        file_path: 文件路径
+        size: 已知的文件大小，避免重复 stat
+        
+    Returns:
+        32 位十六进制字符串，出错时返回空字符串
+    """
+    try:
+        if size is None:
+            size = os.path.getsize(file_path)
+        hash_obj = hashlib.blake2b(size.to_bytes(8, 'little'), digest_size=16)
+        with open(file_path, 'rb') as f:
+            if size <= QUICK_HASH_SAMPLE_SIZE * QUICK_HASH_SAMPLES:
+                hash_obj.update(f.read())
+            else:
+                last = size - QUICK_HASH_SAMPLE_SIZE
+                for i in range(QUICK_HASH_SAMPLES):
+                    f.seek(last * i // (QUICK_HASH_SAMPLES - 1))
+                    hash_obj.update(f.read(QUICK_HASH_SAMPLE_SIZE))
+        return hash_obj.hexdigest()
+    except Exception as e:
+        record_error("quick_hash")
+        return ""
+
+
+def get_auto_v2(file_hash: str) -> str:
+    """由完整 SHA256 得到 Civitai / A1111 使用的 AutoV2 短哈希（前 10 位，大写）"""
+    return file_hash[:10].upper() if file_hash else ""
+
+
+class FileStampCache:
+    """
+    以文件 (mtime, size) 校验的缓存
+    
+    用于缓存文件哈希、摘要等计算代价较高的结果，
+    避免每次打开信息弹窗都重新读取整个文件。
+    """
+    
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
+        # 内容每次变化时递增，用于生成列表接口的 ETag
+        self.generation = 0
+    
+    def get(self, file_path: str, stamp: Optional[Tuple[int, int]] = None) -> Any:
+        """获取已缓存的值，缓存无效时返回 None"""
+        if stamp is None:
+            stamp = _file_stamp(file_path)
+        with self._lock:
+            entry = self._entries.get(file_path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        return None
+    
+    def put(self, file_path: str, stamp: Tuple[int, int], value: Any) -> None:
+        with self._lock:
+            if self._entries.get(file_path) != (stamp, value):
+                self._entries[file_path] = (stamp, value)
+                self.generation += 1
+    
+    def invalidate(self, file_path: Optional[str] = None) -> None:
+        """清除指定文件（或全部）的缓存"""
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(file_path, None)
+            self.generation += 1
+
+
+# 文件路径 -> SHA256
+file_hash_cache = FileStampCache()
+# 文件路径 -> 快速哈希
+quick_hash_cache = FileStampCache()
+# 文件路径 -> 列表接口使用的摘要信息（如 baseModel）
+lora_summary_cache = FileStampCache()
+
+
+def get_cached_quick_hash(file_path: str, stamp: Optional[Tuple[int, int]] = None) -> str:
+    """
+    获取文件的快速哈希，优先使用缓存
+    
+    Args:
+        file_path: 文件路径
+        stamp: 已知的 (mtime_ns, size)，避免重复 stat
+        
+    Returns:
+        快速哈希字符串，出错时返回空字符串
+    """
+    try:
+        if stamp is None:
+            stamp = _file_stamp(file_path)
+    except OSError:
+        return ""
+    
+    quick_hash = quick_hash_cache.get(file_path, stamp)
+    if quick_hash is None:
+        quick_hash = get_quick_hash(file_path, stamp[1])
+        if quick_hash:
+            quick_hash_cache.put(file_path, stamp, quick_hash)
+    return quick_hash or ""
+
+
+def get_cached_file_hash(
+    file_path: str,
+    stamp: Optional[Tuple[int, int]] = None,
+    compute: bool = True
+) -> str:
+    """
+    获取文件的 SHA256，优先使用缓存
+    
+    Args:
+        file_path: 文件路径
+        stamp: 已知的 (mtime_ns, size)，避免重复 stat
+        compute: 缓存和旁路文件中都没有时是否读取整个文件计算
+        
+    Returns:
+        文件的哈希字符串，出错或未计算时返回空字符串
+    """
+    try:
+        if stamp is None:
+            stamp = _file_stamp(file_path)
+    except OSError:
         return ""
+    
+    file_hash = file_hash_cache.get(file_path, stamp)
+    record_cache("file_hash", file_hash is not None)
+    if file_hash is not None:
+        return file_hash
+    
+    # 内存未命中时依次查找：磁盘哈希索引（重启后仍然有效）、其他工具写的旁路文件、
+    # 快速哈希相同的文件（移动或复制过的同一文件）、重新计算
+    file_hash = hash_store.get(file_path, stamp)
+    record_cache("file_hash_disk", file_hash is not None)
+    if file_hash is None:
+        quick_hash = get_cached_quick_hash(file_path, stamp)
+        file_hash = sidecar_reader.read(file_path, stamp[0], stamp[1]).get("sha256")
+        record_cache("file_hash_sidecar", file_hash is not None)
+        if file_hash is None and quick_hash:
+            file_hash = hash_store.find_quick(quick_hash, stamp[1])
+            record_cache("file_hash_quick", file_hash is not None)
+        if file_hash is None and compute:
+            with timed("hash"):
+                file_hash = get_file_hash(file_path)
+            if file_hash:
+                write_sidecars(file_path, stamp[0], sha256=file_hash)
+        if file_hash:
+            hash_store.put(file_path, stamp, file_hash, quick_hash)
+    if file_hash:
+        file_hash_cache.put(file_path, stamp, file_hash)
+    return file_hash or ""
 
 
 def get_lora_metadata(file_path: str) -> Dict[str, Any]:
@@ -96,36 +293,181 @@ def get_lora_metadata(file_path: str) -> Dict[str, Any]:
                                 # 如果解析失败，保持原样
                                 pass
     except Exception as e:
+        record_error("metadata")
         data = None
 
     return data if data else {}
 
 
-def extract_trained_words(metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _iter_tag_counts(metadata: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
     """
-    从元数据中提取训练词汇
-    基于rgthree的 _merge_metadata 实现，避免JSON片段混入
+    逐个产出 ss_tag_frequency 中的 (tag, count)
+    使用rgthree的严格类型检查逻辑，避免JSON片段混入
+    """
+    tag_frequency = metadata.get('ss_tag_frequency')
+    if not isinstance(tag_frequency, dict):
+        return
+    
+    for bucket_value in tag_frequency.values():
+        if not isinstance(bucket_value, dict):
+            continue
+        for tag, count in bucket_value.items():
+            # 确保tag是字符串，避免JSON对象混入
+            if isinstance(tag, str) and not tag.startswith('{') and not tag.startswith('['):
+                yield tag, count if isinstance(count, (int, float)) else 0
+
+
+def aggregate_tag_counts(metadata: Dict[str, Any]) -> Dict[str, float]:
     """
-    trained_words = {}
+    流式汇总所有 bucket 中的标签计数
     
+    只保留 tag -> count 的映射，不为每个标签构建结果字典
+    """
+    counts: Dict[str, float] = {}
     if not isinstance(metadata, dict):
+        return counts
+    
+    for tag, count in _iter_tag_counts(metadata):
+        counts[tag] = counts.get(tag, 0) + count
+    return counts
+
+
+def rank_tag_counts(
+    counts: Dict[str, float],
+    limit: Optional[int] = None,
+    min_count: float = 0
+) -> List[Tuple[str, float]]:
+    """
+    按计数从高到低排列标签（计数相同时按标签名排序）
+    
+    Args:
+        counts: tag -> count 映射
+        limit: 只需要前 limit 个结果时使用堆选择，避免对完整列表排序
+        min_count: 最小计数，低于该值的标签被过滤
+        
+    Returns:
+        [(tag, count), ...]
+    """
+    items: Iterable[Tuple[str, float]] = counts.items()
+    if min_count > 0:
+        items = ((tag, count) for tag, count in items if count >= min_count)
+    
+    sort_key = lambda item: (-item[1], item[0])
+    if limit is None:
+        return sorted(items, key=sort_key)
+    if limit <= 0:
+        return []
+    return heapq.nsmallest(limit, items, key=sort_key)
+
+
+def _to_trained_words(ranked: Iterable[Tuple[str, float]]) -> List[Dict[str, Any]]:
+    """将 (tag, count) 列表转换为前端使用的训练词汇格式"""
+    return [{'word': tag, 'count': count, 'metadata': True} for tag, count in ranked]
+
+
+def extract_trained_words(
+    metadata: Dict[str, Any],
+    top_k: Optional[int] = None,
+    offset: int = 0,
+    min_count: float = 0
+) -> List[Dict[str, Any]]:
+    """
+    从元数据中提取训练词汇
+    基于rgthree的 _merge_metadata 实现，避免JSON片段混入
+    
+    Args:
+        metadata: Lora 元数据
+        top_k: 只返回计数最高的 top_k 个词汇（None 表示全部）
+        offset: 分页偏移量
+        min_count: 最小计数
+        
+    Returns:
+        按计数从高到低排列的训练词汇列表
+    """
+    counts = aggregate_tag_counts(metadata)
+    if not counts:
         return []
     
-    # 使用rgthree的严格类型检查逻辑
-    if 'ss_tag_frequency' in metadata and isinstance(metadata['ss_tag_frequency'], dict):
-        for bucket_value in metadata['ss_tag_frequency'].values():
-            if isinstance(bucket_value, dict):
-                for tag, count in bucket_value.items():
-                    # 确保tag是字符串，避免JSON对象混入
-                    if isinstance(tag, str) and not tag.startswith('{') and not tag.startswith('['):
-                        if tag not in trained_words:
-                            trained_words[tag] = {'word': tag, 'count': 0, 'metadata': True}
-                        # 累加计数
-                        if isinstance(count, (int, float)):
-                            trained_words[tag]['count'] = trained_words[tag]['count'] + count
+    offset = max(0, offset)
+    limit = None if top_k is None else offset + max(0, top_k)
+    return _to_trained_words(rank_tag_counts(counts, limit, min_count)[offset:])
+
+
+class TrainedWordsCache:
+    """
+    按文件缓存已汇总、已排序的训练词汇
+    
+    缓存以 (mtime, size) 校验，文件变化后自动失效。
+    每个文件只保存标签计数和已经排好序的最长前缀，
+    后续分页请求在前缀足够时直接切片返回。
+    """
+    
+    def __init__(self, max_entries: int = TRAINED_WORDS_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_page(
+        self,
+        file_path: str,
+        metadata: Dict[str, Any],
+        top_k: Optional[int] = None,
+        offset: int = 0,
+        min_count: float = 0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        获取一页训练词汇
+        
+        Returns:
+            (训练词汇列表, 满足 min_count 的词汇总数)
+        """
+        stamp = _file_stamp(file_path)
+        offset = max(0, offset)
+        limit = None if top_k is None else offset + max(0, top_k)
+        
+        with self._lock:
+            entry = self._entries.get(file_path)
+            record_cache("trained_words", entry is not None and entry['stamp'] == stamp)
+            if entry is None or entry['stamp'] != stamp:
+                entry = {
+                    'stamp': stamp,
+                    'counts': aggregate_tag_counts(metadata),
+                    'ranked': {},
+                    'totals': {},
+                }
+                self._entries[file_path] = entry
+            self._entries.move_to_end(file_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            
+            counts = entry['counts']
+            total = entry['totals'].get(min_count)
+            if total is None:
+                total = len(counts) if min_count <= 0 else sum(
+                    1 for count in counts.values() if count >= min_count
+                )
+                entry['totals'][min_count] = total
+            
+            # 已缓存的前缀 (ranked, complete)
+            ranked, complete = entry['ranked'].get(min_count, ([], False))
+            if not complete and (limit is None or limit > len(ranked)):
+                ranked = rank_tag_counts(counts, limit, min_count)
+                complete = limit is None or len(ranked) < limit
+                entry['ranked'][min_count] = (ranked, complete)
+        
+        end = None if limit is None else limit
+        return _to_trained_words(ranked[offset:end]), total
     
-    result = list(trained_words.values())
-    return result
+    def invalidate(self, file_path: Optional[str] = None) -> None:
+        """清除指定文件（或全部）的缓存"""
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(file_path, None)
+
+
+trained_words_cache = TrainedWordsCache()
 
 
 def get_civitai_info_sync(file_hash: str) -> Optional[Dict[str, Any]]:
@@ -135,20 +477,20 @@ def get_civitai_info_sync(file_hash: str) -> Optional[Dict[str, Any]]:
     if not file_hash:
         return None
     
+    # 延迟导入：只有真正查询 Civitai 时才加载 requests
+    import requests
+    
     try:
-        url = f"{CIVITAI_API_URL}/{file_hash}"
-        response = requests.get(url, timeout=CIVITAI_TIMEOUT)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data
-        elif response.status_code == 404:
-            return {"error": "Model not found"}
-        else:
-            return None
+        return civitai_client.get_model_version_by_hash(file_hash)
+    except CivitaiUnavailable:
+        # 熔断中，直接返回，不等待超时
+        record_error("civitai_unavailable")
+        return None
     except requests.exceptions.Timeout:
+        record_error("civitai_timeout")
         return None
     except requests.exceptions.RequestException as e:
+        record_error("civitai")
         return None
 
 
@@ -259,42 +601,61 @@ def merge_civitai_data(info: Dict[str, Any], civitai_data: Dict[str, Any]) -> No
     info['raw']['civitai'] = civitai_data
 
 
-def get_lora_info(lora_name: str, fetch_civitai: bool = False) -> Optional[Dict[str, Any]]:
+def load_lora_details(lora_name: str, fetch_civitai: bool = False) -> Optional[Dict[str, Any]]:
     """
-    获取指定 Lora 的详细信息
-    使用rgthree的核心算法实现
+    读取 Lora 信息中代价较高的部分：文件哈希、元数据和 Civitai 数据
+    
+    返回的数据会被并发请求共享，调用方不应修改。
+    
+    Args:
+        lora_name: Lora 文件名
+        fetch_civitai: 是否从 Civitai 获取信息（本地缓存中没有时才联网查询）
+        
+    Returns:
+        {"info": 基础信息, "path": 完整路径, "stamp": (mtime_ns, size),
+         "metadata": 元数据, "civitai": Civitai 数据}，文件不存在时返回 None
     """
     try:
-        # 获取 Lora 文件的完整路径
-        lora_path = folder_paths.get_full_path("loras", lora_name)
+        # 通过目录索引获取完整路径，不逐个根目录查找
+        entry = lora_index.resolve(lora_name, refresh=not lora_watcher.running)
+        if entry is None:
+            return None
+        lora_path = entry.path
         
-        if not os.path.exists(lora_path):
+        # 缓存的哈希按文件当前的 stamp 查找（索引可能还没发现原地覆盖写入）
+        try:
+            stamp = _file_stamp(lora_path)
+        except OSError:
             return None
         
         # 构建基础信息
         info = {
             "file": lora_name,
             "path": lora_path,
-            "size": os.path.getsize(lora_path),
+            "size": stamp[1],
+            "mtime": stamp[0] / 1e9,
             "name": os.path.splitext(lora_name)[0],  # 不带扩展名的名称
         }
         
-        # 计算文件哈希
-        file_hash = get_file_hash(lora_path)
+        # 本地标识使用快速哈希；完整 SHA256 只在查询 Civitai 时计算，已知时直接使用
+        quick_hash = get_cached_quick_hash(lora_path, stamp)
+        if quick_hash:
+            info["quickHash"] = quick_hash
+        known_hash = file_hash_cache.get(lora_path, stamp)
+        file_hash = get_cached_file_hash(
+            lora_path, stamp, compute=fetch_civitai or HASH_MODE == "full"
+        )
+        # 新得到的哈希和 Civitai 数据也会改变其他参数组合的响应，需要清除它们记住的 ETag
+        changed = bool(file_hash) and known_hash is None
         if file_hash:
             info["sha256"] = file_hash
+            info["autoV2"] = get_auto_v2(file_hash)
         
         # 尝试提取元数据
-        metadata = get_lora_metadata(lora_path)
+        with timed("metadata"):
+            metadata = get_lora_metadata(lora_path)
         if metadata:
-            if "raw" not in info:
-                info["raw"] = {}
-            info["raw"]["metadata"] = metadata
-            
-            # 提取训练词汇（使用rgthree的严格逻辑）
-            trained_words = extract_trained_words(metadata)
-            if trained_words:
-                info["trainedWords"] = trained_words
+            info["raw"] = {"metadata": metadata}
             
             # 提取其他有用的字段
             if 'ss_clip_skip' in metadata:
@@ -306,19 +667,244 @@ def get_lora_info(lora_name: str, fetch_civitai: bool = False) -> Optional[Dict[
             if 'ss_output_name' in metadata:
                 info["name"] = metadata['ss_output_name']
         
-        # 如果需要，从 Civitai 获取信息
+        # 其他工具写在模型旁边的信息
+        sidecar = sidecar_reader.read(lora_path, stamp[0], stamp[1])
+        if sidecar.get("userNote"):
+            info["userNote"] = sidecar["userNote"]
+        
+        # 优先使用本地 Civitai 缓存（批量补全任务也会写入）和旁路文件，需要时再联网查询
+        civitai_data = civitai_cache.get(file_hash) if file_hash else None
+        if civitai_data is None and sidecar.get("civitai"):
+            civitai_data = sidecar["civitai"]
+            if file_hash:
+                civitai_cache.put(file_hash, civitai_data)
         if fetch_civitai and file_hash:
-            civitai_data = get_civitai_info_sync(file_hash)
-            if civitai_data:
-                merge_civitai_data(info, civitai_data)
+            record_cache("civitai", civitai_data is not None)
+            if civitai_data is None:
+                with timed("civitai"):
+                    civitai_data = get_civitai_info_sync(file_hash)
+                if civitai_data is not None:
+                    civitai_cache.put(file_hash, civitai_data)
+                    write_sidecars(lora_path, stamp[0], civitai=civitai_data)
+                    changed = True
+        if changed:
+            info_etag_cache.invalidate(lora_name)
         
-        return info
+        return {
+            "info": info,
+            "path": lora_path,
+            "stamp": stamp,
+            "metadata": metadata,
+            "civitai": civitai_data,
+        }
+    
+    except Exception as e:
+        record_error("info")
+        return None
+
+
+def build_lora_info(
+    details: Dict[str, Any],
+    top_k: Optional[int] = None,
+    offset: int = 0,
+    min_count: float = 0
+) -> Dict[str, Any]:
+    """
+    根据 load_lora_details 的结果组装返回给前端的信息
+    
+    Args:
+        details: load_lora_details 的返回值
+        top_k: 训练词汇数量上限（None 表示全部）
+        offset: 训练词汇分页偏移量
+        min_count: 训练词汇最小计数
+    """
+    # 复制一份，避免修改共享的 details
+    info = dict(details["info"])
+    if "raw" in info:
+        info["raw"] = dict(info["raw"])
+    
+    lora_path = details["path"]
+    metadata = details["metadata"]
+    if metadata:
+        # 提取训练词汇（使用rgthree的严格逻辑）
+        trained_words, total = trained_words_cache.get_page(
+            lora_path, metadata, top_k=top_k, offset=offset, min_count=min_count
+        )
+        if trained_words:
+            info["trainedWords"] = trained_words
+        if total:
+            info["trainedWordsTotal"] = total
+    
+    civitai_data = details["civitai"]
+    if civitai_data:
+        merge_civitai_data(info, civitai_data)
+        # 示例图片改为通过本地缩略图代理加载，保留原图地址
+        for image in info.get("images", ()):
+            url = image.get("url")
+            if url and image.get("type") != "video" and is_allowed_image_url(url):
+                image["originalUrl"] = url
+                image["url"] = thumbnail_url(url)
+    
+    # 记录摘要信息，供列表接口使用
+    base_model = info.get("baseModel") or (metadata or {}).get("ss_base_model_version")
+    if base_model:
+        lora_summary_cache.put(lora_path, details["stamp"], {"baseModel": base_model})
+    
+    return info
+
+
+def get_lora_info(
+    lora_name: str,
+    fetch_civitai: bool = False,
+    top_k: Optional[int] = None,
+    offset: int = 0,
+    min_count: float = 0
+) -> Optional[Dict[str, Any]]:
+    """
+    获取指定 Lora 的详细信息
+    使用rgthree的核心算法实现
     
+    Args:
+        lora_name: Lora 文件名
+        fetch_civitai: 是否从 Civitai 获取信息
+        top_k: 训练词汇数量上限（None 表示全部）
+        offset: 训练词汇分页偏移量
+        min_count: 训练词汇最小计数
+    """
+    details = load_lora_details(lora_name, fetch_civitai)
+    if details is None:
+        return None
+    try:
+        return build_lora_info(details, top_k=top_k, offset=offset, min_count=min_count)
     except Exception as e:
         return None
 
 
-@routes.get('/api/easy_setting/loras/info')
+# 合并同一 Lora 的并发信息请求：(文件名, 是否获取 Civitai) -> 进行中的计算
+lora_details_flight = SingleFlight()
+
+
+def project_info(
+    info: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    include_raw: bool = False
+) -> Dict[str, Any]:
+    """
+    按需裁剪 Lora 信息
+    
+    Args:
+        info: get_lora_info 返回的完整信息
+        fields: 需要保留的字段（支持点分隔的 key，如 "raw.metadata"），为空时返回精简模式
+        include_raw: 精简模式下是否保留 raw 原始数据
+        
+    Returns:
+        裁剪后的信息字典
+    """
+    if fields:
+        result: Dict[str, Any] = {}
+        for field in fields:
+            try:
+                if dict_has_key(info, field):
+                    set_dict_value(result, field, get_dict_value(info, field))
+            except (TypeError, AttributeError):
+                # 字段路径穿过了非字典值，忽略
+                continue
+        return result
+    
+    if include_raw or 'raw' not in info:
+        return info
+    return {key: value for key, value in info.items() if key != 'raw'}
+
+
+class InfoETagCache:
+    """
+    记录最近返回给客户端的 ETag
+    
+    客户端携带 If-None-Match 再次请求时，在有效期内直接返回 304，
+    不读取文件也不序列化响应。
+    """
+    
+    def __init__(self, ttl: float = INFO_ETAG_TTL) -> None:
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+    
+    def put(self, key: Tuple[str, str], etag: str) -> None:
+        with self._lock:
+            self._entries[key] = (etag, time.monotonic())
+    
+    def invalidate(self, lora_name: Optional[str] = None) -> None:
+        """清除指定 Lora（或全部）的 ETag"""
+        with self._lock:
+            if lora_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == lora_name]:
+                    del self._entries[key]
+
+
+info_etag_cache = InfoETagCache()
+
+
+def make_info_etag(info: Dict[str, Any], variant: str) -> str:
+    """根据文件快速哈希、SHA256（已知时）、修改时间、合并的 Civitai 版本、备注和请求参数生成 ETag"""
+    civitai_id = get_dict_value(info, 'raw.civitai.id', '')
+    source = (
+        f"{info.get('quickHash', '')}:{info.get('sha256', '')}:{info.get('mtime', '')}:{info.get('size', '')}:"
+        f"{civitai_id}:{info.get('userNote', '')}:{variant}"
+    )
+    return '"' + hashlib.sha1(source.encode('utf-8')).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """检查 If-None-Match 请求头是否与 ETag 匹配"""
+    if not if_none_match or not etag:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    # 忽略弱校验前缀
+    candidates = [tag[2:] if tag.startswith('W/') else tag for tag in candidates]
+    return '*' in candidates or etag in candidates
+
+
+def dumps_json(data: Any) -> bytes:
+    """序列化 JSON，优先使用 orjson"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # orjson 不支持的类型（如超大整数），回退到标准库
+            pass
+    return json.dumps(data).encode('utf-8')
+
+
+def json_response(
+    data: Any,
+    status: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> web.Response:
+    """使用 dumps_json 构造 JSON 响应"""
+    return web.Response(
+        body=dumps_json(data),
+        status=status,
+        headers=headers,
+        content_type='application/json'
+    )
+
+
+def _parse_fields(value: Optional[str]) -> List[str]:
+    """解析逗号分隔的 fields 参数"""
+    if not value:
+        return []
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
 async def api_get_lora_info(request: web.Request) -> web.Response:
     """
     获取指定 Lora 的详细信息
@@ -326,18 +912,29 @@ async def api_get_lora_info(request: web.Request) -> web.Response:
     查询参数:
         file: Lora 文件名（必需）
         civitai: 是否从 Civitai 获取信息（可选，默认为 false）
+        top_k: 返回计数最高的训练词汇数量（可选，默认为 200，0 表示全部）
+        offset: 训练词汇分页偏移量（可选，默认为 0）
+        min_count: 训练词汇最小计数（可选，默认为 0）
+        fields: 逗号分隔的返回字段（可选，支持 "raw.metadata" 形式）
+        raw: 是否包含 raw 原始数据（可选，默认为 false，即精简模式）
+    
+    请求头:
+        If-None-Match: 与上次返回的 ETag 匹配时返回 304
         
     返回:
         {
             "file": "lora_name.safetensors",
             "path": "/path/to/lora.safetensors",
-            "sha256": "hash...",
+            "quickHash": "快速哈希（本地标识）",
+            "sha256": "hash...",  // 仅在 civitai=true 或已计算过时返回
+            "autoV2": "A1B2C3D4E5",  // 与 sha256 同时返回
             "size": 12345,
             "name": "lora_name",
             "trainedWords": [
                 {"word": "keyword1"},
                 {"word": "keyword2", "civitai": true}
             ],
+            "trainedWordsTotal": 2,
             "links": ["https://civitai.com/models/..."],
             "images": [
                 {
@@ -347,7 +944,7 @@ async def api_get_lora_info(request: web.Request) -> web.Response:
                     "negative": "..."
                 }
             ],
-            "raw": {
+            "raw": {  // 仅在 raw=true 或 fields 中请求时返回
                 "metadata": {...},
                 "civitai": {...}
             }
@@ -363,15 +960,57 @@ async def api_get_lora_info(request: web.Request) -> web.Response:
                 status=400
             )
         
-        info = get_lora_info(file_param, fetch_civitai=civitai_param)
+        try:
+            top_k = int(request.rel_url.query.get('top_k', DEFAULT_TRAINED_WORDS_TOP_K))
+            offset = int(request.rel_url.query.get('offset', 0))
+            min_count = float(request.rel_url.query.get('min_count', 0))
+        except ValueError:
+            return web.json_response(
+                {"error": "Invalid 'top_k', 'offset' or 'min_count' parameter"},
+                status=400
+            )
+        
+        fields = _parse_fields(request.rel_url.query.get('fields'))
+        include_raw = request.rel_url.query.get('raw', 'false').lower() == 'true'
+        
+        # 同一文件的不同参数组合对应不同的 ETag
+        variant = json.dumps(
+            [civitai_param, top_k, offset, min_count, fields, include_raw]
+        )
+        etag_key = (file_param, variant)
+        if_none_match = request.headers.get('If-None-Match')
+        
+        # 快速路径：ETag 仍然有效时直接返回 304
+        cached_etag = info_etag_cache.get(etag_key)
+        if if_none_match:
+            record_cache("info_etag", etag_matches(if_none_match, cached_etag))
+        if etag_matches(if_none_match, cached_etag):
+            return web.Response(status=304, headers={"ETag": cached_etag})
+        
+        # 同一文件的并发请求只计算一次哈希/元数据/Civitai，且不阻塞事件循环
+        details = await lora_details_flight.run(
+            (file_param, civitai_param), load_lora_details, file_param, civitai_param
+        )
+        info = None
+        if details is not None:
+            info = await asyncio.get_running_loop().run_in_executor(
+                None, build_lora_info, details, top_k if top_k > 0 else None, offset, min_count
+            )
         
         if info is None:
+            info_etag_cache.invalidate(file_param)
             return web.json_response(
                 {"error": f"Lora file not found: {file_param}"},
                 status=404
             )
         
-        return web.json_response(info)
+        etag = make_info_etag(info, variant)
+        info_etag_cache.put(etag_key, etag)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return web.Response(status=304, headers=headers)
+        
+        return json_response(project_info(info, fields, include_raw), headers=headers)
     
     except Exception as e:
         return web.json_response(
@@ -380,14 +1019,159 @@ async def api_get_lora_info(request: web.Request) -> web.Response:
         )
 
 
-@routes.get('/api/easy_setting/loras/list')
+def summarize_lora_entry(entry) -> Dict[str, Any]:
+    """
+    生成列表接口中的单个条目
+    
+    只使用索引和缓存中已有的数据，不读取文件内容。
+    """
+    item = {
+        "name": entry.name,
+        "size": entry.size,
+        "mtime": entry.mtime_ns / 1e9,
+    }
+    stamp = (entry.mtime_ns, entry.size)
+    file_hash = file_hash_cache.get(entry.path, stamp)
+    if file_hash:
+        item["sha256"] = file_hash
+    summary = lora_summary_cache.get(entry.path, stamp)
+    if summary:
+        item.update(summary)
+    return item
+
+
 async def api_list_loras(request: web.Request) -> web.Response:
     """
-    获取所有可用的 Lora 列表
+    获取可用的 Lora 列表
+    
+    查询参数:
+        prefix: 按文件名前缀过滤（可选，不区分大小写）
+        q: 按文件名子串过滤（可选，不区分大小写）
+        offset: 分页偏移量（可选，默认为 0）
+        limit: 单页数量（可选，不指定时返回全部；指定时最多 5000）
+        fields: 逗号分隔的条目字段（可选，如 "name"）
+    
+    请求头:
+        If-None-Match: 与当前索引版本匹配时返回 304
+        
+    返回:
+        {
+            "version": "索引版本号",
+            "total": 120,
+            "offset": 0,
+            "items": [
+                {
+                    "name": "lora_name.safetensors",
+                    "size": 12345,
+                    "mtime": 1700000000.0,
+                    "sha256": "hash...",  // 仅在已计算过时返回
+                    "baseModel": "SDXL 1.0"  // 仅在已知时返回
+                }
+            ]
+        }
     """
     try:
-        loras = folder_paths.get_filename_list("loras")
-        return web.json_response(loras)
+        query = request.rel_url.query
+        prefix = query.get('prefix', '').lower()
+        substring = query.get('q', '').lower()
+        fields = _parse_fields(query.get('fields'))
+        try:
+            offset = int(query.get('offset', 0))
+            limit = min(int(query['limit']), LIST_MAX_LIMIT) if 'limit' in query else None
+            if offset < 0 or (limit is not None and limit < 0):
+                raise ValueError
+        except ValueError:
+            return web.json_response(
+                {"error": "Invalid 'offset' or 'limit' parameter"},
+                status=400
+            )
+        
+        # 索引过期时会重新扫描目录，不能阻塞事件循环
+        entries = await asyncio.get_running_loop().run_in_executor(None, lora_index.entries)
+        
+        # 索引版本、缓存版本和查询参数共同决定 ETag
+        version = f"{lora_index.version}.{file_hash_cache.generation}.{lora_summary_cache.generation}"
+        variant = json.dumps([prefix, substring, offset, limit, fields])
+        etag = '"' + hashlib.sha1(f"{version}:{variant}".encode('utf-8')).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return web.Response(status=304, headers=headers)
+        
+        if prefix or substring:
+            lowered = ((entry, entry.name.lower()) for entry in entries)
+            entries = [
+                entry for entry, name in lowered
+                if name.startswith(prefix) and substring in name
+            ]
+        
+        page = entries[offset:] if limit is None else entries[offset:offset + limit]
+        items = [summarize_lora_entry(entry) for entry in page]
+        if fields:
+            items = [project_info(item, fields) for item in items]
+        
+        return json_response({
+            "version": version,
+            "total": len(entries),
+            "offset": offset,
+            "items": items,
+        }, headers=headers)
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
+
+
+# 合并同一图片的并发下载
+thumbnail_flight = SingleFlight()
+
+
+async def api_get_thumbnail(request: web.Request) -> web.Response:
+    """
+    获取 Civitai 预览图的缩略图
+    
+    查询参数:
+        url: 远程图片地址（必需，只允许 Civitai 的图片）
+    
+    首次请求时下载并缩小图片，之后直接返回磁盘缓存，响应可被浏览器长期缓存。
+    下载失败时重定向到原图。
+    """
+    try:
+        url = request.rel_url.query.get('url')
+        
+        if not url:
+            return web.json_response(
+                {"error": "Missing 'url' parameter"},
+                status=400
+            )
+        if not is_allowed_image_url(url):
+            return web.json_response(
+                {"error": "Image host not allowed"},
+                status=403
+            )
+        
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, thumbnail_cache.get, url)
+        record_cache("thumbnail", cached is not None)
+        if cached is None:
+            try:
+                with timed("thumbnail"):
+                    cached = await thumbnail_flight.run(url, thumbnail_cache.fetch, url)
+            except Exception as e:
+                # 离线或图床出错时交给浏览器直接加载原图，不缓存这次结果
+                return web.Response(
+                    status=302,
+                    headers={"Location": url, "Cache-Control": "no-store"}
+                )
+        
+        path, content_type, digest = cached
+        etag = f'"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return web.Response(status=304, headers=headers)
+        headers["Content-Type"] = content_type
+        return web.FileResponse(path, headers=headers)
+    
     except Exception as e:
         return web.json_response(
             {"error": str(e)},
@@ -395,12 +1179,114 @@ async def api_list_loras(request: web.Request) -> web.Response:
         )
 
 
+# 合并相同堆栈的并发烘焙请求
+bake_flight = SingleFlight()
+
+
+def parse_stack_item(item: Any) -> Optional[Tuple[str, float, float]]:
+    """解析堆栈项：[名称, 模型强度, CLIP 强度] 或前端 widget 格式的字典"""
+    if isinstance(item, (list, tuple)) and len(item) >= 2:
+        strength_model = float(item[1])
+        return (str(item[0]), strength_model, float(item[2]) if len(item) > 2 else strength_model)
+    if isinstance(item, dict) and item.get('lora'):
+        if not item.get('on', True):
+            return None
+        strength_model = float(item.get('strength', 1.0))
+        return (str(item['lora']), strength_model, float(item.get('strengthTwo', strength_model)))
+    raise ValueError(f"Invalid stack item: {item!r}")
+
+
+async def api_bake_stack(request: web.Request) -> web.Response:
+    """
+    将 LoRA 堆栈烘焙为一个合并后的 LoRA 文件
+    
+    请求体（JSON）:
+        {
+            "loras": [["a.safetensors", 0.8, 0.6], {"lora": "b.safetensors", "strength": 1.0}, ...],
+            "rank": 64,  // 可选，默认为 EASY_SETTING_BAKE_RANK
+            "has_clip": true  // 可选，工作流没有 CLIP 时设为 false（CLIP 强度按 0 处理，与加载器一致）
+        }
+    
+    返回:
+        {
+            "path": "烘焙文件路径", "recipe": "配方哈希", "stack": "堆栈哈希",
+            "rank": 64, "energy": 0.998,  // 截断后保留的能量比例（最差的模块）
+            "has_clip": true,
+            "sources": [{"name", "sha256", "strength_model", "strength_clip"}, ...],
+            "created": 1700000000.0, "cached": false
+        }
+    """
+    try:
+        try:
+            body = await request.json()
+            items = [item for item in map(parse_stack_item, body.get('loras') or []) if item]
+            rank = int(body.get('rank', BAKE_RANK))
+            has_clip = bool(body.get('has_clip', True))
+        except (ValueError, TypeError, AttributeError) as e:
+            return web.json_response(
+                {"error": f"Invalid request body: {e}"},
+                status=400
+            )
+        
+        items = normalize_stack(items, has_clip)
+        if not items:
+            return web.json_response(
+                {"error": "Missing 'loras'"},
+                status=400
+            )
+        
+        key = (tuple(sorted(items)), rank, has_clip)
+        try:
+            result = await bake_flight.run(key, bake_stack, items, rank, has_clip)
+        except MissingLorasError as e:
+            return web.json_response(
+                {"error": str(e), "missing": e.names},
+                status=404
+            )
+        except FileNotFoundError as e:
+            return web.json_response(
+                {"error": str(e)},
+                status=404
+            )
+        except ValueError as e:
+            return web.json_response(
+                {"error": str(e)},
+                status=400
+            )
+        return json_response(result)
+    
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
+
+
+def invalidate_lora_caches(changes: List[IndexChange]) -> None:
+    """
+    根据索引变化失效对应文件的缓存
+    
+    只清除发生变化的文件，其余缓存保持有效。
+    """
+    for change in changes:
+        entry = change.entry
+        file_hash_cache.invalidate(entry.path)
+        quick_hash_cache.invalidate(entry.path)
+        lora_summary_cache.invalidate(entry.path)
+        trained_words_cache.invalidate(entry.path)
+        sidecar_reader.invalidate(entry.path)
+        info_etag_cache.invalidate(entry.name)
+        if change.kind == "remove":
+            hash_store.discard(entry.path)
+
+
 def register_lora_api():
     """
     注册 Lora API
     这个函数在模块加载时会被调用
     """
-    pass
+    lora_index.add_listener(invalidate_lora_caches)
+    lora_watcher.ensure_started()
 
 
 # 模块加载时自动注册
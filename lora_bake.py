@@ -0,0 +1,420 @@
+"""
+LoRA 堆栈烘焙 - 把一组带强度的 LoRA 合并成一个 LoRA 文件
+每次执行都要逐个加载、逐个打补丁的固定堆栈，可以预先合并：
+同一模块的各个增量按强度相加，再用截断 SVD 压缩到指定的秩。
+
+烘焙结果按配方（各 LoRA 的 SHA256、强度和秩）的哈希命名，保存在数据目录的 baked/ 下，
+文件元数据中记录来源。开启 EASY_SETTING_BAKED_STACKS 后，加载器遇到烘焙过的相同堆栈时
+直接使用烘焙文件；截断后的结果是近似值，只有保留的能量不低于 EASY_SETTING_BAKE_MIN_ENERGY 时才替换。
+
+合并在 LoRA key 空间中进行，不需要基础模型；只支持标准 LoRA（up/down/alpha），
+LoHa、LoKr、DoRA 等格式无法烘焙。
+"""
+
+import os
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .lora_index import lora_index, MissingLorasError
+from .lora_watcher import lora_watcher
+from .persistent_cache import get_data_dir, read_json_file, write_json_file
+from .lora_metrics import timed, record_cache
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# 默认的烘焙秩
+BAKE_RANK = get_env_setting("EASY_SETTING_BAKE_RANK", 64)
+# 加载器是否自动使用已烘焙的堆栈（默认关闭，烘焙文件是截断后的近似）
+BAKED_STACKS = get_env_setting("EASY_SETTING_BAKED_STACKS", False)
+# 自动替换要求的最低保留能量（最差的模块），相对误差约为 sqrt(1 - energy)，默认约 1%
+BAKE_MIN_ENERGY = get_env_setting("EASY_SETTING_BAKE_MIN_ENERGY", 0.9999)
+# 配方格式版本，合并算法变化时递增，使旧的烘焙文件不再匹配
+BAKE_VERSION = 1
+
+# 支持的 LoRA 张量命名：(up 后缀, down 后缀)
+LORA_SUFFIXES = (
+    (".lora_up.weight", ".lora_down.weight"),
+    (".lora_B.weight", ".lora_A.weight"),
+    (".lora.up.weight", ".lora.down.weight"),
+    (".lora_linear_layer.up.weight", ".lora_linear_layer.down.weight"),
+)
+# 以这些前缀开头的模块属于文本编码器，使用 CLIP 强度
+CLIP_MODULE_PREFIXES = ("lora_te", "text_encoder", "text_encoders.", "lora_clip", "te_")
+
+# 一个堆栈项：(LoRA 文件名, 模型强度, CLIP 强度)
+StackItem = Tuple[str, float, float]
+
+
+def normalize_stack(items: Sequence[StackItem], has_clip: bool = True) -> List[StackItem]:
+    """
+    统一堆栈格式：强度转为浮点数，没有 CLIP 时 CLIP 强度视为 0，去掉强度全为 0 的项
+
+    加载器和烘焙节点使用同样的规则，保证同一个堆栈得到同一个配方。
+    """
+    result = []
+    for name, strength_model, strength_clip in items:
+        if not name or name == "None":
+            continue
+        strength_model = float(strength_model)
+        strength_clip = float(strength_clip) if has_clip else 0.0
+        if strength_model == 0 and strength_clip == 0:
+            continue
+        result.append((name, strength_model, strength_clip))
+    return result
+
+
+def resolve_sources(items: Sequence[StackItem], compute_hash: bool = True) -> Optional[List[Dict[str, Any]]]:
+    """
+    查找堆栈中每个 LoRA 的路径和 SHA256
+
+    Args:
+        items: 已规范化的堆栈
+        compute_hash: 各级哈希缓存（与信息接口共用）中都没有时是否读取文件计算；
+            为 False 时遇到未知哈希返回 None
+
+    Returns:
+        [{"name", "path", "sha256", "strength_model", "strength_clip"}, ...]
+
+    Raises:
+        MissingLorasError: compute_hash 为 True 且找不到部分 LoRA 文件（列出全部）
+        OSError: compute_hash 为 True 且无法读取某个文件
+    """
+    # lora_api 在模块级导入本模块，这里在使用时再导入
+    from .lora_api import get_cached_file_hash
+
+    entries, missing = lora_index.resolve_many(
+        [name for name, _, _ in items], refresh=not lora_watcher.running
+    )
+    if missing:
+        if compute_hash:
+            raise MissingLorasError(missing)
+        return None
+
+    sources = []
+    for name, strength_model, strength_clip in items:
+        path = entries[name].path
+        try:
+            # 哈希按文件当前的 stamp 查找，索引中的记录可能还没发现原地覆盖写入
+            stat = os.stat(path)
+        except OSError:
+            if compute_hash:
+                raise
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        file_hash = get_cached_file_hash(path, stamp, compute=compute_hash)
+        if not file_hash:
+            if compute_hash:
+                raise OSError(f"Cannot hash LoRA file: {path}")
+            return None
+        sources.append({
+            "name": name,
+            "path": path,
+            "sha256": file_hash,
+            "strength_model": strength_model,
+            "strength_clip": strength_clip,
+        })
+    return sources
+
+
+def stack_digest(sources: Sequence[Dict[str, Any]]) -> str:
+    """堆栈的标识：与顺序和文件名无关，只取决于文件内容和强度"""
+    parts = sorted(
+        [source["sha256"], repr(float(source["strength_model"])), repr(float(source["strength_clip"]))]
+        for source in sources
+    )
+    return hashlib.sha256(json.dumps([BAKE_VERSION, parts]).encode("utf-8")).hexdigest()
+
+
+def recipe_digest(stack: str, rank: int) -> str:
+    """烘焙文件的内容地址：堆栈标识 + 秩"""
+    return hashlib.sha256(f"{stack}:{int(rank)}".encode("utf-8")).hexdigest()
+
+
+def split_lora_modules(lora: Dict[str, Any]) -> Dict[str, Tuple[Any, Any, Optional[Any]]]:
+    """
+    按模块拆分 LoRA 张量
+
+    Returns:
+        模块名 -> (up, down, alpha)
+
+    Raises:
+        ValueError: 包含无法合并的张量（LoHa、LoKr、DoRA、mid 等）
+    """
+    modules: Dict[str, Tuple[Any, Any, Optional[Any]]] = {}
+    used = set()
+    for key in lora:
+        for up_suffix, down_suffix in LORA_SUFFIXES:
+            if not key.endswith(up_suffix):
+                continue
+            name = key[:-len(up_suffix)]
+            down_key = name + down_suffix
+            if down_key not in lora:
+                raise ValueError(f"Missing tensor {down_key}")
+            modules[name] = (lora[key], lora[down_key], lora.get(f"{name}.alpha"))
+            used.update((key, down_key, f"{name}.alpha"))
+            break
+
+    unsupported = [key for key in lora if key not in used]
+    if unsupported:
+        raise ValueError(f"Unsupported LoRA tensors (only plain LoRA can be baked): {', '.join(unsupported[:3])}")
+    return modules
+
+
+def is_clip_module(name: str) -> bool:
+    return name.startswith(CLIP_MODULE_PREFIXES)
+
+
+def merge_module(factors: Sequence[Tuple[Any, Any, float]], rank: int) -> Tuple[Any, Any, float]:
+    """
+    合并同一模块的多个 LoRA 增量并截断到指定的秩
+
+    sum(w_i * up_i @ down_i) = U_cat @ D_cat，其中 U_cat、D_cat 的宽度是各秩之和 R。
+    R 不超过 rank 时直接拼接（无损）；否则分别对两个因子做 QR，
+    只对 R x R 的小矩阵做 SVD，得到与完整 SVD 相同的截断结果。
+
+    Args:
+        factors: [(up, down, 权重)]，权重已包含强度和 alpha / rank
+        rank: 目标秩
+
+    Returns:
+        (up, down, 保留的能量比例)，张量为 float32，形状与输入一致
+    """
+    import torch
+
+    up_shape = tuple(factors[0][0].shape)
+    down_shape = tuple(factors[0][1].shape)
+    ups, downs = [], []
+    for up, down, weight in factors:
+        if up.shape[0] != up_shape[0] or tuple(down.shape[1:]) != down_shape[1:]:
+            raise ValueError(f"Mismatched LoRA shapes: {tuple(up.shape)} / {tuple(down.shape)}")
+        ups.append(up.reshape(up.shape[0], -1).float() * weight)
+        downs.append(down.reshape(down.shape[0], -1).float())
+    up_cat = torch.cat(ups, dim=1)
+    down_cat = torch.cat(downs, dim=0)
+
+    energy = 1.0
+    if up_cat.shape[1] > rank:
+        q_up, r_up = torch.linalg.qr(up_cat)
+        q_down, r_down = torch.linalg.qr(down_cat.T)
+        u, s, vh = torch.linalg.svd(r_up @ r_down.T, full_matrices=False)
+        k = min(rank, s.numel())
+        total = float((s * s).sum())
+        if total > 0:
+            energy = float((s[:k] * s[:k]).sum()) / total
+        root = s[:k].sqrt()
+        up_cat = (q_up @ u[:, :k]) * root
+        down_cat = root[:, None] * (vh[:k] @ q_down.T)
+
+    k = up_cat.shape[1]
+    return (
+        up_cat.reshape((up_shape[0], k) + up_shape[2:]).contiguous(),
+        down_cat.reshape((k,) + down_shape[1:]).contiguous(),
+        energy,
+    )
+
+
+def bake_state_dict(
+    loras: Sequence[Tuple[Dict[str, Any], float, float]],
+    rank: int,
+    dtype: Any = None
+) -> Tuple[Dict[str, Any], float]:
+    """
+    合并多个 LoRA 的权重
+
+    Args:
+        loras: [(LoRA 权重, 模型强度, CLIP 强度)]
+        rank: 目标秩
+        dtype: 输出张量的精度，默认 float16
+
+    Returns:
+        (kohya 格式的 LoRA 权重, 所有模块中最低的能量保留比例)
+    """
+    import torch
+
+    dtype = dtype or torch.float16
+    modules: Dict[str, List[Tuple[Any, Any, float]]] = {}
+    for lora, strength_model, strength_clip in loras:
+        for name, (up, down, alpha) in split_lora_modules(lora).items():
+            strength = strength_clip if is_clip_module(name) else strength_model
+            if strength == 0:
+                continue
+            scale = float(alpha) / down.shape[0] if alpha is not None else 1.0
+            modules.setdefault(name, []).append((up, down, strength * scale))
+
+    result: Dict[str, Any] = {}
+    min_energy = 1.0
+    for name, factors in modules.items():
+        up, down, energy = merge_module(factors, rank)
+        min_energy = min(min_energy, energy)
+        result[f"{name}.lora_up.weight"] = up.to(dtype)
+        result[f"{name}.lora_down.weight"] = down.to(dtype)
+        # alpha 等于秩，应用时的缩放系数为 1
+        result[f"{name}.alpha"] = torch.tensor(float(down.shape[0]))
+    return result, min_energy
+
+
+class BakedStackIndex:
+    """
+    堆栈标识 -> 最近一次烘焙结果 的索引（baked/index.json）
+
+    同一个堆栈以不同的秩烘焙时，加载器使用最近一次的结果。
+    """
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self._directory = directory
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            self._directory = os.path.join(get_data_dir(), "baked")
+        return self._directory
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        # 调用方持有锁
+        if self._entries is None:
+            data = read_json_file(os.path.join(self.directory, "index.json"))
+            self._entries = data if isinstance(data, dict) else {}
+        return self._entries
+
+    def file_path(self, recipe: str) -> str:
+        return os.path.join(self.directory, f"{recipe}.safetensors")
+
+    def find(self, stack: str) -> Optional[Dict[str, Any]]:
+        """获取堆栈的烘焙记录，烘焙文件已被删除时返回 None"""
+        with self._lock:
+            entry = self._load().get(stack)
+        if entry is None or not os.path.isfile(self.file_path(entry["recipe"])):
+            return None
+        return entry
+
+    def put(self, stack: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._load()[stack] = entry
+            snapshot = dict(self._entries)
+        try:
+            write_json_file(os.path.join(self.directory, "index.json"), snapshot)
+        except OSError as e:
+            logger.warning(f"无法写入烘焙索引: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = None
+
+
+# 全局烘焙索引
+baked_stacks = BakedStackIndex()
+
+
+def read_baked_entry(path: str) -> Optional[Dict[str, Any]]:
+    """从烘焙文件的元数据中恢复索引记录"""
+    try:
+        with open(path, "rb") as f:
+            header_size = int.from_bytes(f.read(8), "little")
+            metadata = json.loads(f.read(header_size)).get("__metadata__") or {}
+        return json.loads(metadata["easy_setting.bake"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def bake_stack(items: Sequence[StackItem], rank: int = BAKE_RANK, has_clip: bool = True) -> Dict[str, Any]:
+    """
+    烘焙一个 LoRA 堆栈（相同配方已烘焙过时直接返回已有文件）
+
+    Args:
+        items: [(LoRA 文件名, 模型强度, CLIP 强度)]
+        rank: 目标秩
+        has_clip: 是否有 CLIP，没有时忽略 CLIP 强度
+
+    Returns:
+        {"path", "recipe", "stack", "rank", "energy", "has_clip", "sources", "created", "cached"}
+
+    Raises:
+        ValueError: 堆栈为空、秩无效或包含无法合并的 LoRA
+        FileNotFoundError: 找不到某个 LoRA 文件
+    """
+    import torch
+    from safetensors.torch import save_file
+    from .power_lora_loader import load_lora_file
+
+    rank = int(rank)
+    if rank < 1:
+        raise ValueError("Rank must be at least 1")
+    items = normalize_stack(items, has_clip)
+    if not items:
+        raise ValueError("LoRA stack is empty")
+
+    sources = resolve_sources(items)
+    stack = stack_digest(sources)
+    recipe = recipe_digest(stack, rank)
+    path = baked_stacks.file_path(recipe)
+
+    if os.path.isfile(path):
+        entry = read_baked_entry(path)
+        if entry is not None:
+            baked_stacks.put(stack, entry)
+            return dict(entry, path=path, cached=True)
+
+    with timed("bake"):
+        loras = [
+            (load_lora_file(source["path"]), source["strength_model"], source["strength_clip"])
+            for source in sources
+        ]
+        state_dict, energy = bake_state_dict(loras, rank, torch.float16)
+        del loras
+
+        entry = {
+            "recipe": recipe,
+            "stack": stack,
+            "rank": rank,
+            "energy": round(energy, 6),
+            "has_clip": bool(has_clip),
+            "sources": [{k: v for k, v in source.items() if k != "path"} for source in sources],
+            "created": time.time(),
+        }
+        metadata = {
+            "easy_setting.bake": json.dumps(entry, ensure_ascii=False),
+            "ss_output_name": f"baked_stack_{recipe[:12]}",
+            "ss_network_module": "networks.lora",
+            "ss_network_dim": str(rank),
+            "ss_network_alpha": str(rank),
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            save_file(state_dict, tmp_path, metadata=metadata)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    baked_stacks.put(stack, entry)
+    logger.info(f"已烘焙 {len(sources)} 个 LoRA (rank={rank}, energy={energy:.4f}): {path}")
+    return dict(entry, path=path, cached=False)
+
+
+def find_baked_stack(items: Sequence[StackItem]) -> Optional[str]:
+    """
+    查找堆栈的烘焙文件（只使用哈希索引中已有的哈希，不读取 LoRA 文件）
+
+    Args:
+        items: 已规范化的堆栈（与烘焙时使用相同的 has_clip）
+
+    Returns:
+        烘焙文件路径；没有烘焙过、某个文件已变化或截断误差超过 BAKE_MIN_ENERGY 时返回 None
+    """
+    if not BAKED_STACKS or len(items) < 2:
+        return None
+    sources = resolve_sources(items, compute_hash=False)
+    entry = baked_stacks.find(stack_digest(sources)) if sources is not None else None
+    if entry is not None and entry.get("energy", 0.0) < BAKE_MIN_ENERGY:
+        logger.debug(f"烘焙堆栈的保留能量 {entry.get('energy')} 低于 {BAKE_MIN_ENERGY}，逐个加载 LoRA")
+        entry = None
+    record_cache("baked_stack", entry is not None)
+    return baked_stacks.file_path(entry["recipe"]) if entry is not None else None
@@ -0,0 +1,333 @@
+"""
+Lora 目录索引 - 增量刷新的 Lora 文件列表
+只重新扫描修改时间发生变化的目录，避免在网络存储上反复遍历整个模型库
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Optional, Callable, Dict, List, NamedTuple, Set, Tuple
+
+import folder_paths
+
+logger = logging.getLogger(__name__)
+
+# 两次自动刷新之间的最小间隔（秒），避免每个请求都 stat 所有目录
+INDEX_REFRESH_INTERVAL = 2.0
+
+
+class LoraEntry(NamedTuple):
+    """索引中的单个 Lora 文件"""
+    name: str  # 相对于模型根目录的文件名（与 folder_paths.get_filename_list 一致）
+    path: str  # 完整路径
+    size: int
+    mtime_ns: int
+
+
+class IndexChange(NamedTuple):
+    """一次刷新中检测到的文件变化"""
+    kind: str  # "add" / "modify" / "remove"
+    entry: LoraEntry
+
+
+class MissingLorasError(FileNotFoundError):
+    """一个或多个 LoRA 文件找不到（一次列出全部）"""
+
+    def __init__(self, names: List[str]) -> None:
+        self.names = list(names)
+        super().__init__(f"LoRA files not found: {', '.join(self.names)}")
+
+
+class LoraDirectoryIndex:
+    """
+    增量刷新的 Lora 目录索引
+
+    工作原理：
+    - 首次刷新时遍历所有模型根目录，记录每个目录的修改时间
+    - 之后每次刷新只 stat 已知目录，目录 mtime 变化时才重新列出该目录
+    - 文件增删会改变所在目录的 mtime，因此无需 stat 未变化目录中的文件
+    - 每次内容变化都会更新版本号，客户端可据此判断缓存是否有效
+    """
+
+    def __init__(self, folder_name: str = "loras", refresh_interval: float = INDEX_REFRESH_INTERVAL) -> None:
+        self.folder_name = folder_name
+        self.refresh_interval = refresh_interval
+        self._roots: Tuple[str, ...] = ()
+        self._extensions: Set[str] = set()
+        # 目录路径 -> (所属根目录, mtime_ns)
+        self._dirs: Dict[str, Tuple[str, int]] = {}
+        # 目录路径 -> {文件名: LoraEntry}
+        self._dir_files: Dict[str, Dict[str, LoraEntry]] = {}
+        self._entries: Dict[str, LoraEntry] = {}
+        self._sorted: List[LoraEntry] = []
+        self._generation = 0
+        self._token_prefix = format(time.time_ns(), 'x')
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[List[IndexChange]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[IndexChange]], None]) -> None:
+        """注册变化监听器，每次刷新检测到变化时以变化列表调用"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[IndexChange]], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, changes: List[IndexChange]) -> None:
+        """在锁外通知监听器，单个监听器出错不影响其他监听器"""
+        if not changes:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(changes)
+            except Exception as e:
+                logger.error(f"Lora 索引监听器执行失败: {e}", exc_info=True)
+
+    @property
+    def version(self) -> str:
+        """当前索引版本号，内容变化时改变"""
+        return f"{self._token_prefix}-{self._generation}"
+
+    def _get_roots(self) -> Tuple[Tuple[str, ...], Set[str]]:
+        """获取模型根目录和支持的扩展名"""
+        roots = tuple(
+            os.path.abspath(root) for root in folder_paths.get_folder_paths(self.folder_name)
+        )
+        extensions = set(getattr(folder_paths, 'supported_pt_extensions', set()))
+        folder_info = getattr(folder_paths, 'folder_names_and_paths', {}).get(self.folder_name)
+        if folder_info is not None and len(folder_info) > 1 and folder_info[1]:
+            extensions = set(folder_info[1])
+        return roots, extensions
+
+    def _scan_dir(self, root: str, directory: str, changes: List[IndexChange]) -> None:
+        """重新列出单个目录，并递归扫描新出现的子目录"""
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+            dir_entries = list(os.scandir(directory))
+        except OSError:
+            self._remove_dir(directory, changes)
+            return
+
+        self._dirs[directory] = (root, dir_mtime)
+        old_files = self._dir_files.get(directory, {})
+        new_files: Dict[str, LoraEntry] = {}
+        subdirs: Set[str] = set()
+
+        for dir_entry in dir_entries:
+            try:
+                if dir_entry.is_dir():
+                    if dir_entry.is_symlink() and self._is_symlink_loop(directory, dir_entry.path):
+                        continue
+                    subdirs.add(dir_entry.path)
+                    if dir_entry.path not in self._dirs:
+                        self._scan_dir(root, dir_entry.path, changes)
+                    continue
+                if os.path.splitext(dir_entry.name)[1].lower() not in self._extensions:
+                    continue
+                stat = dir_entry.stat()
+            except OSError:
+                continue
+
+            name = os.path.relpath(dir_entry.path, root)
+            entry = LoraEntry(name, dir_entry.path, stat.st_size, stat.st_mtime_ns)
+            new_files[name] = entry
+
+            old_entry = old_files.get(name)
+            if old_entry is None:
+                changes.append(IndexChange("add", entry))
+            elif old_entry.size != entry.size or old_entry.mtime_ns != entry.mtime_ns:
+                changes.append(IndexChange("modify", entry))
+
+        for name, old_entry in old_files.items():
+            if name not in new_files:
+                changes.append(IndexChange("remove", old_entry))
+
+        # 清理已删除的子目录
+        for known_dir in [d for d in self._dirs if os.path.dirname(d) == directory]:
+            if known_dir not in subdirs:
+                self._remove_dir(known_dir, changes)
+
+        self._dir_files[directory] = new_files
+
+    @staticmethod
+    def _is_symlink_loop(directory: str, link_path: str) -> bool:
+        """符号链接指向当前目录的祖先时跳过，避免无限递归"""
+        target = os.path.realpath(link_path)
+        current = os.path.realpath(directory)
+        return current == target or current.startswith(target + os.sep)
+
+    def _remove_dir(self, directory: str, changes: List[IndexChange]) -> None:
+        """移除目录及其所有子目录"""
+        prefix = directory + os.sep
+        for known_dir in [d for d in self._dirs if d == directory or d.startswith(prefix)]:
+            self._dirs.pop(known_dir, None)
+            for entry in self._dir_files.pop(known_dir, {}).values():
+                changes.append(IndexChange("remove", entry))
+
+    def _rebuild_entries(self) -> None:
+        """按根目录顺序重建 name -> entry 映射（同名文件以靠前的根目录为准）"""
+        entries: Dict[str, LoraEntry] = {}
+        for root in self._roots:
+            for directory, (dir_root, _) in self._dirs.items():
+                if dir_root != root:
+                    continue
+                for name, entry in self._dir_files.get(directory, {}).items():
+                    entries.setdefault(name, entry)
+        self._entries = entries
+        self._sorted = sorted(entries.values(), key=lambda entry: entry.name)
+
+    def refresh(self, force: bool = False) -> List[IndexChange]:
+        """
+        增量刷新索引，并通知变化监听器
+
+        Args:
+            force: 忽略刷新间隔，立即检查所有目录
+
+        Returns:
+            本次刷新检测到的变化列表
+        """
+        changes = self._refresh(force)
+        self._notify(changes)
+        return changes
+
+    def _refresh(self, force: bool) -> List[IndexChange]:
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._generation > 0 and now - self._last_refresh < self.refresh_interval:
+                return []
+            self._last_refresh = now
+
+            changes: List[IndexChange] = []
+            roots, extensions = self._get_roots()
+            if roots != self._roots or extensions != self._extensions:
+                # 根目录配置变化，完全重建
+                self._remove_dir_all(changes)
+                self._roots, self._extensions = roots, extensions
+                for root in roots:
+                    if os.path.isdir(root):
+                        self._scan_dir(root, root, changes)
+            else:
+                for directory, (root, dir_mtime) in list(self._dirs.items()):
+                    if directory not in self._dirs:
+                        # 已在之前的循环中随父目录一起移除
+                        continue
+                    try:
+                        current_mtime = os.stat(directory).st_mtime_ns
+                    except OSError:
+                        self._remove_dir(directory, changes)
+                        continue
+                    if current_mtime != dir_mtime:
+                        self._scan_dir(root, directory, changes)
+                # 之前不存在的根目录可能已被创建
+                for root in roots:
+                    if root not in self._dirs and os.path.isdir(root):
+                        self._scan_dir(root, root, changes)
+
+            if changes or self._generation == 0:
+                self._rebuild_entries()
+                self._generation += 1
+            return changes
+
+    def rescan_dir(self, directory: str) -> List[IndexChange]:
+        """
+        立即重新列出指定目录（不比较目录 mtime）
+
+        文件被原地覆盖写入时所在目录的 mtime 不会变化，
+        文件系统监听器收到修改事件后通过此方法更新对应条目。
+        目录尚未被索引（新建或移入的目录）时重新列出最近的已索引上级目录。
+        """
+        directory = os.path.abspath(directory)
+        with self._lock:
+            known = self._dirs.get(directory)
+            while known is None:
+                parent = os.path.dirname(directory)
+                if parent == directory:
+                    return []
+                directory = parent
+                known = self._dirs.get(directory)
+            changes: List[IndexChange] = []
+            self._scan_dir(known[0], directory, changes)
+            if changes:
+                self._rebuild_entries()
+                self._generation += 1
+        self._notify(changes)
+        return changes
+
+    def _remove_dir_all(self, changes: List[IndexChange]) -> None:
+        for entries in self._dir_files.values():
+            for entry in entries.values():
+                changes.append(IndexChange("remove", entry))
+        self._dirs.clear()
+        self._dir_files.clear()
+
+    @property
+    def roots(self) -> Tuple[str, ...]:
+        """当前索引的模型根目录"""
+        return self._roots
+
+    def entries(self, refresh: bool = True) -> List[LoraEntry]:
+        """获取按名称排序的全部条目"""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return self._sorted
+
+    def get(self, name: str, refresh: bool = True) -> Optional[LoraEntry]:
+        """按文件名查找条目"""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return self._entries.get(name)
+
+
+    def resolve(self, name: str, refresh: bool = True) -> Optional[LoraEntry]:
+        """
+        按文件名解析完整路径、大小和修改时间
+
+        优先使用索引，不访问文件本身；索引中没有时（首次扫描尚未完成、文件刚刚创建，
+        或名称不在索引的根目录中）回退到 folder_paths.get_full_path 和一次 stat。
+
+        Args:
+            name: 相对于模型根目录的文件名
+            refresh: 是否先增量刷新索引（受刷新间隔限制）
+
+        Returns:
+            找不到文件时返回 None
+        """
+        entry = self.get(name, refresh)
+        if entry is not None:
+            return entry
+        path = folder_paths.get_full_path(self.folder_name, name)
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return LoraEntry(name, path, stat.st_size, stat.st_mtime_ns)
+
+    def resolve_many(self, names: List[str], refresh: bool = True) -> Tuple[Dict[str, LoraEntry], List[str]]:
+        """
+        一次解析整个堆栈（最多刷新一次索引）
+
+        Returns:
+            (名称 -> 条目, 找不到的名称列表，按首次出现的顺序)
+        """
+        if refresh:
+            self.refresh()
+        resolved: Dict[str, LoraEntry] = {}
+        missing: List[str] = []
+        for name in dict.fromkeys(names):
+            entry = self.resolve(name, refresh=False)
+            if entry is None:
+                missing.append(name)
+            else:
+                resolved[name] = entry
+        return resolved, missing
+
+
+# 全局 Lora 索引实例
+lora_index = LoraDirectoryIndex("loras")
@@ -0,0 +1,165 @@
+"""
+LoRA key 映射缓存
+comfy.sd.load_lora_for_models 每次调用都会通过 comfy.lora.model_lora_keys_unet / model_lora_keys_clip
+遍历基础模型和 CLIP 的全部 state dict key，重新生成 "LoRA key -> 模型 key" 的映射。
+同一个模型连续应用多个 LoRA 时，这些映射完全相同。
+
+这里只缓存这两个函数的结果（按模型类和 state dict key 签名），加载 LoRA 仍然调用
+comfy.sd.load_lora_for_models，其余步骤完全由 ComfyUI 完成。
+缓存只在本插件的调用期间生效（线程局部开关），ComfyUI 自身和其他节点的调用不受影响。
+"""
+
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import comfy.lora
+import comfy.sd
+
+from .easy_setting_utils import get_env_setting
+from .lora_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# 是否缓存 key 映射，关闭时不替换 comfy.lora 中的函数
+KEY_MAP_CACHE = get_env_setting("EASY_SETTING_KEY_MAP_CACHE", True)
+# 最多缓存的模块（模型或 CLIP）数
+KEY_MAP_CACHE_SIZE = 16
+
+# 缓存的 comfy.lora 函数
+KEY_MAP_FUNCTIONS = ("model_lora_keys_unet", "model_lora_keys_clip")
+
+KeyMapBuilder = Callable[..., Dict[str, str]]
+
+
+class LoraKeyMapCache:
+    """
+    (函数名, 模块签名) -> key 映射 的 LRU 缓存
+
+    签名由模块类和完整的 state dict key 序列组成，重新加载的同一架构模型也能命中。
+    每个模块对象的签名只计算一次（弱引用保存，模块释放后自动清除）。
+    """
+
+    def __init__(self, max_entries: int = KEY_MAP_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._signatures: "weakref.WeakKeyDictionary[Any, Hashable]" = weakref.WeakKeyDictionary()
+        self._maps: "OrderedDict[Tuple[str, Hashable], Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _signature(self, module: Any) -> Hashable:
+        with self._lock:
+            try:
+                return self._signatures[module]
+            except (KeyError, TypeError):
+                pass
+        cls = type(module)
+        signature = (cls.__module__, cls.__qualname__, tuple(module.state_dict().keys()))
+        with self._lock:
+            try:
+                self._signatures[module] = signature
+            except TypeError:
+                # 不支持弱引用的对象，每次重新计算签名
+                pass
+        return signature
+
+    def get(self, name: str, module: Any, build: KeyMapBuilder) -> Dict[str, str]:
+        """
+        获取一个模块的 LoRA key 映射
+
+        Args:
+            name: 生成映射的函数名（model_lora_keys_unet / model_lora_keys_clip）
+            module: 基础模型（ModelPatcher.model）或 CLIP 的 cond_stage_model
+            build: 未命中时调用的原始函数
+
+        Returns:
+            LoRA key -> 模型 key 的映射，调用方不应修改
+        """
+        key = (name, self._signature(module))
+        with self._lock:
+            key_map = self._maps.get(key)
+            if key_map is not None:
+                self._maps.move_to_end(key)
+        record_cache("lora_key_map", key_map is not None)
+        if key_map is not None:
+            return key_map
+
+        key_map = build(module, {})
+        with self._lock:
+            self._maps[key] = key_map
+            while len(self._maps) > self.max_entries:
+                self._maps.popitem(last=False)
+        return key_map
+
+    def clear(self) -> None:
+        with self._lock:
+            self._maps.clear()
+            self._signatures.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._maps)
+
+
+# 全局 key 映射缓存
+lora_key_maps = LoraKeyMapCache()
+
+# 当前线程是否处于本插件的 load_lora_for_models 调用中
+_scope = threading.local()
+# 已安装的包装函数 -> 被包装的函数
+_wrappers: Dict[KeyMapBuilder, KeyMapBuilder] = {}
+_install_lock = threading.Lock()
+
+
+def _wrap(name: str, build: KeyMapBuilder) -> KeyMapBuilder:
+    def model_lora_keys(model: Any, key_map: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        if key_map is None:
+            key_map = {}
+        if not getattr(_scope, "active", False):
+            return build(model, key_map)
+        key_map.update(lora_key_maps.get(name, model, build))
+        return key_map
+
+    model_lora_keys.__name__ = model_lora_keys.__qualname__ = name
+    model_lora_keys.__doc__ = build.__doc__
+    model_lora_keys.__wrapped__ = build
+    return model_lora_keys
+
+
+def _install() -> None:
+    """在 comfy.lora 中安装带缓存的包装函数（函数被替换过时重新包装当前的函数）"""
+    with _install_lock:
+        for name in KEY_MAP_FUNCTIONS:
+            current = getattr(comfy.lora, name)
+            if current not in _wrappers:
+                wrapper = _wrap(name, current)
+                _wrappers[wrapper] = current
+                setattr(comfy.lora, name, wrapper)
+
+
+def load_lora_for_models(
+    model: Optional[Any],
+    clip: Optional[Any],
+    lora: Dict[str, Any],
+    strength_model: float,
+    strength_clip: float
+) -> Tuple[Optional[Any], Optional[Any]]:
+    """
+    调用 comfy.sd.load_lora_for_models，期间 key 映射使用缓存
+
+    关闭 KEY_MAP_CACHE 或 ComfyUI 缺少所需接口时直接调用，不使用缓存。
+
+    Returns:
+        (应用 LoRA 后的模型, 应用 LoRA 后的 CLIP)
+    """
+    if not KEY_MAP_CACHE or not all(hasattr(comfy.lora, name) for name in KEY_MAP_FUNCTIONS):
+        return comfy.sd.load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+
+    _install()
+    outer = getattr(_scope, "active", False)
+    _scope.active = True
+    try:
+        return comfy.sd.load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+    finally:
+        _scope.active = outer
@@ -0,0 +1,208 @@
+"""
+LoRA 性能指标 - 分阶段耗时直方图与缓存命中计数
+以 Prometheus 文本格式导出，供 /api/easy_setting/metrics 使用
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from .easy_setting_utils import get_env_setting
+
+# 阶段耗时直方图的桶边界（秒）
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 单个 LoRA 加载超过该耗时（毫秒）时记录警告，0 表示关闭
+SLOW_LORA_MS = get_env_setting("EASY_SETTING_SLOW_LORA_MS", 2000.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """带标签的单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def get(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """带标签的累积直方图（与 Prometheus histogram 语义一致）"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = PHASE_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [各桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = [0] * len(self.buckets) + [0.0, 0]
+                self._values[labelvalues] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, *labelvalues: str) -> int:
+        with self._lock:
+            state = self._values.get(labelvalues)
+            return state[-1] if state else 0
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for labelvalues, state in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, state[:len(self.buckets)]):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}"
+                )
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {state[-1]}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+# ===== 全局指标 =====
+
+phase_seconds = Histogram(
+    "easy_setting_phase_seconds",
+    "Time spent in each LoRA loading / info phase.",
+    labelnames=("phase",),
+)
+phase_errors = Counter(
+    "easy_setting_phase_errors_total",
+    "Errors raised (and swallowed) in each phase.",
+    labelnames=("phase",),
+)
+cache_requests = Counter(
+    "easy_setting_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss).",
+    labelnames=("cache", "result"),
+)
+slow_loras = Counter(
+    "easy_setting_slow_lora_total",
+    "LoRA loads slower than EASY_SETTING_SLOW_LORA_MS.",
+)
+
+ALL_METRICS = (phase_seconds, phase_errors, cache_requests, slow_loras)
+
+
+@contextmanager
+def timed(phase: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """
+    记录代码块耗时到阶段直方图
+
+    Args:
+        phase: 阶段名（如 "load_torch_file"）
+        timings: 可选的字典，耗时（秒）会累加到 timings[phase]，用于慢加载警告的分解
+
+    异常会被计入 phase_errors 后继续抛出。
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        phase_errors.inc(phase)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        phase_seconds.observe(elapsed, phase)
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """记录一次缓存查询结果"""
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def record_error(phase: str) -> None:
+    """记录一次被吞掉的错误"""
+    phase_errors.inc(phase)
+
+
+def is_slow(timings: Dict[str, float]) -> bool:
+    """判断总耗时是否超过慢加载阈值"""
+    return SLOW_LORA_MS > 0 and sum(timings.values()) * 1000 >= SLOW_LORA_MS
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    """将分阶段耗时格式化为 "phase=12.3ms, ..." 形式"""
+    return ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timings.items())
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式导出全部指标"""
+    return "\n".join(metric.render() for metric in ALL_METRICS) + "\n"
+
+
+def reset_metrics() -> None:
+    """清空全部指标"""
+    for metric in ALL_METRICS:
+        metric.reset()
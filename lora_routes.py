@@ -0,0 +1,100 @@
+"""
+Lora API 路由注册
+启动时只注册路由；处理函数在第一次收到请求时才导入 lora_api，
+避免在启动阶段加载 requests、hashlib 等只有信息弹窗才用到的依赖
+"""
+
+import importlib
+from types import ModuleType
+
+from aiohttp import web
+from server import PromptServer
+
+from .lora_metrics import render_prometheus
+
+# 获取 PromptServer 实例并注册路由
+routes = PromptServer.instance.routes
+
+
+def _lora_api() -> ModuleType:
+    """首次调用时导入 lora_api，之后直接返回已导入的模块"""
+    return importlib.import_module('.lora_api', __package__)
+
+
+@routes.get('/api/easy_setting/loras/info')
+async def api_get_lora_info(request: web.Request) -> web.Response:
+    """获取指定 Lora 的详细信息，参数见 lora_api.api_get_lora_info"""
+    return await _lora_api().api_get_lora_info(request)
+
+
+@routes.get('/api/easy_setting/loras/list')
+async def api_list_loras(request: web.Request) -> web.Response:
+    """获取可用的 Lora 列表，参数见 lora_api.api_list_loras"""
+    return await _lora_api().api_list_loras(request)
+
+
+@routes.get('/api/easy_setting/thumbnail')
+async def api_get_thumbnail(request: web.Request) -> web.Response:
+    """获取 Civitai 预览图的本地缩略图，参数见 lora_api.api_get_thumbnail"""
+    return await _lora_api().api_get_thumbnail(request)
+
+
+@routes.post('/api/easy_setting/loras/bake')
+async def api_bake_stack(request: web.Request) -> web.Response:
+    """将 LoRA 堆栈烘焙为一个合并后的 LoRA 文件，参数见 lora_api.api_bake_stack"""
+    return await _lora_api().api_bake_stack(request)
+
+
+def _lora_warmup() -> ModuleType:
+    """首次调用时导入 lora_warmup"""
+    return importlib.import_module('.lora_warmup', __package__)
+
+
+@routes.post('/api/easy_setting/loras/warm')
+async def api_warm_loras(request: web.Request) -> web.Response:
+    """在后台把 LoRA 加载到权重缓存，参数见 lora_warmup.api_warm_loras"""
+    return await _lora_warmup().api_warm_loras(request)
+
+
+@routes.get('/api/easy_setting/loras/warm')
+async def api_get_warm_progress(request: web.Request) -> web.Response:
+    """获取预热状态，格式见 lora_warmup.api_get_warm_progress"""
+    return await _lora_warmup().api_get_warm_progress(request)
+
+
+def _civitai_enrich() -> ModuleType:
+    """首次调用时导入 civitai_enrich"""
+    return importlib.import_module('.civitai_enrich', __package__)
+
+
+@routes.get('/api/easy_setting/civitai/enrich')
+async def api_get_enrich_progress(request: web.Request) -> web.Response:
+    """获取 Civitai 批量补全任务的进度，格式见 civitai_enrich.api_get_enrich_progress"""
+    return await _civitai_enrich().api_get_enrich_progress(request)
+
+
+@routes.post('/api/easy_setting/civitai/enrich')
+async def api_start_enrich(request: web.Request) -> web.Response:
+    """启动或继续 Civitai 批量补全任务，参数见 civitai_enrich.api_start_enrich"""
+    return await _civitai_enrich().api_start_enrich(request)
+
+
+@routes.delete('/api/easy_setting/civitai/enrich')
+async def api_cancel_enrich(request: web.Request) -> web.Response:
+    """取消 Civitai 批量补全任务"""
+    return await _civitai_enrich().api_cancel_enrich(request)
+
+
+@routes.get('/api/easy_setting/metrics')
+async def api_metrics(request: web.Request) -> web.Response:
+    """
+    以 Prometheus 文本格式导出性能指标
+    
+    包含各阶段耗时直方图（resolve、load_torch_file、load_lora_for_models、
+    hash、metadata、civitai）、被吞掉的错误计数和缓存命中计数。
+    """
+    return web.Response(
+        text=render_prometheus(),
+        content_type='text/plain',
+        headers={"Cache-Control": "no-store"}
+    )
@@ -0,0 +1,292 @@
+"""
+LoRA 预热
+调度器知道下一批任务要用哪些 LoRA 时，可以提前请求 /api/easy_setting/loras/warm，
+在后台把这些文件加载到加载器的权重缓存中。之后的第一个任务直接命中缓存，
+延迟与稳定状态相同。
+
+- 预热只填充 lora_weight_cache（配置了共享目录时同时写入共享缓存），不修改模型
+- 按请求顺序累计缓存大小（按缓存精度从文件头部估计），超出缓存预算的部分不加载，避免把刚预热的 LoRA 挤出缓存；
+  缓存总会保留最近放入的一项，所以第一个 LoRA 总会预热（预算为 0 时只预热这一个）
+- 请求的是带强度的堆栈并且已经烘焙过时，预热烘焙文件（加载器会直接使用它）
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from . import lora_api
+from .lora_index import lora_index
+from .lora_watcher import lora_watcher
+from .lora_bake import find_baked_stack, normalize_stack
+from .lora_metrics import record_error
+from .lora_weight_cache import LoraWeightCache, lora_weight_cache, state_dict_nbytes
+from .power_lora_loader import load_lora_weights
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# 同时加载的文件数
+WARM_WORKERS = get_env_setting("EASY_SETTING_WARM_WORKERS", 2)
+# 保留状态的预热记录数
+WARM_HISTORY = 256
+
+
+class LoraWarmer:
+    """
+    后台预热任务
+
+    每个 LoRA 的状态：
+    queued → loading → ready / failed；找不到文件为 missing；超出缓存预算为 over_budget；
+    预热完成后被其他 LoRA 挤出缓存的显示为 evicted。
+    """
+
+    def __init__(self, cache: LoraWeightCache = lora_weight_cache, workers: int = WARM_WORKERS) -> None:
+        self.cache = cache
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 名称 -> 预热记录
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lora-warm")
+            return self._executor
+
+    def warm(self, names: List[str], baked: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """
+        提交预热
+
+        Args:
+            names: LoRA 文件名（相对 loras 目录）
+            baked: 烘焙文件名 -> 完整路径，这些名称不在 loras 目录中查找
+
+        Returns:
+            每个 LoRA 的预热记录（内部对象，通过 snapshot 读取）
+        """
+        remaining = self.cache.max_bytes
+        accepted = False
+        jobs = []
+        baked = baked or {}
+        for name in dict.fromkeys(names):
+            job = self._submit(name, baked.get(name), remaining if accepted else None)
+            if job["status"] not in ("over_budget", "missing"):
+                remaining -= job["bytes"] or 0
+                accepted = True
+            jobs.append(job)
+        return jobs
+
+    def _submit(self, name: str, baked_path: Optional[str], remaining: Optional[int]) -> Dict[str, Any]:
+        if baked_path is None:
+            entry = lora_index.resolve(name, refresh=not lora_watcher.running)
+            path = entry.path if entry is not None else None
+        else:
+            path = baked_path
+        job: Dict[str, Any] = {
+            "name": name, "baked": baked_path is not None, "status": "missing", "bytes": None,
+            "seconds": None, "error": None, "path": path, "stamp": None, "future": None,
+        }
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None:
+            job["error"] = "LoRA file not found"
+            return self._track(job)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            current = self._jobs.get(name)
+        if current is not None and current["stamp"] == stamp and current["status"] in ("queued", "loading"):
+            # 已在预热中
+            return current
+
+        job["stamp"] = stamp
+        cached = self.cache.peek(path, stamp)
+        if cached is not None:
+            job.update(status="ready", bytes=state_dict_nbytes(cached), seconds=0.0)
+            return self._track(job)
+        # 按缓存精度估计（缓存转换为半精度时小于文件大小）
+        job["bytes"] = self.cache.estimate_nbytes(path, stat.st_size)
+        if remaining is not None and job["bytes"] > remaining:
+            # 加载后会把同一批中先预热的 LoRA 挤出缓存
+            job.update(status="over_budget", error="Exceeds the LoRA weight cache budget")
+        else:
+            job["status"] = "queued"
+            job["future"] = self._get_executor().submit(self._load, job)
+        return self._track(job)
+
+    def _track(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._jobs.pop(job["name"], None)
+            self._jobs[job["name"]] = job
+            while len(self._jobs) > WARM_HISTORY:
+                self._jobs.popitem(last=False)
+        return job
+
+    def _load(self, job: Dict[str, Any]) -> None:
+        job["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            lora = load_lora_weights(job["path"])
+            job["bytes"] = state_dict_nbytes(lora)
+            job["status"] = "ready"
+        except Exception as e:
+            record_error("warm")
+            logger.warning(f"预热 LoRA 失败 ({job['name']}): {e}")
+            job.update(status="failed", error=str(e))
+        finally:
+            job["seconds"] = time.perf_counter() - start
+
+    def jobs(self, names: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """保留的预热记录，可按名称筛选"""
+        with self._lock:
+            if names is None:
+                return list(self._jobs.values())
+            return [self._jobs[name] for name in names if name in self._jobs]
+
+    def snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """预热记录的 JSON 表示"""
+        status = job["status"]
+        if status == "ready" and self.cache.peek(job["path"], job["stamp"]) is None:
+            status = "evicted"
+        return {
+            "name": job["name"], "baked": job["baked"], "status": status, "bytes": job["bytes"], "seconds": job["seconds"], "error": job["error"],
+        }
+
+    def progress(self, jobs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        预热进度
+
+        Args:
+            jobs: 要报告的记录，默认为全部保留的记录
+        """
+        if jobs is None:
+            jobs = self.jobs()
+        loras = [self.snapshot(job) for job in jobs]
+        return {
+            "loras": loras,
+            "total": len(loras),
+            "ready": sum(1 for item in loras if item["status"] == "ready"),
+            "pending": sum(1 for item in loras if item["status"] in ("queued", "loading")),
+            "cacheBytes": self.cache.total_bytes,
+            "budgetBytes": self.cache.max_bytes,
+        }
+
+
+# 全局预热任务
+lora_warmer = LoraWarmer()
+
+
+def _warm_targets(items: List[Any]) -> Tuple[List[str], List[Tuple[str, float, float]]]:
+    """把请求中的 LoRA 列表拆分为文件名和带强度的堆栈项"""
+    names = []
+    stack = []
+    for item in items:
+        if isinstance(item, str):
+            names.append(item)
+            continue
+        parsed = lora_api.parse_stack_item(item)
+        if parsed:
+            names.append(parsed[0])
+            stack.append(parsed)
+    return names, stack
+
+
+def _find_baked(stack: List[Tuple[str, float, float]], has_clip: bool) -> Optional[str]:
+    try:
+        return find_baked_stack(normalize_stack(stack, has_clip))
+    except Exception as e:
+        logger.debug(f"查找烘焙堆栈失败: {e}")
+        return None
+
+
+async def api_warm_loras(request: web.Request) -> web.Response:
+    """
+    预热 LoRA 到加载器的权重缓存
+
+    请求体（JSON）:
+        {
+            "loras": ["a.safetensors", ["b.safetensors", 0.8, 0.6], {"lora": "c.safetensors", "strength": 1.0}],
+            "wait": false,  // 可选，为 true 时等待加载完成再返回
+            "has_clip": true  // 可选，工作流没有 CLIP 时设为 false（与加载器查找烘焙堆栈的方式一致）
+        }
+    字符串为文件名；全部是带强度的项时视为一个堆栈，已烘焙时改为预热烘焙文件。
+
+    返回（还有未完成的加载时状态码为 202，否则为 200）:
+        {
+            "loras": [{"name", "baked", "status", "bytes", "seconds", "error"}, ...],
+            "total": 3, "ready": 1, "pending": 2,
+            "cacheBytes": 当前缓存大小, "budgetBytes": 缓存预算
+        }
+    status 为 queued / loading / ready / failed / missing / over_budget / evicted。
+    """
+    try:
+        try:
+            body = await request.json()
+            names, stack = _warm_targets(list(body.get('loras') or []))
+            wait = bool(body.get('wait', False))
+            has_clip = bool(body.get('has_clip', True))
+        except (ValueError, TypeError, AttributeError) as e:
+            return web.json_response(
+                {"error": f"Invalid request body: {e}"},
+                status=400
+            )
+        if not names:
+            return web.json_response(
+                {"error": "Missing 'loras'"},
+                status=400
+            )
+
+        loop = asyncio.get_running_loop()
+        baked: Dict[str, str] = {}
+        if stack and len(stack) == len(names):
+            baked_path = await loop.run_in_executor(None, _find_baked, stack, has_clip)
+            if baked_path is not None:
+                names = [os.path.basename(baked_path)]
+                baked[names[0]] = baked_path
+
+        jobs = await loop.run_in_executor(None, lora_warmer.warm, names, baked)
+        if wait:
+            futures: List[Future] = [job["future"] for job in jobs if job["future"] is not None]
+            if futures:
+                await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        progress = lora_warmer.progress(jobs)
+        return lora_api.json_response(
+            progress, status=200 if wait or progress["pending"] == 0 else 202,
+            headers={"Cache-Control": "no-store"}
+        )
+
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
+
+
+async def api_get_warm_progress(request: web.Request) -> web.Response:
+    """
+    获取预热状态
+
+    查询参数:
+        names: 逗号分隔的文件名（可选，默认为最近的全部预热记录）
+
+    返回格式同 api_warm_loras。
+    """
+    try:
+        names = [name for name in (request.query.get('names') or '').split(',') if name]
+        progress = lora_warmer.progress(lora_warmer.jobs(names or None))
+        return lora_api.json_response(progress, headers={"Cache-Control": "no-store"})
+    except Exception as e:
+        return web.json_response(
+            {"error": str(e)},
+            status=500
+        )
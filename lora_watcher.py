@@ -0,0 +1,203 @@
+"""
+Lora 文件监听器 - 增量失效 Lora 相关缓存
+优先使用 watchdog（inotify 等系统通知），不可用时回退为按目录 mtime 轮询
+"""
+
+import os
+import logging
+import threading
+from typing import Optional, Set
+
+from .lora_index import LoraDirectoryIndex, lora_index
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# 监听模式：auto（有 watchdog 时使用系统通知，否则轮询）/ inotify / poll / off
+WATCH_MODE = get_env_setting("EASY_SETTING_WATCH_MODE", "auto")
+# 轮询模式下检查目录 mtime 的间隔（秒）
+WATCH_POLL_INTERVAL = get_env_setting("EASY_SETTING_WATCH_INTERVAL", 10.0)
+# 系统通知模式下的兜底轮询间隔（秒），网络存储上的远端修改不一定会产生通知
+WATCH_FALLBACK_INTERVAL = 60.0
+# 收到文件系统事件后等待的时间（秒），合并复制大文件时产生的连续事件
+WATCH_DEBOUNCE = 0.5
+
+
+def _load_observer_class():
+    """延迟导入 watchdog（可选依赖），未安装时返回 None"""
+    try:
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+    return Observer
+
+
+class _ChangeHandler:
+    """将 watchdog 事件转换为需要重新扫描的目录
+
+    watchdog 的 Observer 只调用 handler.dispatch(event)，
+    因此无需继承 FileSystemEventHandler，也就不必在导入时加载 watchdog。
+    """
+
+    def __init__(self, watcher: "LoraWatcher") -> None:
+        self.watcher = watcher
+
+    def dispatch(self, event) -> None:
+        paths = [getattr(event, 'src_path', None), getattr(event, 'dest_path', None)]
+        for path in paths:
+            if not path:
+                continue
+            path = os.fsdecode(path)
+            self.watcher.mark_dirty(path if event.is_directory else os.path.dirname(path))
+
+
+class LoraWatcher:
+    """
+    Lora 目录监听器
+
+    工作原理：
+    - 后台线程驱动 LoraDirectoryIndex 增量刷新
+    - 索引检测到的 add / modify / remove 变化会通知所有索引监听器，
+      由各缓存自行失效对应条目
+    - 系统通知模式下只重新扫描发生事件的目录，能发现原地覆盖写入的文件
+    """
+
+    def __init__(
+        self,
+        index: LoraDirectoryIndex,
+        mode: str = WATCH_MODE,
+        poll_interval: float = WATCH_POLL_INTERVAL
+    ) -> None:
+        self.index = index
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._start_attempted = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def mark_dirty(self, directory: str) -> None:
+        """标记目录需要重新扫描（由系统通知回调调用）"""
+        with self._dirty_lock:
+            self._dirty.add(os.path.abspath(directory))
+        self._wakeup.set()
+
+    def ensure_started(self) -> bool:
+        """首次调用时启动监听，之后的调用只返回当前状态（开销很小）"""
+        if self._start_attempted:
+            return self.running
+        with self._start_lock:
+            if not self._start_attempted:
+                self._start_attempted = True
+                try:
+                    return self.start()
+                except Exception as e:
+                    logger.error(f"启动 Lora 文件监听失败: {e}", exc_info=True)
+                    return False
+        return self.running
+
+    def start(self) -> bool:
+        """
+        启动监听
+
+        首次全量扫描和 watchdog 的导入都在后台线程中进行，不阻塞调用方。
+
+        Returns:
+            是否成功启动
+        """
+        if self.running:
+            return True
+        if self.mode == "off":
+            return False
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="EasySettingLoraWatcher", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def _start_observer(self) -> None:
+        """尝试启动系统通知，失败时保持轮询模式"""
+        Observer = _load_observer_class() if self.mode in ("auto", "inotify") else None
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                handler = _ChangeHandler(self)
+                for root in self.index.roots:
+                    if os.path.isdir(root):
+                        self._observer.schedule(handler, root, recursive=True)
+                self._observer.daemon = True
+                self._observer.start()
+            except Exception as e:
+                logger.warning(f"无法启动文件系统通知，回退为轮询模式: {e}")
+                self._observer = None
+        elif self.mode == "inotify":
+            logger.warning("未安装 watchdog，回退为轮询模式")
+
+        self.backend = "poll" if self._observer is None else "inotify"
+
+    def stop(self) -> None:
+        """停止监听"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+            except Exception:
+                pass
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.backend = None
+
+    def poll_once(self, full: bool = True) -> None:
+        """
+        处理一次待扫描目录并增量刷新索引
+
+        Args:
+            full: 是否再检查所有目录的 mtime（轮询模式和兜底轮询）；
+                系统通知模式下收到事件时只重新扫描发生事件的目录
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        for directory in sorted(dirty):
+            self.index.rescan_dir(directory)
+        if full:
+            self.index.refresh(force=True)
+
+    def _run(self) -> None:
+        try:
+            self.index.refresh(force=True)
+        except Exception as e:
+            logger.error(f"扫描 Lora 目录失败: {e}", exc_info=True)
+        self._start_observer()
+
+        interval = self.poll_interval if self._observer is None else WATCH_FALLBACK_INTERVAL
+        while not self._stop.is_set():
+            woken = self._wakeup.wait(interval)
+            if woken:
+                # 合并短时间内的连续事件
+                self._stop.wait(WATCH_DEBOUNCE)
+                self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                # 系统通知只需处理发生事件的目录，兜底轮询到期时再检查全部目录
+                self.poll_once(full=self._observer is None or not woken)
+            except Exception as e:
+                logger.error(f"刷新 Lora 索引失败: {e}", exc_info=True)
+
+
+# 全局 Lora 监听器实例
+lora_watcher = LoraWatcher(lora_index)
@@ -0,0 +1,280 @@
+"""
+LoRA 权重缓存 - 所有加载器共享，按内存预算淘汰
+以完整路径为键，记录加载时文件的 (mtime_ns, size)，文件变化后自动失效。
+
+设置 EASY_SETTING_LORA_CACHE_PRECISION=fp16 / bf16 后，fp32/fp64 张量在放入缓存时
+转换为半精度，同样的预算可以缓存约两倍的 LoRA。
+应用补丁时 ComfyUI 会把 LoRA 张量转换为计算精度（comfy.lora.calculate_weight 中的
+intermediate_dtype，默认 fp32），因此不需要额外的还原步骤。
+"""
+
+import json
+import logging
+import math
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .easy_setting_utils import get_env_setting
+from .lora_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# 权重缓存的内存预算（MB），最近使用的一个 LoRA 总会保留；
+# 默认 0 即只缓存最后一个 LoRA（与原来的内存占用相同），需要时再调大
+LORA_CACHE_MB = get_env_setting("EASY_SETTING_LORA_CACHE_MB", 0)
+# 缓存精度：空字符串保持文件原始精度，可选 fp16 / bf16
+LORA_CACHE_PRECISION = get_env_setting("EASY_SETTING_LORA_CACHE_PRECISION", "")
+
+# 精度名称 -> torch dtype 名称
+CACHE_PRECISIONS = {
+    "fp16": "float16",
+    "float16": "float16",
+    "half": "float16",
+    "bf16": "bfloat16",
+    "bfloat16": "bfloat16",
+}
+
+# safetensors dtype -> torch dtype 名称
+SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+    "F8_E4M3": "float8_e4m3fn", "F8_E5M2": "float8_e5m2",
+}
+
+
+def resolve_precision(name: str) -> Optional[Any]:
+    """
+    将精度名称转换为 torch dtype
+
+    Returns:
+        torch dtype；名称为空、无法识别或未安装 torch 时返回 None
+    """
+    name = (name or "").strip().lower()
+    if not name or name in ("none", "off", "original"):
+        return None
+    if name not in CACHE_PRECISIONS:
+        logger.warning(f"未知的 LoRA 缓存精度: {name}，保持原始精度")
+        return None
+    try:
+        import torch
+    except ImportError:
+        return None
+    return getattr(torch, CACHE_PRECISIONS[name])
+
+
+def tensor_nbytes(value: Any) -> int:
+    """张量（或替身对象）占用的字节数"""
+    if hasattr(value, "element_size") and hasattr(value, "numel"):
+        return value.element_size() * value.numel()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+def state_dict_nbytes(lora: Dict[str, Any]) -> int:
+    return sum(tensor_nbytes(value) for value in lora.values())
+
+
+def downcast_state_dict(lora: Dict[str, Any], dtype: Any) -> Dict[str, Any]:
+    """
+    将比 dtype 更宽的浮点张量转换为 dtype
+
+    整数张量、已是低精度的张量和标量（如 alpha）保持不变；
+    转换为 fp16 会溢出的张量也保持原样。
+    """
+    import torch
+
+    finfo = torch.finfo(dtype)
+    result = {}
+    converted = False
+    for key, value in lora.items():
+        if (
+            isinstance(value, torch.Tensor)
+            and value.is_floating_point()
+            and value.dim() > 0
+            and value.element_size() > finfo.bits // 8
+            and (finfo.max >= torch.finfo(value.dtype).max or value.abs().max().item() <= finfo.max)
+        ):
+            value = value.to(dtype)
+            converted = True
+        result[key] = value
+
+    if converted:
+        # 未转换的张量可能是整个文件缓冲区的视图，复制出来以便释放原精度的数据
+        for key, value in result.items():
+            if isinstance(value, torch.Tensor) and value.untyped_storage().nbytes() > tensor_nbytes(value):
+                result[key] = value.clone()
+    return result
+
+
+def tensors_from_buffer(buffer: Any) -> Dict[str, Any]:
+    """将完整的 safetensors 文件内容解析为张量（零拷贝，张量是 buffer 的视图）
+    
+    Args:
+        buffer: 保存整个文件内容的一维 uint8 张量
+        
+    Raises:
+        ValueError / KeyError / RuntimeError: 文件格式不正确、包含不支持的 dtype 或数据未对齐
+    """
+    import torch
+    
+    header_size = struct.unpack("<Q", buffer[:8].numpy().tobytes())[0]
+    if 8 + header_size > len(buffer):
+        raise ValueError("Invalid safetensors header")
+    header = json.loads(buffer[8:8 + header_size].numpy().tobytes())
+    header.pop("__metadata__", None)
+    base = 8 + header_size
+    
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info["dtype"]])
+        shape = info["shape"]
+        start, end = info["data_offsets"]
+        if end - start != math.prod(shape) * dtype.itemsize or base + end > len(buffer):
+            raise ValueError(f"Invalid data offsets for tensor {name}")
+        if start == end:
+            tensors[name] = torch.empty(shape, dtype=dtype)
+        else:
+            tensors[name] = buffer[base + start:base + end].view(dtype).reshape(shape)
+    return tensors
+
+
+class SharedStateDict(dict):
+    """映射自共享段文件的 LoRA 权重（见 shared_weight_cache），已是缓存精度"""
+
+
+class LoraWeightCache:
+    """
+    路径 -> LoRA 权重 的 LRU 缓存
+
+    总大小超过预算时从最久未使用的一项开始淘汰，但总会保留最近放入的一项，
+    预算为 0 时相当于只缓存最后一个 LoRA。
+    """
+
+    def __init__(self, max_bytes: int = LORA_CACHE_MB << 20, precision: str = LORA_CACHE_PRECISION) -> None:
+        self.max_bytes = max_bytes
+        self.precision = resolve_precision(precision)
+        # 规范化路径 -> ((mtime_ns, size), 权重, 字节数)
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Any], int]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(lora_path: str) -> str:
+        return os.path.normcase(os.path.abspath(lora_path))
+
+    def get(self, lora_path: str, stamp: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+        """获取与 stamp 匹配的权重，没有缓存或文件已变化时返回 None"""
+        lora_path = self._key(lora_path)
+        with self._lock:
+            entry = self._entries.get(lora_path)
+            if entry is not None and entry[0] != tuple(stamp):
+                self._remove(lora_path)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(lora_path)
+        record_cache("lora_weights", entry is not None)
+        return entry[1] if entry is not None else None
+
+    def peek(self, lora_path: str, stamp: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+        """与 get 相同，但不计入命中率统计（用于预热和加载前的再次检查）"""
+        lora_path = self._key(lora_path)
+        with self._lock:
+            entry = self._entries.get(lora_path)
+            if entry is None or entry[0] != tuple(stamp):
+                return None
+            self._entries.move_to_end(lora_path)
+            return entry[1]
+
+    def put(self, lora_path: str, stamp: Tuple[int, int], lora: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        放入缓存（按配置的精度转换）
+
+        映射自共享段文件的权重已按相同精度写入，原样缓存，
+        这样本地缓存持有的仍是 SharedStateDict 本身，不会复制出共享内存之外的副本。
+
+        Returns:
+            实际缓存的权重，调用方应使用它而不是传入的 lora，以便释放原精度的张量
+        """
+        if self.precision is not None and not isinstance(lora, SharedStateDict):
+            lora = downcast_state_dict(lora, self.precision)
+        nbytes = state_dict_nbytes(lora)
+        lora_path = self._key(lora_path)
+        with self._lock:
+            self._remove(lora_path)
+            self._entries[lora_path] = (tuple(stamp), lora, nbytes)
+            self._total += nbytes
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+        return lora
+
+    def estimate_nbytes(self, lora_path: str, file_size: int) -> int:
+        """
+        估计文件放入缓存后占用的字节数（不加载张量）
+
+        配置了缓存精度时读取 safetensors 头部，按转换后的 dtype 计算；
+        没有配置精度或无法解析头部时返回文件大小。
+        """
+        if self.precision is None:
+            return file_size
+        import torch
+
+        try:
+            with open(lora_path, "rb") as f:
+                header_size = struct.unpack("<Q", f.read(8))[0]
+                if header_size > file_size - 8:
+                    return file_size
+                header = json.loads(f.read(header_size))
+            header.pop("__metadata__", None)
+            total = 0
+            for info in header.values():
+                start, end = info["data_offsets"]
+                nbytes = end - start
+                dtype = getattr(torch, SAFETENSORS_DTYPES.get(info["dtype"], ""), None)
+                if (
+                    isinstance(dtype, torch.dtype)
+                    and dtype.is_floating_point
+                    and info["shape"]
+                    and dtype.itemsize > self.precision.itemsize
+                ):
+                    nbytes = nbytes // dtype.itemsize * self.precision.itemsize
+                total += nbytes
+            return total
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, struct.error):
+            return file_size
+
+    def _remove(self, lora_path: str) -> None:
+        # 调用方持有锁
+        entry = self._entries.pop(lora_path, None)
+        if entry is not None:
+            self._total -= entry[2]
+
+    def invalidate(self, lora_path: Optional[str] = None) -> None:
+        """清除指定文件（或全部）的缓存"""
+        with self._lock:
+            if lora_path is None:
+                self._entries.clear()
+                self._total = 0
+            else:
+                self._remove(self._key(lora_path))
+
+    def __contains__(self, lora_path: str) -> bool:
+        with self._lock:
+            return self._key(lora_path) in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total
+
+
+# 全局 LoRA 权重缓存
+lora_weight_cache = LoraWeightCache()
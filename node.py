@@ -1,7 +1,5 @@
 import comfy
 import comfy.samplers
-import random
-import math
 from nodes import MAX_RESOLUTION
 
 from .easy_setting_utils import any_type
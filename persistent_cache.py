@@ -0,0 +1,218 @@
+"""
+持久化缓存 - 文件哈希和 Civitai 查询结果
+保存在 ComfyUI 用户目录下的 easy_setting_pipes/ 中，重启后仍然有效，
+批量补全任务（civitai_enrich）和信息弹窗共用这些数据
+"""
+
+import os
+import atexit
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import folder_paths
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# 用户目录下的数据子目录名
+DATA_DIR_NAME = "easy_setting_pipes"
+# Civitai 查询结果的有效期（秒），过期后重新查询
+CIVITAI_CACHE_TTL = get_env_setting("EASY_SETTING_CIVITAI_CACHE_TTL", 7 * 24 * 3600.0)
+# Civitai 上不存在的模型的有效期（秒），新上传的模型需要较快被发现
+CIVITAI_MISSING_TTL = 24 * 3600.0
+# 哈希索引两次写盘之间的最小间隔（秒），批量计算哈希时避免反复重写整个文件
+HASH_STORE_SAVE_INTERVAL = 5.0
+
+
+def get_data_dir() -> str:
+    """获取插件的数据目录（不存在时创建）"""
+    try:
+        base = folder_paths.get_user_directory()
+    except AttributeError:
+        # 旧版 ComfyUI 没有用户目录，保存在插件目录下
+        base = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+    directory = os.path.join(base, DATA_DIR_NAME)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def read_json_file(path: str) -> Optional[Any]:
+    """读取 JSON 文件，不存在或损坏时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"无法读取 {path}: {e}")
+        return None
+
+
+def write_json_file(path: str, data: Any) -> None:
+    """原子写入 JSON 文件：先写临时文件再替换，进程中断时不会留下半个文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class CivitaiCache:
+    """
+    Civitai 查询结果的磁盘缓存
+
+    每个哈希一个文件（<数据目录>/civitai/<前两位>/<sha256>.json），
+    单条写入不需要重写整个缓存。未找到的模型也会缓存（{"error": "Model not found"}），
+    但有效期较短。
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl: float = CIVITAI_CACHE_TTL,
+        missing_ttl: float = CIVITAI_MISSING_TTL
+    ) -> None:
+        self._directory = directory
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            self._directory = os.path.join(get_data_dir(), "civitai")
+        return self._directory
+
+    def _path(self, file_hash: str) -> str:
+        file_hash = file_hash.lower()
+        return os.path.join(self.directory, file_hash[:2], f"{file_hash}.json")
+
+    def get(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        获取未过期的查询结果
+
+        Returns:
+            Civitai 数据；未找到的模型返回 {"error": "Model not found"}；
+            没有缓存或已过期时返回 None
+        """
+        if not file_hash:
+            return None
+        entry = read_json_file(self._path(file_hash))
+        if not isinstance(entry, dict) or "data" not in entry:
+            return None
+        data = entry["data"]
+        ttl = self.missing_ttl if "error" in data else self.ttl
+        if ttl > 0 and time.time() - entry.get("fetched", 0) > ttl:
+            return None
+        return data
+
+    def has(self, file_hash: str) -> bool:
+        """是否有未过期的查询结果"""
+        return self.get(file_hash) is not None
+
+    def put(self, file_hash: str, data: Dict[str, Any]) -> None:
+        """保存查询结果，写入失败只记录日志"""
+        if not file_hash or not isinstance(data, dict):
+            return
+        try:
+            write_json_file(self._path(file_hash), {"fetched": time.time(), "data": data})
+        except OSError as e:
+            logger.warning(f"无法写入 Civitai 缓存: {e}")
+
+
+class HashStore:
+    """
+    文件哈希的磁盘索引
+
+    以完整路径为键，记录计算哈希时文件的 (mtime_ns, size)，
+    文件被修改后旧记录自动失效。写盘有节流，调用方可用 flush() 立即保存。
+    同时记录文件的快速哈希（已知时），移动或复制后路径变化的同一文件可以通过 find_quick 找回 SHA256。
+    """
+
+    def __init__(self, path: Optional[str] = None, save_interval: float = HASH_STORE_SAVE_INTERVAL) -> None:
+        self._path = path
+        self.save_interval = save_interval
+        # 完整路径 -> [mtime_ns, size, sha256] 或 [mtime_ns, size, sha256, 快速哈希]
+        self._entries: Optional[Dict[str, list]] = None
+        # (快速哈希, size) -> sha256
+        self._quick: Dict[Tuple[str, int], str] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        if self._path is None:
+            self._path = os.path.join(get_data_dir(), "hashes.json")
+        return self._path
+
+    def _load(self) -> Dict[str, list]:
+        # 调用方持有锁
+        if self._entries is None:
+            data = read_json_file(self.path)
+            self._entries = data if isinstance(data, dict) else {}
+            for record in self._entries.values():
+                if isinstance(record, list) and len(record) == 4:
+                    self._quick[(record[3], record[1])] = record[2]
+        return self._entries
+
+    def get(self, file_path: str, stamp: Tuple[int, int]) -> Optional[str]:
+        """获取与 stamp 匹配的哈希，文件已变化时返回 None"""
+        with self._lock:
+            record = self._load().get(file_path)
+        if record and len(record) in (3, 4) and (record[0], record[1]) == tuple(stamp):
+            return record[2]
+        return None
+
+    def find_quick(self, quick_hash: str, size: int) -> Optional[str]:
+        """按快速哈希和文件大小查找其他路径上同一文件的 SHA256"""
+        with self._lock:
+            self._load()
+            return self._quick.get((quick_hash, size))
+
+    def put(self, file_path: str, stamp: Tuple[int, int], file_hash: str, quick_hash: str = "") -> None:
+        with self._lock:
+            entries = self._load()
+            if quick_hash:
+                entries[file_path] = [stamp[0], stamp[1], file_hash, quick_hash]
+                self._quick[(quick_hash, stamp[1])] = file_hash
+            else:
+                entries[file_path] = [stamp[0], stamp[1], file_hash]
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.flush()
+
+    def discard(self, file_path: str) -> None:
+        with self._lock:
+            if self._load().pop(file_path, None) is not None:
+                self._dirty = True
+
+    def flush(self) -> None:
+        """将未保存的修改写入磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = dict(self._entries or {})
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            write_json_file(self.path, snapshot)
+        except OSError as e:
+            logger.warning(f"无法写入哈希索引: {e}")
+            with self._lock:
+                self._dirty = True
+
+
+# 全局缓存实例
+civitai_cache = CivitaiCache()
+hash_store = HashStore()
+
+# 退出前保存节流期间尚未写盘的哈希
+atexit.register(hash_store.flush)
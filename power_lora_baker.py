@@ -0,0 +1,84 @@
+"""
+Power LoRA Stack Baker - ComfyUI Custom Node
+将 LoRA 堆栈烘焙为一个合并后的 LoRA 并应用到模型
+"""
+
+from typing import Optional, List, Tuple, Any
+import logging
+
+from .power_lora_loader import PowerLoraLoader
+# lora_bake 在首次使用时才导入，不增加插件的启动耗时
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class PowerLoraStackBaker:
+    """LoRA 堆栈烘焙节点
+
+    功能：把 LoRA 堆栈中各个 LoRA 的增量按强度合并，截断到指定的秩后保存为一个 LoRA 文件，
+    再把它应用到模型和 CLIP。烘焙后 Power Lora Loader 遇到相同的堆栈会自动使用烘焙文件。
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        from .lora_bake import BAKE_RANK
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "lora_stack": ("LORA_STACK",),
+                "rank": ("INT", {"default": BAKE_RANK, "min": 1, "max": 1024, "step": 1}),
+            },
+            "optional": {
+                "clip": ("CLIP",),
+            },
+        }
+
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING")
+    RETURN_NAMES = ("model", "clip", "baked_path")
+    FUNCTION = "bake"
+    CATEGORY = "easy setting"
+
+    def bake(
+        self,
+        model: Any,
+        lora_stack: Optional[List[Tuple[str, float, float]]],
+        rank: int,
+        clip: Optional[Any] = None
+    ) -> Tuple[Any, Optional[Any], str]:
+        """烘焙 LoRA 堆栈并应用
+
+        Args:
+            model: 基础模型
+            lora_stack: LoRA 堆栈 [(lora文件名, 模型强度, CLIP强度), ...]
+            rank: 合并后的秩
+            clip: CLIP 模型（可选）
+
+        Returns:
+            (处理后的模型, 处理后的 CLIP, 烘焙文件路径)
+
+        Note:
+            - 相同的堆栈（文件内容、强度和秩都相同）只烘焙一次
+            - 堆栈中包含无法合并的 LoRA（LoHa、LoKr 等）时抛出错误
+        """
+        from .lora_bake import bake_stack, normalize_stack
+
+        items = normalize_stack(lora_stack or [], clip is not None)
+        if not items:
+            return (model, clip, "")
+
+        result = bake_stack(items, rank, has_clip=clip is not None)
+        model_lora, clip_lora = PowerLoraLoader().apply_lora_file(
+            model, clip, result["path"], 1.0, 1.0 if clip is not None else 0.0,
+            label=f"baked stack of {len(items)}"
+        )
+        return (model_lora, clip_lora, result["path"])
+
+
+NODE_CLASS_MAPPINGS = {
+    "PowerLoraStackBaker": PowerLoraStackBaker,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "PowerLoraStackBaker": "Power Lora Stack Baker",
+}
@@ -3,19 +3,24 @@ import { PowerLoraInfoDialog } from "./power_lora_info_dialog.js";
 
 let loraListCache = null;
 let loraListPromise = null;
+let loraListEtag = null;
+let loraListCheckedAt = 0;
+
+// 两次重新验证列表之间的最小间隔（毫秒）
+const LORA_LIST_REVALIDATE_INTERVAL = 5000;
 
 /**
  * 获取 LoRA 模型列表（带缓存）
  * 
  * 使用 Promise 缓存机制避免重复请求：
- * - 如果缓存存在，直接返回缓存结果
+ * - 如果缓存在重新验证间隔内，直接返回缓存结果
  * - 如果请求正在进行中，返回同一个 Promise
- * - 否则发起新的请求并缓存结果
+ * - 否则携带 ETag 向服务端重新验证，列表未变化时服务端返回 304
  * 
  * @returns {Promise<string[]>} LoRA 文件名列表
  */
 function getLoraList() {
-    if (loraListCache !== null) {
+    if (loraListCache !== null && Date.now() - loraListCheckedAt < LORA_LIST_REVALIDATE_INTERVAL) {
         return Promise.resolve(loraListCache);
     }
     if (loraListPromise !== null) {
@@ -26,24 +31,34 @@ function getLoraList() {
         return list;
     }).catch(err => {
         loraListPromise = null;
-        return [];
+        return loraListCache || [];
     });
     return loraListPromise;
 }
 
 function fetchLoraList() {
-    return fetch("/models/loras")
+    const headers = {};
+    if (loraListCache !== null && loraListEtag) {
+        headers["If-None-Match"] = loraListEtag;
+    }
+    return fetch("/api/easy_setting/loras/list?fields=name", { headers })
         .then(response => {
+            loraListCheckedAt = Date.now();
+            if (response.status === 304) return null;
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            loraListEtag = response.headers.get("ETag");
             return response.json();
         })
         .then(data => {
+            // 304 时沿用缓存
+            if (data === null) return loraListCache;
             // 确保是字符串数组
-            loraListCache = Array.isArray(data) ? data : [];
+            const items = Array.isArray(data?.items) ? data.items : [];
+            loraListCache = items.map(item => item.name).filter(name => typeof name === "string");
             return loraListCache;
         })
         .catch(error => {
-            return [];
+            return loraListCache || [];
         });
 }
 
@@ -403,6 +403,12 @@ class PowerLoraInfoDialog {
     if (info.sha256) {
       html += this.infoTableRow("Hash (SHA256)", `<code style="font-size: 11px; color: #999; word-break: break-all;">${this.escapeHtml(info.sha256)}</code>`);
     }
+    if (info.autoV2) {
+      html += this.infoTableRow("Hash (AutoV2)", `<code style="font-size: 11px; color: #999;">${this.escapeHtml(info.autoV2)}</code>`);
+    } else if (info.quickHash) {
+      // 完整哈希只在获取 Civitai 信息时计算
+      html += this.infoTableRow("快速哈希", `<code style="font-size: 11px; color: #999; word-break: break-all;">${this.escapeHtml(info.quickHash)}</code>`);
+    }
     if (info.name) {
       html += this.infoTableRow("名称", this.escapeHtml(info.name));
     }
@@ -454,12 +460,15 @@ class PowerLoraInfoDialog {
     // 显示本地训练词汇
     if (localWords.length > 0) {
       const localWordsHtml = this.getTrainedWordsMarkup(localWords, false);
-      html += this.infoTableRow("训练词汇", localWordsHtml, true);
+      // 服务端只返回计数最高的部分词汇，显示已加载数量/总数
+      const total = info.trainedWordsTotal;
+      const label = total && total > localWords.length ? `训练词汇 (${localWords.length}/${total})` : "训练词汇";
+      html += this.infoTableRow(label, localWordsHtml, true);
     }
 
     // 其他元数据
-    if (info.raw?.metadata?.ss_clip_skip) {
-      html += this.infoTableRow("Clip Skip", String(info.raw.metadata.ss_clip_skip));
+    if (info.clipSkip) {
+      html += this.infoTableRow("Clip Skip", String(info.clipSkip));
     }
 
     // 用户备注
@@ -480,7 +489,11 @@ class PowerLoraInfoDialog {
         if (img.type === 'video') {
           html += `<video src="${this.escapeHtml(img.url)}" style="width: 100%; border-radius: 4px;" autoplay loop></video>`;
         } else {
-          html += `<img src="${this.escapeHtml(img.url)}" style="width: 100%; border-radius: 4px; max-height: 150px; object-fit: cover;" />`;
+          // url 是本地缩略图代理地址，点击打开原图
+          const original = img.originalUrl || img.url;
+          html += `<a href="${this.escapeHtml(original)}" target="_blank">`;
+          html += `<img src="${this.escapeHtml(img.url)}" loading="lazy" style="width: 100%; border-radius: 4px; max-height: 150px; object-fit: cover;" />`;
+          html += `</a>`;
         }
         if (img.civitaiUrl) {
           html += `<figcaption><a href="${this.escapeHtml(img.civitaiUrl)}" target="_blank" style="color: #4a9eff; font-size: 12px;">Civitai</a></figcaption>`;
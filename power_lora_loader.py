@@ -3,18 +3,159 @@ Power LoRA Loader - ComfyUI Custom Node
 支持加载多个 LoRA 模型并分别调节强度
 """
 
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+from contextlib import contextmanager
 import logging
+import os
+import threading
 
-import folder_paths
 import comfy.utils
-import comfy.sd
 
-from .easy_setting_utils import FlexibleOptionalInputType, any_type, is_valid_lora_config
+from .easy_setting_utils import FlexibleOptionalInputType, any_type, is_valid_lora_config, get_env_setting
+from .lora_index import lora_index, IndexChange, LoraEntry, MissingLorasError
+from .lora_watcher import lora_watcher
+from .lora_metrics import timed, record_error, is_slow, format_timings, slow_loras
+# 权重缓存、key 映射、烘焙、哈希索引和旁路文件只在执行节点时用到，
+# 在函数内导入，不增加插件的启动耗时
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 加载 safetensors 时在同一次读取中计算 SHA256，信息接口之后无需再次读取文件
+HASH_ON_LOAD = get_env_setting("EASY_SETTING_HASH_ON_LOAD", True)
+# 堆栈中有找不到的 LoRA 时报错（默认只记录日志并跳过这些 LoRA）
+STRICT_LORAS = get_env_setting("EASY_SETTING_STRICT_LORAS", False)
+
+
+# 边读边哈希时每次读取的字节数
+HASH_ON_LOAD_CHUNK = 1 << 20
+
+
+def load_lora_file(lora_path: str) -> Dict[str, Any]:
+    """读取 LoRA 权重，需要时顺便计算文件的 SHA256
+    
+    对于哈希索引和旁路文件中都没有哈希的 .safetensors 文件，按块读入内存并同时更新哈希，
+    张量直接引用读入的数据，整个文件只读取一次、不额外复制。
+    哈希写入共享的哈希索引，信息接口之后无需再次读取文件。
+    其他情况（已知哈希、非 safetensors、格式无法解析或关闭了 HASH_ON_LOAD）
+    使用 comfy.utils.load_torch_file，不额外占用整个文件大小的内存。
+    
+    Args:
+        lora_path: LoRA 完整路径
+        
+    Returns:
+        LoRA 权重字典
+    """
+    if not HASH_ON_LOAD or not lora_path.lower().endswith(".safetensors"):
+        return comfy.utils.load_torch_file(lora_path, safe_load=True)
+    
+    import hashlib
+    import torch
+    from .lora_weight_cache import tensors_from_buffer
+    from .persistent_cache import hash_store
+    from .sidecars import sidecar_reader, write_sidecars
+    
+    stat = os.stat(lora_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if stat.st_size < 8 or hash_store.get(lora_path, stamp) is not None:
+        return comfy.utils.load_torch_file(lora_path, safe_load=True)
+    known_hash = sidecar_reader.read(lora_path, stamp[0], stamp[1]).get("sha256")
+    if known_hash:
+        # 其他工具已经写了哈希，记入索引后按普通方式加载
+        hash_store.put(lora_path, stamp, known_hash)
+        return comfy.utils.load_torch_file(lora_path, safe_load=True)
+    
+    # 不初始化内存，读取时直接写入
+    buffer = torch.empty(stat.st_size, dtype=torch.uint8)
+    view = memoryview(buffer.numpy())
+    hash_obj = hashlib.sha256()
+    position = 0
+    with open(lora_path, "rb") as f:
+        while position < len(view):
+            read = f.readinto(view[position:position + HASH_ON_LOAD_CHUNK])
+            if not read:
+                break
+            hash_obj.update(view[position:position + read])
+            position += read
+        complete = position == len(view) and not f.read(1)
+    view.release()
+    if not complete:
+        # 读取期间文件长度发生变化
+        return comfy.utils.load_torch_file(lora_path, safe_load=True)
+    
+    try:
+        lora = tensors_from_buffer(buffer)
+    except (ValueError, KeyError, TypeError, AttributeError, RuntimeError) as e:
+        logger.debug(f"无法直接解析 {lora_path}，改用 load_torch_file: {e}")
+        return comfy.utils.load_torch_file(lora_path, safe_load=True)
+    
+    stat = os.stat(lora_path)
+    if (stat.st_mtime_ns, stat.st_size) == stamp:
+        file_hash = hash_obj.hexdigest()
+        hash_store.put(lora_path, stamp, file_hash)
+        write_sidecars(lora_path, stamp[0], sha256=file_hash)
+    return lora
+
+
+# 规范化路径 -> [加载锁, 使用中的线程数]：节点执行和预热同时需要同一个文件时只读取一次，
+# 没有线程在加载时删除
+_loading_locks: Dict[str, List[Any]] = {}
+_loading_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _loading_lock(lora_path: str) -> Iterator[None]:
+    """同一个文件的加载互斥，加载结束后清理锁"""
+    key = os.path.normcase(os.path.abspath(lora_path))
+    with _loading_locks_guard:
+        entry = _loading_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _loading_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _loading_locks[key]
+
+
+def load_lora_weights(lora_path: str, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """从共享的权重缓存获取 LoRA 权重，没有缓存时加载并放入缓存
+    
+    同一个文件正在被其他线程加载时等待其完成，不重复读取。
+    
+    Args:
+        lora_path: LoRA 完整路径
+        timings: 可选，加载耗时会累加到 timings["load_torch_file"]
+        
+    Returns:
+        LoRA 权重字典（缓存中的对象，调用方不应修改）
+    """
+    from .lora_weight_cache import lora_weight_cache
+    from .shared_weight_cache import shared_weight_cache
+    
+    stat = os.stat(lora_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    lora = lora_weight_cache.get(lora_path, stamp)
+    if lora is not None:
+        return lora
+    
+    with _loading_lock(lora_path):
+        # 等待期间可能已由其他线程加载完成
+        lora = lora_weight_cache.peek(lora_path, stamp)
+        if lora is not None:
+            return lora
+        with timed("load_torch_file", timings):
+            if shared_weight_cache.enabled:
+                # 同一台机器上的其他进程可能已经解析过这个文件
+                lora = shared_weight_cache.get_or_load(
+                    lora_path, stamp, load_lora_file, lora_weight_cache.precision
+                )
+            else:
+                lora = load_lora_file(lora_path)
+            return lora_weight_cache.put(lora_path, stamp, lora)
+
 
 class PowerLoraLoader:
     """强大的 LoRA 加载器节点
@@ -22,9 +163,15 @@ class PowerLoraLoader:
     功能：支持动态加载多个 LoRA 模型，每个模型可独立控制强度
     """
     
-    def __init__(self) -> None:
-        """初始化 LoRA 加载器，缓存已加载的 LoRA"""
-        self.loaded_lora: Optional[Tuple[str, Any]] = None
+    @staticmethod
+    def invalidate_cache(lora_path: Optional[str] = None) -> None:
+        """清除指定文件（或全部）的 LoRA 权重缓存
+        
+        Args:
+            lora_path: LoRA 完整路径，为 None 时清除全部缓存
+        """
+        from .lora_weight_cache import lora_weight_cache
+        lora_weight_cache.invalidate(lora_path)
     
     @classmethod
     def INPUT_TYPES(cls):
@@ -52,14 +199,15 @@ class PowerLoraLoader:
         clip: Optional[Any],
         lora_name: str,
         strength_model: float,
-        strength_clip: float
+        strength_clip: float,
+        entry: Optional[LoraEntry] = None
     ) -> Tuple[Any, Optional[Any]]:
         """加载单个 LoRA 模型
         
         核心功能：
         - 加载 LoRA 文件并应用到基础模型和 CLIP
         - 支持强度控制（可分别设置模型和 CLIP 强度）
-        - 实现文件缓存避免重复加载
+        - 使用共享的权重缓存避免重复加载
         - 错误处理确保节点稳定性
         
         Args:
@@ -68,13 +216,14 @@ class PowerLoraLoader:
             lora_name: LoRA 文件名
             strength_model: 模型强度系数（-10.0 到 10.0）
             strength_clip: CLIP 强度系数（-10.0 到 10.0）
+            entry: 已经解析好的索引条目（可选，load_loras 在预检查中一次解析整个堆栈）
             
         Returns:
             (处理后的模型, 处理后的 CLIP)
             
         Note:
             - 强度为 0 时跳过加载以提升性能
-            - 使用缓存机制避免重复加载相同文件
+            - 使用共享的权重缓存避免重复加载相同文件
             - 错误时返回原模型确保工作流继续运行
         """
         # 如果强度都为 0，直接返回原模型（性能优化）
@@ -85,31 +234,18 @@ class PowerLoraLoader:
         if not lora_name or lora_name == "None":
             return model, clip
         
+        # 分阶段耗时，用于慢加载警告
+        timings: Dict[str, float] = {}
         try:
-            # 获取 LoRA 完整路径
-            lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
-            
-            # 检查缓存，避免重复加载同一个 LoRA
-            lora = None
-            if self.loaded_lora is not None:
-                cached_path, cached_lora = self.loaded_lora
-                if cached_path == lora_path:
-                    lora = cached_lora
-                else:
-                    self.loaded_lora = None
-            
-            # 如果缓存中没有，则加载 LoRA 文件
-            if lora is None:
-                lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
-                self.loaded_lora = (lora_path, lora)
-            
-            # 应用 LoRA 到模型和 CLIP
-            model_lora, clip_lora = comfy.sd.load_lora_for_models(
-                model, clip, lora, strength_model, strength_clip
+            # 获取 LoRA 完整路径（优先使用目录索引，不逐个根目录查找）
+            if entry is None:
+                with timed("resolve", timings):
+                    entry = lora_index.resolve(lora_name, refresh=not lora_watcher.running)
+                if entry is None:
+                    raise FileNotFoundError(lora_name)
+            return self.apply_lora_file(
+                model, clip, entry.path, strength_model, strength_clip, label=lora_name, timings=timings
             )
-            
-            return model_lora, clip_lora
-            
         except FileNotFoundError:
             logger.error(f"LoRA 文件未找到: {lora_name}")
             return model, clip
@@ -117,6 +253,46 @@ class PowerLoraLoader:
             logger.error(f"加载 LoRA 时发生错误 ({lora_name}): {e}", exc_info=True)
             return model, clip
 
+    def apply_lora_file(
+        self,
+        model: Any,
+        clip: Optional[Any],
+        lora_path: str,
+        strength_model: float,
+        strength_clip: float,
+        label: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[Any, Optional[Any]]:
+        """按完整路径加载 LoRA 并应用到模型和 CLIP（错误会抛出）
+        
+        Args:
+            lora_path: LoRA 完整路径
+            label: 慢加载警告中显示的名称，默认为文件名
+            timings: 已经记录的阶段耗时，用于慢加载警告
+            
+        Returns:
+            (处理后的模型, 处理后的 CLIP)
+        """
+        if timings is None:
+            timings = {}
+        
+        from .lora_keymap import load_lora_for_models
+        
+        # 从共享缓存获取权重，避免重复加载同一个 LoRA
+        lora = load_lora_weights(lora_path, timings)
+        
+        # 应用 LoRA 到模型和 CLIP
+        with timed("load_lora_for_models", timings):
+            model_lora, clip_lora = load_lora_for_models(
+                model, clip, lora, strength_model, strength_clip
+            )
+        
+        if is_slow(timings):
+            slow_loras.inc()
+            logger.warning(f"LoRA 加载较慢 ({label or os.path.basename(lora_path)}): {format_timings(timings)}")
+        
+        return model_lora, clip_lora
+
     def load_loras(
         self,
         model: Optional[Any] = None,
@@ -137,10 +313,11 @@ class PowerLoraLoader:
         if model is None:
             return (None, clip)
         
-        current_model = model
-        current_clip = clip
+        # 首次执行时启动文件监听，LoRA 文件变化后自动失效缓存
+        lora_watcher.ensure_started()
         
-        # 遍历所有传入的参数，查找 LoRA 配置
+        # 遍历所有传入的参数，收集启用的 LoRA
+        items: List[Tuple[str, float, float]] = []
         for key, value in kwargs.items():
             # 检查是否是有效的 LoRA 配置
             if not is_valid_lora_config(key, value):
@@ -163,15 +340,62 @@ class PowerLoraLoader:
             if strength_model == 0 and strength_clip == 0:
                 continue
             
-            # 获取 LoRA 名称并加载
             lora_name = value.get('lora')
             if lora_name and lora_name != "None":
-                current_model, current_clip = self.load_lora(
-                    current_model, current_clip, lora_name,
-                    strength_model, strength_clip
+                items.append((lora_name, strength_model, strength_clip))
+        
+        # 相同的堆栈烘焙过时，只需应用一个合并后的 LoRA
+        baked_path = self._find_baked_stack(items, clip is not None)
+        if baked_path is not None:
+            try:
+                return self.apply_lora_file(
+                    model, clip, baked_path, 1.0, 1.0 if clip is not None else 0.0,
+                    label=f"baked stack of {len(items)}"
                 )
+            except Exception as e:
+                logger.error(f"应用烘焙堆栈失败，逐个加载 LoRA: {e}", exc_info=True)
+        
+        # 一次检查整个堆栈，找不到的文件一起报告
+        entries, missing = lora_index.resolve_many(
+            [lora_name for lora_name, _, _ in items], refresh=not lora_watcher.running
+        )
+        if missing:
+            if STRICT_LORAS:
+                raise MissingLorasError(missing)
+            logger.error(f"以下 LoRA 文件未找到，已跳过: {', '.join(missing)}")
+        
+        current_model = model
+        current_clip = clip
+        for lora_name, strength_model, strength_clip in items:
+            if lora_name not in entries:
+                continue
+            current_model, current_clip = self.load_lora(
+                current_model, current_clip, lora_name,
+                strength_model, strength_clip, entry=entries[lora_name]
+            )
         
         return (current_model, current_clip)
+    
+    @staticmethod
+    def _find_baked_stack(items: List[Tuple[str, float, float]], has_clip: bool) -> Optional[str]:
+        """查找堆栈的烘焙文件，出错时返回 None"""
+        try:
+            from .lora_bake import find_baked_stack, normalize_stack
+            return find_baked_stack(normalize_stack(items, has_clip))
+        except Exception as e:
+            record_error("baked_stack")
+            logger.debug(f"查找烘焙堆栈失败: {e}")
+            return None
+
+
+def _invalidate_changed_loras(changes: List[IndexChange]) -> None:
+    """LoRA 文件被修改或删除时清除加载器缓存"""
+    for change in changes:
+        if change.kind != "add":
+            PowerLoraLoader.invalidate_cache(change.entry.path)
+
+
+lora_index.add_listener(_invalidate_changed_loras)
 
 
 NODE_CLASS_MAPPINGS = {
@@ -0,0 +1,289 @@
+"""
+跨进程共享的 LoRA 权重缓存
+同一台机器上运行多个 ComfyUI 进程时，每个进程各自保存一份常用 LoRA 的权重。
+设置 EASY_SETTING_SHARED_CACHE_DIR（建议使用 /dev/shm 下的目录）后，
+每个 LoRA 只由第一个需要它的进程解析一次，写成共享目录中的 safetensors 段文件，
+其他进程直接映射同一个文件，所有进程共用同一份物理内存。
+
+- 段文件以 (路径, mtime_ns, size, 缓存精度) 的哈希命名，源文件变化后自然失效
+- 映射使用写时复制（MAP_PRIVATE），进程内对张量的修改不会写回共享内存
+- 引用计数由 flock 完成：使用段文件的进程持有共享锁，进程退出（包括崩溃）时内核自动释放；
+  淘汰时只删除能取得排他锁、即没有进程在使用的段文件
+- 同一个段文件的创建通过分片锁串行化，并发请求只解析一次
+
+需要 fcntl（Linux / macOS）和 torch，不满足时自动关闭。
+"""
+
+import os
+import hashlib
+import json
+import logging
+import mmap
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 flock，不支持共享缓存
+    fcntl = None
+
+from .easy_setting_utils import get_env_setting
+from .lora_metrics import record_cache, record_error, timed
+from .lora_weight_cache import (
+    SAFETENSORS_DTYPES, SharedStateDict, downcast_state_dict, state_dict_nbytes, tensors_from_buffer
+)
+
+logger = logging.getLogger(__name__)
+
+# 共享目录，为空时关闭共享缓存
+SHARED_CACHE_DIR = get_env_setting("EASY_SETTING_SHARED_CACHE_DIR", "")
+# 共享目录中段文件的总大小上限（MB）
+SHARED_CACHE_MB = get_env_setting("EASY_SETTING_SHARED_CACHE_MB", 2048)
+# 创建段文件时使用的分片锁数量
+SHARED_CACHE_LOCK_STRIPES = 64
+
+SEGMENT_SUFFIX = ".safetensors"
+
+
+class _SegmentMap(mmap.mmap):
+    """可以弱引用的 mmap，用于在映射释放时关闭段文件"""
+
+
+def write_segment(path: str, lora: Dict[str, Any]) -> None:
+    """
+    将张量写成 safetensors 文件（原子写入）
+
+    张量按元素大小从大到小排列，每个张量的偏移都与其元素大小对齐，
+    映射后可以直接创建视图。
+    """
+    import torch
+
+    names = {getattr(torch, name): code for code, name in SAFETENSORS_DTYPES.items() if hasattr(torch, name)}
+    tensors = sorted(
+        ((key, value.detach().cpu().contiguous()) for key, value in lora.items()),
+        key=lambda item: -item[1].element_size()
+    )
+    header: Dict[str, Any] = {}
+    offset = 0
+    for key, tensor in tensors:
+        nbytes = tensor.element_size() * tensor.numel()
+        header[key] = {"dtype": names[tensor.dtype], "shape": list(tensor.shape), "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # 头部按 8 字节对齐
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(len(header_bytes).to_bytes(8, "little"))
+            f.write(header_bytes)
+            for _, tensor in tensors:
+                if tensor.numel():
+                    f.write(memoryview(tensor.reshape(-1).view(torch.uint8).numpy()))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class SharedWeightCache:
+    """
+    共享目录中的 LoRA 段文件
+
+    Args:
+        directory: 共享目录，为空时关闭
+        max_bytes: 段文件总大小上限，超过时淘汰最久未使用且没有进程在使用的段文件
+    """
+
+    def __init__(self, directory: str = SHARED_CACHE_DIR, max_bytes: int = SHARED_CACHE_MB << 20) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._available: Optional[bool] = None
+
+    @property
+    def enabled(self) -> bool:
+        """是否可用（已配置目录，并且有 fcntl 和 torch）"""
+        if self._available is None:
+            available = bool(self.directory) and fcntl is not None
+            if available:
+                try:
+                    import torch  # noqa: F401
+                    os.makedirs(os.path.join(self.directory, "locks"), mode=0o700, exist_ok=True)
+                except (ImportError, OSError) as e:
+                    logger.warning(f"共享 LoRA 缓存不可用: {e}")
+                    available = False
+            self._available = available
+        return self._available
+
+    def segment_path(self, lora_path: str, stamp: Tuple[int, int], precision: Optional[Any] = None) -> str:
+        source = os.path.normcase(os.path.abspath(lora_path))
+        key = hashlib.sha256(f"{source}:{stamp[0]}:{stamp[1]}:{precision}".encode("utf-8")).hexdigest()[:40]
+        return os.path.join(self.directory, key + SEGMENT_SUFFIX)
+
+    @contextmanager
+    def _stripe_lock(self, segment: str) -> Iterator[None]:
+        """同一个段文件的创建互斥（跨进程）"""
+        stripe = int(hashlib.sha1(os.path.basename(segment).encode("utf-8")).hexdigest(), 16) % SHARED_CACHE_LOCK_STRIPES
+        fd = os.open(os.path.join(self.directory, "locks", f"{stripe:02d}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def attach(self, segment: str) -> Optional[SharedStateDict]:
+        """
+        映射一个段文件
+
+        Returns:
+            权重字典（张量直接引用共享内存），段文件不存在或已被淘汰时返回 None
+        """
+        import torch
+
+        try:
+            fd = os.open(segment, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            # 共享锁即引用：持有期间不会被其他进程淘汰
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            stat = os.fstat(fd)
+            if stat.st_nlink == 0 or stat.st_size < 8:
+                # 打开后、加锁前被淘汰
+                os.close(fd)
+                return None
+            # 不能显式关闭映射：张量只保留对 mmap 对象的引用，映射随最后一个张量释放
+            mapped = _SegmentMap(fd, 0, access=mmap.ACCESS_COPY)
+            buffer = torch.frombuffer(mapped, dtype=torch.uint8)
+            lora = SharedStateDict(tensors_from_buffer(buffer))
+        except BaseException:
+            os.close(fd)
+            raise
+        # 共享锁与映射同生命周期：只要还有张量（即使已被复制到其他字典）引用映射，段文件就不会被淘汰
+        weakref.finalize(mapped, os.close, fd)
+        try:
+            # 修改时间用作最近使用时间
+            os.utime(segment)
+        except OSError:
+            pass
+        return lora
+
+    def get_or_load(
+        self,
+        lora_path: str,
+        stamp: Tuple[int, int],
+        load: Callable[[str], Dict[str, Any]],
+        precision: Optional[Any] = None
+    ) -> Dict[str, Any]:
+        """
+        从共享目录获取 LoRA 权重，没有时调用 load 解析并写入共享目录
+
+        Args:
+            lora_path: LoRA 完整路径
+            stamp: 文件的 (mtime_ns, size)
+            load: 解析 LoRA 文件的函数
+            precision: 写入前转换的精度（与本地权重缓存一致）
+
+        Returns:
+            LoRA 权重（映射段文件时为 SharedStateDict，已是 precision 精度）；
+            共享缓存不可用或写入失败时返回 load 的结果
+        """
+        if not self.enabled:
+            loaded = load(lora_path)
+            return downcast_state_dict(loaded, precision) if precision is not None else loaded
+
+        segment = self.segment_path(lora_path, stamp, precision)
+        lora = self._try_attach(segment)
+        record_cache("shared_weights", lora is not None)
+        if lora is not None:
+            return lora
+
+        with self._stripe_lock(segment):
+            # 等待锁期间可能已被其他进程创建
+            lora = self._try_attach(segment)
+            if lora is not None:
+                return lora
+            loaded = load(lora_path)
+            if precision is not None:
+                loaded = downcast_state_dict(loaded, precision)
+            if state_dict_nbytes(loaded) > self.max_bytes:
+                return loaded
+            try:
+                with timed("shared_cache_write"):
+                    write_segment(segment, loaded)
+            except (OSError, AttributeError, KeyError, TypeError, RuntimeError) as e:
+                # 共享目录空间不足或包含无法写出的对象（timed 已计入 phase_errors）
+                logger.debug(f"无法写入共享 LoRA 缓存 {segment}: {e}")
+                return loaded
+            lora = self._try_attach(segment)
+
+        self.evict(keep=segment)
+        return lora if lora is not None else loaded
+
+    def _try_attach(self, segment: str) -> Optional[SharedStateDict]:
+        try:
+            return self.attach(segment)
+        except (OSError, ValueError, KeyError, RuntimeError) as e:
+            logger.debug(f"无法映射共享 LoRA 缓存 {segment}: {e}")
+            record_error("shared_cache_attach")
+            return None
+
+    def segments(self) -> Dict[str, Tuple[float, int]]:
+        """共享目录中的段文件：路径 -> (最近使用时间, 字节数)"""
+        result = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(SEGMENT_SUFFIX) and entry.is_file():
+                        stat = entry.stat()
+                        result[entry.path] = (stat.st_mtime, stat.st_size)
+        except OSError:
+            pass
+        return result
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        总大小超过上限时，从最久未使用的段文件开始删除，跳过正在被使用的
+
+        Returns:
+            删除的段文件数
+        """
+        segments = self.segments()
+        total = sum(size for _, size in segments.values())
+        removed = 0
+        for segment, (_, size) in sorted(segments.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if segment == keep:
+                continue
+            try:
+                fd = os.open(segment, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # 有进程正在使用
+                os.close(fd)
+                continue
+            try:
+                os.unlink(segment)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+        return removed
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self.segments().values())
+
+
+# 全局共享权重缓存
+shared_weight_cache = SharedWeightCache()
@@ -0,0 +1,231 @@
+"""
+Lora 旁路文件（sidecar）读写
+其他工具常在模型旁边保存哈希和 Civitai 信息，读取它们可以跳过哈希计算和联网查询：
+
+- <名称>.sha256                   文件哈希（A1111 / 各类下载器）
+- <名称>.civitai.info             Civitai 模型版本数据（Civitai Helper）
+- <名称>.json                     A1111 的用户元数据（备注等，部分工具也会写入 sha256）
+- <文件名>.rgthree-info.json      rgthree-comfy 的 Lora 信息
+
+只使用修改时间不早于模型文件的旁路文件。
+设置 EASY_SETTING_WRITE_SIDECARS=true 后，本插件计算的哈希和查询到的 Civitai 数据
+也会写成 .sha256 / .civitai.info，供其他工具和其他机器复用。
+"""
+
+import os
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .easy_setting_utils import get_env_setting, get_dict_value
+
+logger = logging.getLogger(__name__)
+
+# 是否把计算结果写回旁路文件
+SIDECAR_WRITE = get_env_setting("EASY_SETTING_WRITE_SIDECARS", False)
+# 超过该大小（字节）的旁路文件不解析
+SIDECAR_MAX_BYTES = 8 << 20
+
+_SHA256_PATTERN = re.compile(r"\b([0-9a-fA-F]{64})\b")
+
+
+def sidecar_paths(model_path: str) -> Dict[str, str]:
+    """模型文件对应的各类旁路文件路径"""
+    stem = os.path.splitext(model_path)[0]
+    return {
+        "sha256": stem + ".sha256",
+        "civitai": stem + ".civitai.info",
+        "json": stem + ".json",
+        "rgthree": model_path + ".rgthree-info.json",
+    }
+
+
+def _valid_hash(value: Any) -> Optional[str]:
+    if isinstance(value, str) and _SHA256_PATTERN.fullmatch(value.strip()):
+        return value.strip().lower()
+    return None
+
+
+def _size_matches(file_info: Dict[str, Any], size: Optional[int]) -> bool:
+    """Civitai 记录的 sizeKB 与文件大小是否一致（允许 1 KB 的舍入误差）"""
+    try:
+        return size is not None and abs(float(file_info["sizeKB"]) * 1024 - size) < 1024
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _civitai_file_hash(civitai_data: Dict[str, Any], file_name: str, size: Optional[int]) -> Optional[str]:
+    """
+    从 Civitai 数据中取出这个模型文件的 SHA256
+
+    同一个模型版本常有多个文件（完整 / 剪枝、fp16 / fp32），只接受同名的文件，
+    或大小一致且只有一个候选哈希的文件；否则返回 None，由调用方计算真实的哈希。
+    """
+    files = [f for f in civitai_data.get("files") or [] if isinstance(f, dict)]
+    for file_info in files:
+        if file_info.get("name") == file_name:
+            file_hash = _valid_hash(get_dict_value(file_info, "hashes.SHA256"))
+            if file_hash:
+                return file_hash
+    hashes = {
+        _valid_hash(get_dict_value(file_info, "hashes.SHA256"))
+        for file_info in files if _size_matches(file_info, size)
+    }
+    hashes.discard(None)
+    return hashes.pop() if len(hashes) == 1 else None
+
+
+class SidecarReader:
+    """
+    读取并合并模型的旁路文件
+
+    解析结果按旁路文件的 (mtime_ns, size) 缓存，未变化的文件只需 stat。
+    """
+
+    def __init__(self) -> None:
+        # 旁路文件路径 -> ((mtime_ns, size), 解析结果)
+        self._parsed: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path: str, model_mtime_ns: int, kind: str) -> Any:
+        """读取单个旁路文件，不存在、过期或无法解析时返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_mtime_ns < model_mtime_ns or st.st_size > SIDECAR_MAX_BYTES:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._parsed.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if kind == "sha256":
+                    match = _SHA256_PATTERN.search(f.read(4096))
+                    value = match.group(1).lower() if match else None
+                else:
+                    value = json.load(f)
+                    if not isinstance(value, dict):
+                        value = None
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            logger.debug(f"无法解析旁路文件 {path}: {e}")
+            value = None
+
+        with self._lock:
+            self._parsed[path] = (stamp, value)
+        return value
+
+    def read(self, model_path: str, model_mtime_ns: int, model_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        读取模型的全部旁路文件
+
+        Args:
+            model_path: 模型文件完整路径
+            model_mtime_ns: 模型文件的修改时间，早于它的旁路文件会被忽略
+            model_size: 模型文件大小，用于在 Civitai 数据中匹配文件（未知时需要时再 stat）
+
+        Returns:
+            {"sha256": 哈希, "civitai": Civitai 数据, "userNote": 备注}，只包含找到的字段
+        """
+        paths = sidecar_paths(model_path)
+        file_name = os.path.basename(model_path)
+        result: Dict[str, Any] = {}
+
+        civitai_info = self._load(paths["civitai"], model_mtime_ns, "civitai")
+        if civitai_info and "error" not in civitai_info:
+            result["civitai"] = civitai_info
+
+        rgthree = self._load(paths["rgthree"], model_mtime_ns, "rgthree")
+        if rgthree:
+            rgthree_civitai = get_dict_value(rgthree, "raw.civitai")
+            if isinstance(rgthree_civitai, dict) and "error" not in rgthree_civitai:
+                result.setdefault("civitai", rgthree_civitai)
+            if rgthree.get("userNote"):
+                result["userNote"] = rgthree["userNote"]
+
+        user_json = self._load(paths["json"], model_mtime_ns, "json")
+        if user_json:
+            if isinstance(user_json.get("civitai"), dict):
+                result.setdefault("civitai", user_json["civitai"])
+            if user_json.get("notes"):
+                result.setdefault("userNote", user_json["notes"])
+
+        if result.get("civitai") and model_size is None:
+            try:
+                model_size = os.path.getsize(model_path)
+            except OSError:
+                pass
+
+        # 哈希优先级：.sha256 > Civitai 数据中的文件哈希 > rgthree > .json
+        file_hash = (
+            self._load(paths["sha256"], model_mtime_ns, "sha256")
+            or (result.get("civitai") and _civitai_file_hash(result["civitai"], file_name, model_size))
+            or _valid_hash((rgthree or {}).get("sha256"))
+            or _valid_hash((user_json or {}).get("sha256"))
+        )
+        if file_hash:
+            result["sha256"] = file_hash
+        return result
+
+    def invalidate(self, model_path: Optional[str] = None) -> None:
+        """清除指定模型（或全部）的解析缓存"""
+        with self._lock:
+            if model_path is None:
+                self._parsed.clear()
+            else:
+                for path in sidecar_paths(model_path).values():
+                    self._parsed.pop(path, None)
+
+
+def _write_text(path: str, text: str) -> bool:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        # 只读的模型目录很常见，只记录调试日志
+        logger.debug(f"无法写入旁路文件 {path}: {e}")
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+
+def _is_fresh(path: str, model_mtime_ns: int) -> bool:
+    try:
+        return os.stat(path).st_mtime_ns >= model_mtime_ns
+    except OSError:
+        return False
+
+
+def write_sidecars(
+    model_path: str,
+    model_mtime_ns: int,
+    sha256: Optional[str] = None,
+    civitai: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    将哈希和 Civitai 数据写成旁路文件（需要开启 SIDECAR_WRITE）
+
+    已存在且未过期的旁路文件不会被覆盖，避免改写其他工具的数据。
+    """
+    if not SIDECAR_WRITE:
+        return
+    paths = sidecar_paths(model_path)
+    if sha256 and not _is_fresh(paths["sha256"], model_mtime_ns):
+        _write_text(paths["sha256"], sha256.lower() + "\n")
+    if civitai and "error" not in civitai and not _is_fresh(paths["civitai"], model_mtime_ns):
+        _write_text(paths["civitai"], json.dumps(civitai, ensure_ascii=False, indent=4))
+
+
+# 全局旁路文件读取器
+sidecar_reader = SidecarReader()
@@ -0,0 +1,115 @@
+"""
+测试公共夹具
+
+导入本文件时安装 benchmarks.comfy_stubs 中的 ComfyUI 替身，并以包的形式导入插件，
+所有测试共用同一次导入；每个测试使用独立的 loras 目录。
+
+仓库根目录本身是一个包，pytest 在运行测试前会导入它的 __init__.py，
+因此替身必须在收集阶段之前安装，并把已导入的插件注册为根目录对应的模块名。
+"""
+
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import comfy_stubs  # noqa: E402
+from benchmarks.fake_civitai import FakeCivitaiServer  # noqa: E402
+
+WORKDIR = tempfile.mkdtemp(prefix="easy_setting_tests_")
+# 不启动后台监听线程
+os.environ["EASY_SETTING_WATCH_MODE"] = "off"
+comfy_stubs.install_stubs([os.path.join(WORKDIR, "loras")], os.path.join(WORKDIR, "user"))
+PACKAGE = comfy_stubs.load_package()
+sys.modules.setdefault(os.path.basename(REPO_ROOT), PACKAGE)
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def plugin() -> Any:
+    """已导入的插件包"""
+    return PACKAGE
+
+
+def import_submodule(name: str) -> Any:
+    """导入插件子模块，依赖缺失时跳过测试"""
+    module = comfy_stubs.import_submodule(name)
+    if module is None:
+        pytest.skip(f"cannot import {name}")
+    return module
+
+
+@pytest.fixture
+def submodule(plugin: Any) -> Callable[[str], Any]:
+    """按名称导入插件子模块：submodule("lora_bake")"""
+    return import_submodule
+
+
+@pytest.fixture
+def lora_api(plugin: Any) -> Any:
+    return import_submodule("lora_api")
+
+
+@pytest.fixture
+def loader(plugin: Any) -> Any:
+    return import_submodule("power_lora_loader")
+
+
+@pytest.fixture
+def lora_root(plugin: Any, tmp_path: Any) -> str:
+    """本测试独立的 loras 目录（已写入 folder_paths，并刷新目录索引）"""
+    import folder_paths
+
+    root = tmp_path / "loras"
+    root.mkdir()
+    extensions = folder_paths.folder_names_and_paths["loras"][1]
+    original = folder_paths.folder_names_and_paths["loras"]
+    folder_paths.folder_names_and_paths["loras"] = ([str(root)], extensions)
+    import_submodule("lora_index").lora_index.refresh(force=True)
+    yield str(root)
+    folder_paths.folder_names_and_paths["loras"] = original
+
+
+@pytest.fixture
+def civitai(lora_api: Any, tmp_path: Any) -> FakeCivitaiServer:
+    """本地 Civitai 替身，全局客户端和 Civitai 缓存在测试期间指向它"""
+    pytest.importorskip("requests")
+    store = import_submodule("persistent_cache")
+    client = lora_api.civitai_client
+    original = (client.base_url, lora_api.civitai_cache)
+    with FakeCivitaiServer(delay=0.05) as server:
+        client.base_url = server.base_url
+        lora_api.civitai_cache = store.CivitaiCache(str(tmp_path / "civitai"))
+        lora_api.info_etag_cache.invalidate()
+        yield server
+    client.base_url, lora_api.civitai_cache = original
+
+
+@pytest.fixture
+def with_client(lora_api: Any) -> Callable[[Callable[[Any], Awaitable[Any]]], Any]:
+    """
+    在挂载了插件全部路由的 aiohttp 测试服务器上运行一个场景
+
+    用法：with_client(scenario)，scenario 是接收 TestClient 的协程函数，返回其结果。
+    """
+    pytest.importorskip("aiohttp.test_utils")
+
+    def run(scenario: Callable[[Any], Awaitable[Any]]) -> Any:
+        async def main() -> Any:
+            async with comfy_stubs.app_client() as client:
+                return await scenario(client)
+
+        return asyncio.run(main())
+
+    return run
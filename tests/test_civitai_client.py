@@ -0,0 +1,75 @@
+"""Civitai 客户端"""
+
+import asyncio
+import time
+from typing import Any
+
+import pytest
+
+from benchmarks.fake_civitai import FakeCivitaiServer
+
+# 客户端的请求都通过 requests 发出
+pytest.importorskip("requests")
+
+FILE_HASH = "ab" * 32
+
+
+def test_session_reuses_one_connection(submodule: Any) -> None:
+    client_module = submodule("civitai_client")
+    with FakeCivitaiServer() as civitai:
+        client = client_module.CivitaiClient(base_url=civitai.base_url)
+        try:
+            for _ in range(10):
+                assert client.get_model_version_by_hash(FILE_HASH)["files"]
+        finally:
+            client.close()
+        assert civitai.request_count == 10
+        assert civitai.connection_count == 1
+
+
+def test_breaker_fails_fast_and_recovers(submodule: Any) -> None:
+    client_module = submodule("civitai_client")
+    threshold = 3
+    with FakeCivitaiServer(failure_rate=1.0) as civitai:
+        client = client_module.CivitaiClient(base_url=civitai.base_url, failure_threshold=threshold, cooldown=60.0)
+        for _ in range(threshold):
+            assert client.get_model_version_by_hash(FILE_HASH) is None
+        assert client.state == "open"
+
+        with pytest.raises(client_module.CivitaiUnavailable) as excinfo:
+            client.get_model_version_by_hash(FILE_HASH)
+        assert 0 < excinfo.value.retry_after <= 60.0
+        # 熔断期间不再发出请求
+        assert civitai.request_count == threshold
+
+        # 冷却结束后放行一个探测请求，成功则恢复
+        client.cooldown = 0.05
+        civitai.failure_rate = 0.0
+        time.sleep(0.1)
+        assert client.state == "half_open"
+        assert client.get_model_version_by_hash(FILE_HASH)["files"]
+        assert client.state == "closed"
+        client.close()
+
+
+def test_not_found_does_not_trip_breaker(submodule: Any) -> None:
+    client_module = submodule("civitai_client")
+    with FakeCivitaiServer(known_hashes=[]) as civitai:
+        client = client_module.CivitaiClient(base_url=civitai.base_url, failure_threshold=1)
+        for _ in range(3):
+            assert client.get_model_version_by_hash(FILE_HASH) == {"error": "Model not found"}
+        assert client.state == "closed"
+        client.close()
+
+
+def test_request_refuses_event_loop(submodule: Any) -> None:
+    client_module = submodule("civitai_client")
+    client = client_module.CivitaiClient(base_url="http://127.0.0.1:9")
+
+    async def call() -> Any:
+        return client.request("GET", "/")
+
+    # 阻塞请求不能在事件循环线程中发出
+    with pytest.raises(RuntimeError):
+        asyncio.run(call())
+    assert client.state == "closed"
@@ -0,0 +1,85 @@
+"""Civitai 批量补全"""
+
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from benchmarks.fake_civitai import FakeCivitaiServer
+from benchmarks.fixtures import make_lora_library
+
+COUNT = 40
+
+
+@pytest.fixture
+def hashes(lora_api: Any, lora_root: str) -> List[str]:
+    make_lora_library(lora_root, COUNT)
+    lora_api.lora_index.refresh(force=True)
+    # 预先计算哈希，补全任务只使用已知哈希
+    return [
+        lora_api.get_cached_file_hash(entry.path, (entry.mtime_ns, entry.size))
+        for entry in lora_api.lora_index.entries()
+    ]
+
+
+@pytest.fixture
+def make_enricher(submodule: Any, tmp_path: Any, monkeypatch: Any) -> Callable[..., Any]:
+    enrich = submodule("civitai_enrich")
+    store = submodule("persistent_cache")
+    # 让退避保持短暂
+    monkeypatch.setattr(enrich, "ENRICH_BACKOFF_BASE", 0.01)
+
+    def make(name: str, civitai: FakeCivitaiServer, **kwargs: Any) -> Any:
+        directory = os.path.join(tmp_path, "enrich", name)
+        return enrich.CivitaiEnricher(
+            cache=store.CivitaiCache(os.path.join(directory, "civitai")),
+            client=enrich.CivitaiClient(base_url=civitai.base_url, cooldown=0.05),
+            state_path=os.path.join(directory, "state.json"),
+            **kwargs
+        )
+
+    return make
+
+
+def _run(enricher: Any) -> Dict[str, Any]:
+    enricher.start()
+    assert enricher.wait(60)
+    return enricher.progress()
+
+
+def test_bulk_lookup_retries_failures(hashes: List[str], make_enricher: Any) -> None:
+    known = hashes[::2]
+    with FakeCivitaiServer(failure_rate=0.2, known_hashes=known, seed=1) as civitai:
+        progress = _run(make_enricher("cold", civitai, rate=0, concurrency=4, batch_size=10))
+    assert progress["status"] == "completed"
+    assert progress["found"] == len(set(known))
+    assert progress["missing"] == COUNT - len(set(known))
+    assert progress["retries"] > 0
+
+
+def test_cancelled_job_resumes_from_state_file(hashes: List[str], make_enricher: Any) -> None:
+    with FakeCivitaiServer(delay=0.01, known_hashes=hashes[::2]) as civitai:
+        enricher = make_enricher("resume", civitai, rate=10, concurrency=1, batch_size=5)
+        enricher.start()
+        time.sleep(0.3)
+        enricher.cancel()
+        enricher.wait(30)
+        first = enricher.progress()
+        # 新实例模拟进程重启
+        progress = _run(make_enricher("resume", civitai, rate=0, concurrency=2, batch_size=5))
+    assert first["status"] == "cancelled" and 0 < first["done"] < COUNT
+    assert progress["status"] == "completed"
+    assert progress["done"] == COUNT
+
+
+def test_request_rate_is_limited(submodule: Any, hashes: List[str], make_enricher: Any) -> None:
+    enrich = submodule("civitai_enrich")
+    rate = 20.0
+    with FakeCivitaiServer(known_hashes=hashes) as civitai:
+        start = time.perf_counter()
+        progress = _run(make_enricher("rate", civitai, rate=rate, concurrency=4, batch_size=2))
+        elapsed = time.perf_counter() - start
+    assert progress["requests"] == COUNT // 2
+    # 允许令牌桶的初始突发
+    assert (progress["requests"] - enrich.ENRICH_BURST) / elapsed <= rate * 1.1
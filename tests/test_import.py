@@ -0,0 +1,37 @@
+"""插件启动导入：只在首次请求或首次执行时才需要的模块不应在启动时加载"""
+
+import sys
+import json
+import subprocess
+
+from benchmarks import comfy_stubs
+from benchmarks.comfy_stubs import REPO_ROOT
+
+DEFERRED_MODULES = ("requests", "urllib3", "watchdog") + tuple(
+    f"{comfy_stubs.PACKAGE_NAME}.{name}" for name in (
+        "lora_api", "lora_warmup", "lora_keymap", "lora_weight_cache", "shared_weight_cache",
+        "lora_bake", "persistent_cache", "sidecars",
+    )
+)
+
+_IMPORT_SCRIPT = (
+    "import os, sys, json, tempfile\n"
+    "os.environ['EASY_SETTING_WATCH_MODE'] = 'off'\n"
+    "from benchmarks import comfy_stubs\n"
+    "workdir = tempfile.mkdtemp()\n"
+    "comfy_stubs.install_stubs([workdir], workdir)\n"
+    "before = set(sys.modules)\n"
+    "comfy_stubs.load_package()\n"
+    "print(json.dumps(sorted(set(sys.modules) - before)))\n"
+)
+
+
+def test_deferred_modules_not_loaded_at_startup() -> None:
+    result = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded = sorted(
+        name for name in modules
+        if any(name == module or name.startswith(module + ".") for module in DEFERRED_MODULES)
+    )
+    assert loaded == []
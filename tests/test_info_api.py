@@ -0,0 +1,66 @@
+"""信息接口"""
+
+import os
+import shutil
+import asyncio
+from typing import Any
+
+from benchmarks.fixtures import make_lora_library
+
+
+def test_concurrent_civitai_lookups_are_coalesced(lora_api: Any, lora_root: str, civitai: Any, with_client: Any) -> None:
+    name = make_lora_library(lora_root, 1)[0]
+    lora_api.lora_index.refresh(force=True)
+    lora_api.file_hash_cache.invalidate()
+
+    async def scenario(client: Any) -> Any:
+        async def get() -> int:
+            response = await client.get("/api/easy_setting/loras/info", params={"file": name, "civitai": "true"})
+            await response.read()
+            return response.status
+
+        return await asyncio.gather(*[get() for _ in range(16)])
+
+    statuses = with_client(scenario)
+    assert statuses == [200] * 16
+    assert civitai.request_count == 1
+
+
+def test_civitai_lookup_invalidates_other_etags(lora_api: Any, lora_root: str, civitai: Any,
+                                                with_client: Any) -> None:
+    name = make_lora_library(lora_root, 1)[0]
+    lora_api.lora_index.refresh(force=True)
+    lora_api.file_hash_cache.invalidate()
+
+    async def scenario(client: Any) -> Any:
+        url = "/api/easy_setting/loras/info"
+        response = await client.get(url, params={"file": name})
+        await response.read()
+        etag = response.headers["ETag"]
+
+        response = await client.get(url, params={"file": name, "civitai": "true"})
+        await response.read()
+
+        # 不查询 Civitai 的响应现在也包含哈希和 Civitai 数据，旧的 ETag 不能再命中
+        response = await client.get(url, params={"file": name}, headers={"If-None-Match": etag})
+        return response.status, await response.json()
+
+    status, data = with_client(scenario)
+    assert status == 200
+    assert data["sha256"] and data["images"]
+
+
+def test_copied_file_reuses_known_hash(lora_api: Any, lora_root: str, monkeypatch: Any) -> None:
+    name = make_lora_library(lora_root, 1)[0]
+    source = os.path.join(lora_root, name)
+    expected = lora_api.get_cached_file_hash(source)
+    assert expected
+
+    # 移动或复制后路径变化，按快速哈希找回已知的 SHA256，不再读取整个文件
+    copy = shutil.copy2(source, os.path.join(lora_root, "copy_" + os.path.basename(name)))
+
+    def unexpected(path: str, algorithm: str = "sha256") -> str:
+        raise AssertionError(f"re-hashed {path}")
+
+    monkeypatch.setattr(lora_api, "get_file_hash", unexpected)
+    assert lora_api.get_cached_file_hash(copy) == expected
@@ -0,0 +1,63 @@
+"""LoRA key 映射缓存"""
+
+import os
+from typing import Any, Dict, List
+
+from benchmarks import comfy_stubs
+from benchmarks.fixtures import write_lora
+
+
+def test_cached_key_map_produces_same_patches(submodule: Any, tmp_path: Any, monkeypatch: Any) -> None:
+    keymap = submodule("lora_keymap")
+    import comfy.lora
+    import comfy.utils
+
+    model, clip = comfy_stubs.make_model(unet_keys=500, clip_keys=80)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    lora_names = [comfy_stubs.unet_lora_name(k) for k in unet_keys[:16]]
+    loras = [
+        comfy.utils.load_torch_file(write_lora(os.path.join(tmp_path, f"keymap_{i}.safetensors"), lora_names, seed=i))
+        for i in range(3)
+    ]
+
+    builds = [0]
+    original = comfy.lora.model_lora_keys_unet
+
+    def counting(*args: Any, **kwargs: Any) -> Dict[str, str]:
+        builds[0] += 1
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(comfy.lora, "model_lora_keys_unet", counting)
+
+    def apply_stack() -> List[Any]:
+        current_model, current_clip = model, clip
+        for lora in loras:
+            current_model, current_clip = keymap.load_lora_for_models(current_model, current_clip, lora, 0.8, 0.6)
+        return sorted(current_model.patches)
+
+    monkeypatch.setattr(keymap, "KEY_MAP_CACHE", False)
+    expected = apply_stack()
+    assert expected
+
+    monkeypatch.setattr(keymap, "KEY_MAP_CACHE", True)
+    keymap.lora_key_maps.clear()
+    assert apply_stack() == expected
+    builds[0] = 0
+    assert apply_stack() == expected
+    # 缓存命中时不再遍历模型的 state dict
+    assert builds[0] == 0
+
+
+def test_cache_only_applies_to_plugin_calls(submodule: Any) -> None:
+    keymap = submodule("lora_keymap")
+    import comfy.lora
+
+    model, clip = comfy_stubs.make_model(unet_keys=100, clip_keys=10)
+    keymap.lora_key_maps.clear()
+    keymap.load_lora_for_models(model, clip, {}, 1.0, 1.0)
+    assert len(keymap.lora_key_maps) == 2
+
+    # 插件调用之外（ComfyUI 自身的 LoraLoader 等）仍然每次重新生成映射
+    keymap.lora_key_maps.clear()
+    key_map = comfy.lora.model_lora_keys_unet(model.model, {})
+    assert key_map and len(keymap.lora_key_maps) == 0
@@ -0,0 +1,40 @@
+"""列表接口"""
+
+from typing import Any
+
+from benchmarks.fixtures import make_lora_library
+
+
+def _get_list(with_client: Any, **params: Any) -> Any:
+    async def scenario(client: Any) -> Any:
+        response = await client.get("/api/easy_setting/loras/list", params=params)
+        return response.status, await response.json()
+
+    return with_client(scenario)
+
+
+def test_list_without_limit_returns_every_entry(lora_api: Any, lora_root: str, with_client: Any,
+                                                monkeypatch: Any) -> None:
+    names = make_lora_library(lora_root, 12, per_dir=5)
+    lora_api.lora_index.refresh(force=True)
+    # 页大小上限只限制显式指定的 limit
+    monkeypatch.setattr(lora_api, "LIST_MAX_LIMIT", 5)
+
+    status, data = _get_list(with_client, fields="name")
+    assert status == 200
+    assert data["total"] == len(names)
+    assert sorted(item["name"] for item in data["items"]) == sorted(names)
+
+    status, data = _get_list(with_client, fields="name", limit=100, offset=10)
+    assert status == 200
+    assert data["total"] == len(names) and len(data["items"]) == 2
+
+    status, data = _get_list(with_client, fields="name", limit=100)
+    assert len(data["items"]) == 5
+
+
+def test_list_rejects_negative_paging(lora_root: str, with_client: Any) -> None:
+    for params in ({"limit": -1}, {"offset": -1}, {"limit": "x"}):
+        status, data = _get_list(with_client, **params)
+        assert status == 400, params
+        assert "error" in data
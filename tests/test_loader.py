@@ -0,0 +1,216 @@
+"""Power LoRA Loader：加载、解析和烘焙堆栈"""
+
+import os
+import hashlib
+from typing import Any, Dict, List
+
+import pytest
+
+from benchmarks import comfy_stubs
+from benchmarks.fixtures import write_blob, write_large_lora, write_lora
+
+
+def _widgets(items: List[Any]) -> Dict[str, Any]:
+    return {
+        f"lora_{i + 1}": {"on": True, "lora": name, "strength": sm, "strengthTwo": sc}
+        for i, (name, sm, sc) in enumerate(items)
+    }
+
+
+def test_hash_on_load_records_hash(loader: Any, lora_api: Any, submodule: Any, tmp_path: Any,
+                                   monkeypatch: Any) -> None:
+    pytest.importorskip("torch")
+    store = submodule("persistent_cache")
+    metrics = submodule("lora_metrics")
+    path = write_large_lora(os.path.join(tmp_path, "large.safetensors"), 8)
+    with open(path, "rb") as f:
+        expected = hashlib.sha256(f.read()).hexdigest()
+    store.hash_store.discard(path)
+    lora_api.file_hash_cache.invalidate(path)
+    monkeypatch.setattr(loader, "HASH_ON_LOAD", True)
+
+    lora = loader.load_lora_file(path)
+    assert lora
+    hashed = metrics.phase_seconds.count("hash")
+    # 信息接口直接使用加载时计算的哈希，不再读取文件
+    assert lora_api.get_cached_file_hash(path) == expected
+    assert metrics.phase_seconds.count("hash") == hashed
+
+
+def test_index_resolves_stack_without_stat(submodule: Any, lora_root: str, monkeypatch: Any) -> None:
+    index = submodule("lora_index").lora_index
+    names = [f"resolve_{i}.safetensors" for i in range(8)]
+    for i, name in enumerate(names):
+        write_blob(os.path.join(lora_root, name), 256, seed=i)
+    index.refresh(force=True)
+
+    calls = [0]
+    original = os.stat
+
+    def counting_stat(*args: Any, **kwargs: Any) -> Any:
+        calls[0] += 1
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", counting_stat)
+    entries, missing = index.resolve_many(names, refresh=False)
+    assert sorted(entries) == sorted(names) and not missing
+    assert calls[0] == 0
+
+
+def test_strict_mode_reports_all_missing_loras(loader: Any, submodule: Any, lora_root: str,
+                                               monkeypatch: Any) -> None:
+    index_module = submodule("lora_index")
+    present = write_blob(os.path.join(lora_root, "present.safetensors"), 256)
+    index_module.lora_index.refresh(force=True)
+    missing = ["missing_a.safetensors", "missing_b.safetensors", "missing_c.safetensors"]
+    widgets = _widgets([(os.path.basename(present), 1.0, 1.0)] + [(name, 1.0, 1.0) for name in missing])
+    model, clip = comfy_stubs.make_model(unet_keys=100, clip_keys=10)
+
+    monkeypatch.setattr(loader, "STRICT_LORAS", True)
+    with pytest.raises(index_module.MissingLorasError) as excinfo:
+        loader.PowerLoraLoader().load_loras(model, clip, **widgets)
+    assert excinfo.value.names == missing
+
+
+@pytest.fixture
+def bake_stack_files(lora_root: str, submodule: Any) -> Any:
+    """3 个 rank 4 的 LoRA（UNet 和 CLIP 模块都有）以及对应的模型替身"""
+    pytest.importorskip("torch")
+    model, clip = comfy_stubs.make_model(unet_keys=200, clip_keys=40)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    clip_keys = [k for k in clip.cond_stage_model.state_dict() if k.endswith(".weight")]
+    lora_names = ([comfy_stubs.unet_lora_name(k) for k in unet_keys[:16]]
+                  + [comfy_stubs.clip_lora_name(k) for k in clip_keys[:4]])
+    stack = []
+    for i in range(3):
+        name = f"bake_{i}.safetensors"
+        write_lora(os.path.join(lora_root, name), lora_names, rank=4, dim=32, seed=100 + i)
+        stack.append((name, round(0.5 + 0.1 * i, 2), 0.4))
+    submodule("lora_index").lora_index.refresh(force=True)
+    return stack, lora_names, model, clip
+
+
+def test_bake_is_exact_up_to_summed_rank(submodule: Any, lora_root: str, bake_stack_files: Any,
+                                         with_client: Any) -> None:
+    bake = submodule("lora_bake")
+    import comfy.utils
+    stack, lora_names, _, _ = bake_stack_files
+
+    async def scenario(client: Any) -> Any:
+        results = []
+        for _ in range(2):
+            response = await client.post("/api/easy_setting/loras/bake",
+                                         json={"loras": [list(item) for item in stack], "rank": 12})
+            assert response.status == 200
+            results.append(await response.json())
+        return results
+
+    first, second = with_client(scenario)
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert first["energy"] == 1.0
+
+    sources = [(comfy.utils.load_torch_file(os.path.join(lora_root, name)), sm, sc) for name, sm, sc in stack]
+    baked = comfy.utils.load_torch_file(first["path"])
+    for module in lora_names:
+        # 合成 LoRA 的 alpha 等于秩，缩放系数为 1
+        expected = sum(
+            (sc if bake.is_clip_module(module) else sm)
+            * (lora[f"{module}.lora_up.weight"] @ lora[f"{module}.lora_down.weight"])
+            for lora, sm, sc in sources
+        )
+        actual = baked[f"{module}.lora_up.weight"].float() @ baked[f"{module}.lora_down.weight"].float()
+        assert ((actual - expected).norm() / expected.norm()).item() < 1e-2
+
+
+def test_bake_shares_file_hash_cache(lora_api: Any, submodule: Any, lora_root: str, bake_stack_files: Any,
+                                     monkeypatch: Any) -> None:
+    bake = submodule("lora_bake")
+    stack = bake_stack_files[0]
+    paths = [os.path.join(lora_root, name) for name, _, _ in stack]
+    lora_api.file_hash_cache.invalidate()
+    # 信息接口已经算过的哈希，烘焙时不再读取文件
+    hashes = [lora_api.get_cached_file_hash(path) for path in paths]
+
+    def unexpected(path: str, algorithm: str = "sha256") -> str:
+        raise AssertionError(f"re-hashed {path}")
+
+    monkeypatch.setattr(lora_api, "get_file_hash", unexpected)
+    result = bake.bake_stack(stack, rank=4, has_clip=True)
+    assert [source["sha256"] for source in result["sources"]] == hashes
+
+
+def test_loader_applies_baked_stack(loader: Any, submodule: Any, bake_stack_files: Any, monkeypatch: Any) -> None:
+    bake = submodule("lora_bake")
+    stack, _, model, clip = bake_stack_files
+    bake.bake_stack(stack, rank=12, has_clip=True)
+    widgets = _widgets(stack)
+
+    for substitute, patches in ((False, len(stack)), (True, 1)):
+        monkeypatch.setattr(bake, "BAKED_STACKS", substitute)
+        patched = loader.PowerLoraLoader().load_loras(model, clip, **widgets)[0]
+        assert max(len(p) for p in patched.patches.values()) == patches
+
+
+def test_model_only_bake_matches_loader(loader: Any, submodule: Any, bake_stack_files: Any, monkeypatch: Any,
+                                        with_client: Any) -> None:
+    bake = submodule("lora_bake")
+    stack, _, model, _ = bake_stack_files
+    monkeypatch.setattr(bake, "BAKED_STACKS", True)
+
+    async def scenario(client: Any) -> Any:
+        response = await client.post("/api/easy_setting/loras/bake",
+                                     json={"loras": [list(item) for item in stack], "rank": 12, "has_clip": False})
+        assert response.status == 200
+        return await response.json()
+
+    assert with_client(scenario)["has_clip"] is False
+    # 没有 CLIP 的工作流按相同的方式规范化堆栈，能找到上面的烘焙文件
+    patched = loader.PowerLoraLoader().load_loras(model, None, **_widgets(stack))[0]
+    assert max(len(p) for p in patched.patches.values()) == 1
+
+
+def test_truncated_bake_is_not_substituted(loader: Any, submodule: Any, bake_stack_files: Any,
+                                           monkeypatch: Any) -> None:
+    bake = submodule("lora_bake")
+    stack, _, model, clip = bake_stack_files
+    monkeypatch.setattr(bake, "BAKED_STACKS", True)
+    # rank 2 远小于各秩之和（3 x 4），保留的能量低于阈值
+    assert bake.bake_stack(stack, rank=2, has_clip=True)["energy"] < bake.BAKE_MIN_ENERGY
+
+    patched = loader.PowerLoraLoader().load_loras(model, clip, **_widgets(stack))[0]
+    assert max(len(p) for p in patched.patches.values()) == len(stack)
+
+
+def test_known_hash_skips_fused_read(loader: Any, submodule: Any, tmp_path: Any, monkeypatch: Any) -> None:
+    pytest.importorskip("torch")
+    import comfy.utils
+    store = submodule("persistent_cache")
+    sidecars = submodule("sidecars")
+    path = write_large_lora(os.path.join(tmp_path, "known.safetensors"), 1)
+    with open(path, "rb") as f:
+        expected = hashlib.sha256(f.read()).hexdigest()
+    with open(sidecars.sidecar_paths(path)["sha256"], "w") as f:
+        f.write(f"{expected} *known.safetensors\n")
+    store.hash_store.discard(path)
+    monkeypatch.setattr(loader, "HASH_ON_LOAD", True)
+
+    calls = []
+    original = comfy.utils.load_torch_file
+
+    def counting_load(*args: Any, **kwargs: Any) -> Any:
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(comfy.utils, "load_torch_file", counting_load)
+    assert loader.load_lora_file(path)
+    # 旁路文件中已有哈希：直接用 load_torch_file，不读入整个文件计算哈希
+    assert len(calls) == 1
+    stat = os.stat(path)
+    assert store.hash_store.get(path, (stat.st_mtime_ns, stat.st_size)) == expected
+
+
+def test_loading_locks_are_released(loader: Any, tmp_path: Any) -> None:
+    pytest.importorskip("torch")
+    path = write_large_lora(os.path.join(tmp_path, "locks.safetensors"), 1)
+    loader.load_lora_weights(path)
+    assert loader._loading_locks == {}
@@ -0,0 +1,86 @@
+"""跨进程共享的权重缓存：段文件的复用和淘汰"""
+
+import os
+import gc
+from typing import Any, Dict
+
+import pytest
+
+from benchmarks.fixtures import write_large_lora
+
+
+@pytest.fixture
+def shared(submodule: Any) -> Any:
+    pytest.importorskip("torch")
+    module = submodule("shared_weight_cache")
+    if module.fcntl is None:
+        pytest.skip("需要 fcntl")
+    return module
+
+
+def _stamp(path: str) -> Any:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def test_second_cache_attaches_without_parsing(shared: Any, loader: Any, tmp_path: Any) -> None:
+    path = write_large_lora(os.path.join(tmp_path, "shared.safetensors"), 2, seed=1)
+    directory = os.path.join(tmp_path, "shm")
+    loads = []
+
+    def load(p: str) -> Dict[str, Any]:
+        loads.append(p)
+        return loader.load_lora_file(p)
+
+    first = shared.SharedWeightCache(directory).get_or_load(path, _stamp(path), load)
+    second = shared.SharedWeightCache(directory).get_or_load(path, _stamp(path), load)
+    assert loads == [path]
+    assert first.keys() == second.keys()
+    assert all(first[k].equal(second[k]) for k in first)
+
+
+def test_held_segment_survives_eviction(shared: Any, loader: Any, tmp_path: Any) -> None:
+    paths = [write_large_lora(os.path.join(tmp_path, f"shared_{i}.safetensors"), 2, seed=300 + i)
+             for i in range(3)]
+    # 预算只够一个半 LoRA
+    cache = shared.SharedWeightCache(os.path.join(tmp_path, "shm"), max_bytes=os.path.getsize(paths[0]) * 3 // 2)
+    assert cache.enabled
+
+    def get(path: str) -> Dict[str, Any]:
+        return cache.get_or_load(path, _stamp(path), loader.load_lora_file)
+
+    def exists(path: str) -> bool:
+        return os.path.exists(cache.segment_path(path, _stamp(path)))
+
+    held = get(paths[0])
+    get(paths[1])
+    gc.collect()
+    # paths[1] 已无人使用，加入 paths[2] 时被淘汰；paths[0] 仍被持有，必须保留
+    get(paths[2])
+    gc.collect()
+    assert exists(paths[0]) and not exists(paths[1])
+
+    del held
+    gc.collect()
+    assert cache.evict() == 1 and not exists(paths[0])
+
+
+def test_precision_keeps_segment_held(shared: Any, loader: Any, submodule: Any, tmp_path: Any,
+                                      monkeypatch: Any) -> None:
+    weight_cache = submodule("lora_weight_cache")
+    path = write_large_lora(os.path.join(tmp_path, "shared_fp16.safetensors"), 2, seed=400)
+    local = weight_cache.LoraWeightCache(max_bytes=1 << 30, precision="fp16")
+    cache = shared.SharedWeightCache(os.path.join(tmp_path, "shm"))
+    monkeypatch.setattr(weight_cache, "lora_weight_cache", local)
+    monkeypatch.setattr(shared, "shared_weight_cache", cache)
+
+    # 段文件已是缓存精度，本地缓存直接保存映射的权重，段文件在被缓存期间不能被淘汰
+    assert isinstance(loader.load_lora_weights(path), shared.SharedStateDict)
+    gc.collect()
+    cache.max_bytes = 0
+    segment = cache.segment_path(path, _stamp(path), local.precision)
+    assert cache.evict() == 0 and os.path.exists(segment)
+
+    local.invalidate()
+    gc.collect()
+    assert cache.evict() == 1 and not os.path.exists(segment)
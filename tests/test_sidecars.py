@@ -0,0 +1,72 @@
+"""旁路元数据文件"""
+
+import os
+import json
+import hashlib
+from typing import Any
+
+from benchmarks.fake_civitai import make_model_version
+from benchmarks.fixtures import write_blob
+
+
+def _cold_info(lora_api: Any, submodule: Any, path: str, name: str) -> Any:
+    submodule("persistent_cache").hash_store.discard(path)
+    submodule("sidecars").sidecar_reader.invalidate(path)
+    lora_api.file_hash_cache.invalidate(path)
+    return lora_api.get_lora_info(name, fetch_civitai=True)
+
+
+def test_sidecars_replace_hashing_and_lookup(lora_api: Any, submodule: Any, lora_root: str, civitai: Any) -> None:
+    sidecars = submodule("sidecars")
+    name = "with_sidecars.safetensors"
+    path = write_blob(os.path.join(lora_root, name), 1 << 20, seed=1)
+    with open(path, "rb") as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()
+    paths = sidecars.sidecar_paths(path)
+    with open(paths["sha256"], "w") as f:
+        f.write(f"{file_hash.upper()} *{name}\n")
+    with open(paths["civitai"], "w") as f:
+        json.dump(make_model_version(file_hash), f)
+    lora_api.lora_index.refresh(force=True)
+
+    info = _cold_info(lora_api, submodule, path, name)
+    assert info["baseModel"] == "SDXL 1.0"
+    assert civitai.request_count == 0
+
+
+def test_sidecar_writer(lora_api: Any, submodule: Any, lora_root: str, civitai: Any, monkeypatch: Any) -> None:
+    sidecars = submodule("sidecars")
+    monkeypatch.setattr(sidecars, "SIDECAR_WRITE", True)
+    name = "without_sidecars.safetensors"
+    path = write_blob(os.path.join(lora_root, name), 1 << 20, seed=2)
+    lora_api.lora_index.refresh(force=True)
+
+    info = _cold_info(lora_api, submodule, path, name)
+    assert info["baseModel"] == "SDXL 1.0"
+    assert civitai.request_count == 1
+    paths = sidecars.sidecar_paths(path)
+    assert os.path.exists(paths["sha256"]) and os.path.exists(paths["civitai"])
+
+
+def test_civitai_hash_requires_matching_file(submodule: Any, tmp_path: Any) -> None:
+    sidecars = submodule("sidecars")
+    path = write_blob(os.path.join(tmp_path, "pruned.safetensors"), 1 << 20, seed=3)
+    stat = os.stat(path)
+    data = make_model_version("ab" * 32)
+    # 同一版本的另一个文件（主文件，大小不同）不能当作这个文件的哈希
+    data["files"] = [{"name": "full.safetensors", "primary": True, "sizeKB": 4096.0,
+                      "hashes": {"SHA256": "AB" * 32}}]
+    civitai_path = sidecars.sidecar_paths(path)["civitai"]
+
+    def read() -> Any:
+        with open(civitai_path, "w") as f:
+            json.dump(data, f)
+        sidecars.sidecar_reader.invalidate(path)
+        return sidecars.sidecar_reader.read(path, stat.st_mtime_ns, stat.st_size)
+
+    result = read()
+    assert "civitai" in result and "sha256" not in result
+
+    data["files"].append({"name": "renamed.safetensors", "sizeKB": stat.st_size / 1024,
+                          "hashes": {"SHA256": "CD" * 32}})
+    assert read()["sha256"] == "cd" * 32
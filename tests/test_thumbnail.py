@@ -0,0 +1,89 @@
+"""Civitai 预览图缩略图"""
+
+import os
+from typing import Any, List
+from urllib.parse import quote
+
+import pytest
+
+from benchmarks.fixtures import make_lora_library, make_png
+
+
+@pytest.fixture
+def thumbs(submodule: Any, lora_api: Any, civitai: Any, tmp_path: Any, monkeypatch: Any) -> Any:
+    """只够保存两张缩略图的缓存，图片地址允许指向本地替身"""
+    thumbnail = submodule("thumbnail_cache")
+    pytest.importorskip("PIL")
+    monkeypatch.setattr(thumbnail, "ALLOWED_IMAGE_HOSTS", ("127.0.0.1",))
+    cache = thumbnail.ThumbnailCache(os.path.join(tmp_path, "thumbnails"))
+    probe, _ = thumbnail.make_thumbnail(make_png(*civitai.image_size), cache.size)
+    cache.max_bytes = len(probe) * 2 + len(probe) // 2
+    monkeypatch.setattr(lora_api, "thumbnail_cache", cache)
+    return cache
+
+
+def test_thumbnails_are_cached_and_evicted(lora_api: Any, lora_root: str, civitai: Any, thumbs: Any,
+                                           with_client: Any) -> None:
+    name = make_lora_library(lora_root, 1)[0]
+    lora_api.lora_index.refresh(force=True)
+
+    async def scenario(client: Any) -> Any:
+        response = await client.get("/api/easy_setting/loras/info", params={"file": name, "civitai": "true"})
+        urls: List[str] = [image["url"] for image in (await response.json())["images"]]
+        assert urls and all(url.startswith("/api/easy_setting/thumbnail?") for url in urls)
+
+        before = civitai.request_count
+        for url in urls:
+            response = await client.get(url, allow_redirects=False)
+            assert response.status == 200
+            assert response.content_type.startswith("image/")
+            await response.read()
+        downloads = civitai.request_count - before
+
+        # 缓存上限只够两张，最近的一张仍在缓存中
+        response = await client.get(urls[-1], allow_redirects=False)
+        await response.read()
+        assert "immutable" in response.headers.get("Cache-Control", "")
+        etag = response.headers["ETag"]
+        response = await client.get(urls[-1], headers={"If-None-Match": etag}, allow_redirects=False)
+        assert response.status == 304
+        return len(urls), downloads, civitai.request_count - before
+
+    count, downloads, total = with_client(scenario)
+    assert downloads == count
+    # 已缓存的缩略图不会重新下载
+    assert total == downloads
+    assert thumbs.total_bytes <= thumbs.max_bytes
+
+
+def test_redirects_are_checked_against_allowlist(civitai: Any, thumbs: Any) -> None:
+    image = f"{civitai.base_url}/images/redirected.png"
+    path, content_type, _ = thumbs.fetch(f"{civitai.base_url}/redirect?to={quote(image, safe='')}")
+    assert os.path.exists(path) and content_type.startswith("image/")
+
+    # 跳转到不在允许列表中的主机（同一个替身服务器，换用 localhost 访问）
+    outside = image.replace("127.0.0.1", "localhost")
+    before = civitai.request_count
+    with pytest.raises(ValueError):
+        thumbs.fetch(f"{civitai.base_url}/redirect?to={quote(outside, safe='')}")
+    assert civitai.request_count == before + 1
+
+
+def test_open_breaker_skips_download(submodule: Any, civitai: Any, thumbs: Any, monkeypatch: Any) -> None:
+    client_module = submodule("civitai_client")
+    client = client_module.CivitaiClient(base_url=civitai.base_url, failure_threshold=1, cooldown=60.0)
+    monkeypatch.setattr(submodule("thumbnail_cache"), "civitai_client", client)
+    image = f"{civitai.base_url}/images/breaker.png"
+
+    # 图床返回 5xx 也计入熔断
+    monkeypatch.setattr(civitai, "failure_rate", 1.0)
+    with pytest.raises(Exception):
+        thumbs.fetch(image)
+    assert client.state == "open"
+
+    monkeypatch.setattr(civitai, "failure_rate", 0.0)
+    before = civitai.request_count
+    with pytest.raises(client_module.CivitaiUnavailable):
+        thumbs.fetch(image)
+    assert civitai.request_count == before
+    client.close()
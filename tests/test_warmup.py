@@ -0,0 +1,124 @@
+"""预热接口：预热后的第一个任务不再读取文件"""
+
+import os
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from benchmarks import comfy_stubs
+from benchmarks.fixtures import write_lora
+
+
+@pytest.fixture
+def warm_names(lora_root: str, submodule: Any, monkeypatch: Any) -> List[str]:
+    pytest.importorskip("torch")
+    # 默认预算只保留最后一个 LoRA，预热多个需要更大的预算
+    monkeypatch.setattr(submodule("lora_weight_cache").lora_weight_cache, "max_bytes", 256 << 20)
+    model, _ = comfy_stubs.make_model(unet_keys=200, clip_keys=40)
+    unet_keys = [k for k in model.model.state_dict() if k.endswith(".weight")]
+    lora_names = [comfy_stubs.unet_lora_name(k) for k in unet_keys[:16]]
+    names = []
+    for i in range(4):
+        name = f"warm_{i}.safetensors"
+        write_lora(os.path.join(lora_root, name), lora_names, rank=4, dim=32, seed=400 + i)
+        names.append(name)
+    submodule("lora_index").lora_index.refresh(force=True)
+    return names
+
+
+def test_warmed_job_reads_no_files(loader: Any, submodule: Any, warm_names: List[str], with_client: Any,
+                                   monkeypatch: Any) -> None:
+    file_loads: List[str] = []
+    original_load = loader.load_lora_file
+
+    def counting_load(path: str) -> Dict[str, Any]:
+        file_loads.append(path)
+        return original_load(path)
+
+    monkeypatch.setattr(loader, "load_lora_file", counting_load)
+    submodule("lora_weight_cache").lora_weight_cache.invalidate()
+
+    async def scenario(client: Any) -> Any:
+        response = await client.post("/api/easy_setting/loras/warm", json={"loras": warm_names, "wait": True})
+        return response.status, await response.json()
+
+    status, data = with_client(scenario)
+    assert status == 200 and data["ready"] == len(warm_names)
+
+    model, clip = comfy_stubs.make_model(unet_keys=200, clip_keys=40)
+    widgets = {f"lora_{i + 1}": {"on": True, "lora": name, "strength": 1.0}
+               for i, name in enumerate(warm_names)}
+    before = len(file_loads)
+    loader.PowerLoraLoader().load_loras(model, clip, **widgets)
+    assert len(file_loads) == before
+
+
+def test_async_warm_reports_progress(submodule: Any, warm_names: List[str], with_client: Any) -> None:
+    submodule("lora_weight_cache").lora_weight_cache.invalidate()
+
+    async def scenario(client: Any) -> Any:
+        response = await client.post("/api/easy_setting/loras/warm", json={"loras": warm_names})
+        status = response.status
+        data = await response.json()
+        for _ in range(1000):
+            if not data["pending"]:
+                break
+            await asyncio.sleep(0.005)
+            response = await client.get("/api/easy_setting/loras/warm", params={"names": ",".join(warm_names)})
+            data = await response.json()
+        return status, data
+
+    status, data = with_client(scenario)
+    # 小文件可能在返回前就已加载完成
+    assert status in (200, 202)
+    assert data["ready"] == len(warm_names) and not data["pending"]
+
+
+def test_zero_budget_warms_only_first_lora(submodule: Any, warm_names: List[str], with_client: Any,
+                                           monkeypatch: Any) -> None:
+    cache = submodule("lora_weight_cache").lora_weight_cache
+    cache.invalidate()
+    monkeypatch.setattr(cache, "max_bytes", 0)
+
+    async def scenario(client: Any) -> Any:
+        response = await client.post("/api/easy_setting/loras/warm", json={"loras": warm_names, "wait": True})
+        return await response.json()
+
+    data = with_client(scenario)
+    assert [item["status"] for item in data["loras"]] == ["ready"] + ["over_budget"] * (len(warm_names) - 1)
+
+
+def test_budget_uses_cache_precision(submodule: Any, warm_names: List[str], with_client: Any,
+                                     monkeypatch: Any) -> None:
+    weight_cache = submodule("lora_weight_cache")
+    path = submodule("lora_index").lora_index.resolve(warm_names[0]).path
+    # 文件是 fp32，预算只够两个文件大小，按 fp16 缓存时能放下四个
+    cache = weight_cache.LoraWeightCache(max_bytes=os.path.getsize(path) * 2, precision="fp16")
+    assert cache.estimate_nbytes(path, os.path.getsize(path)) < os.path.getsize(path) * 0.6
+    monkeypatch.setattr(submodule("lora_warmup").lora_warmer, "cache", cache)
+    monkeypatch.setattr(weight_cache, "lora_weight_cache", cache)
+
+    async def scenario(client: Any) -> Any:
+        response = await client.post("/api/easy_setting/loras/warm", json={"loras": warm_names, "wait": True})
+        return await response.json()
+
+    data = with_client(scenario)
+    assert [item["status"] for item in data["loras"]] == ["ready"] * len(warm_names)
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_model_only_stack_warms_baked_file(submodule: Any, warm_names: List[str], with_client: Any,
+                                           monkeypatch: Any) -> None:
+    bake = submodule("lora_bake")
+    monkeypatch.setattr(bake, "BAKED_STACKS", True)
+    stack = [[name, 0.8, 0.5] for name in warm_names[:2]]
+    baked = bake.bake_stack([tuple(item) for item in stack], rank=8, has_clip=False)
+
+    async def scenario(client: Any) -> Any:
+        response = await client.post("/api/easy_setting/loras/warm",
+                                     json={"loras": stack, "wait": True, "has_clip": False})
+        return await response.json()
+
+    data = with_client(scenario)
+    assert [(item["name"], item["baked"]) for item in data["loras"]] == [(os.path.basename(baked["path"]), True)]
@@ -0,0 +1,37 @@
+"""文件监听：系统通知模式只重新扫描发生事件的目录"""
+
+import os
+from typing import Any, List
+
+from benchmarks.fixtures import make_lora_library, write_lora
+
+
+def test_events_rescan_only_dirty_directories(submodule: Any, lora_root: str, monkeypatch: Any) -> None:
+    index_module = submodule("lora_index")
+    watcher_module = submodule("lora_watcher")
+    make_lora_library(lora_root, 6, per_dir=2)
+    index = index_module.lora_index
+    index.refresh(force=True)
+    watcher = watcher_module.LoraWatcher(index, mode="off")
+
+    stats: List[str] = []
+    original_stat = os.stat
+
+    def counting_stat(path: Any, *args: Any, **kwargs: Any) -> Any:
+        stats.append(os.fsdecode(path))
+        return original_stat(path, *args, **kwargs)
+
+    # 新建的子目录（尚未索引）中写入文件，事件只标记这个目录
+    directory = os.path.join(lora_root, "new", "nested")
+    os.makedirs(directory)
+    write_lora(os.path.join(directory, "evented.safetensors"), ["lora_unet_a"])
+    watcher.mark_dirty(directory)
+
+    monkeypatch.setattr(index_module.os, "stat", counting_stat)
+    watcher.poll_once(full=False)
+    monkeypatch.setattr(index_module.os, "stat", original_stat)
+
+    assert index.get(os.path.join("new", "nested", "evented.safetensors"), refresh=False) is not None
+    # 其他已索引的子目录没有被逐个 stat
+    scanned = {path for path in stats if os.path.isdir(path)}
+    assert scanned <= {lora_root, os.path.join(lora_root, "new"), directory}
@@ -0,0 +1,42 @@
+"""LoRA 权重缓存"""
+
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+from benchmarks.fixtures import write_lora
+
+torch = pytest.importorskip("torch")
+
+LORA_NAMES = [f"lora_unet_blocks_{i}_attn_to_q" for i in range(8)]
+
+
+def _deltas(lora: Dict[str, Any]) -> List[Any]:
+    return [lora[f"{name}.lora_up.weight"].float() @ lora[f"{name}.lora_down.weight"].float() for name in LORA_NAMES]
+
+
+@pytest.mark.parametrize("precision, max_rel", [("fp16", 1e-3), ("bf16", 1e-2)])
+def test_half_precision_halves_memory(submodule: Any, tmp_path: Any, precision: str, max_rel: float) -> None:
+    weight_cache = submodule("lora_weight_cache")
+    import comfy.utils
+
+    path = write_lora(os.path.join(tmp_path, "fp32.safetensors"), LORA_NAMES, rank=16, dim=64)
+    original = comfy.utils.load_torch_file(path, safe_load=True)
+    cache = weight_cache.LoraWeightCache(max_bytes=1 << 30, precision=precision)
+    cached = cache.put(path, (0, 0), original)
+
+    assert cache.get(path, (0, 0)) is cached
+    assert cache.total_bytes <= weight_cache.state_dict_nbytes(original) * 0.55
+    for expected, actual in zip(_deltas(original), _deltas(cached)):
+        assert ((actual - expected).abs().max() / expected.abs().max()).item() <= max_rel
+
+
+def test_budget_keeps_most_recent_entry(submodule: Any) -> None:
+    weight_cache = submodule("lora_weight_cache")
+    cache = weight_cache.LoraWeightCache(max_bytes=0)
+    cache.put("a.safetensors", (1, 1), {"w": torch.zeros(4)})
+    cache.put("b.safetensors", (1, 1), {"w": torch.zeros(4)})
+    assert "b.safetensors" in cache and "a.safetensors" not in cache
+    # 文件变化后失效
+    assert cache.get("b.safetensors", (2, 1)) is None
@@ -0,0 +1,308 @@
+"""
+Civitai 预览图缩略图代理
+每张远程图片只下载一次，缩小后按内容哈希保存在磁盘上，
+总大小超过上限时按最近访问时间淘汰。信息接口返回的图片地址会改写为本地代理地址。
+
+本模块只在需要时加载 requests 和 PIL。
+"""
+
+import os
+import atexit
+import hashlib
+import io
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote, urljoin, urlsplit
+
+from .civitai_client import civitai_client
+from .persistent_cache import get_data_dir, read_json_file, write_json_file
+from .easy_setting_utils import get_env_setting
+
+logger = logging.getLogger(__name__)
+
+# 缩略图最长边（像素）
+THUMBNAIL_SIZE = get_env_setting("EASY_SETTING_THUMBNAIL_SIZE", 320)
+# 缩略图缓存总大小上限（MB）
+THUMBNAIL_CACHE_MB = get_env_setting("EASY_SETTING_THUMBNAIL_CACHE_MB", 256)
+# 单张原图的最大下载大小（字节），防止误下载视频或超大文件
+THUMBNAIL_MAX_DOWNLOAD = 32 << 20
+THUMBNAIL_TIMEOUT = 15  # 秒
+# 下载原图时最多跟随的重定向次数（每一跳都要通过主机检查）
+THUMBNAIL_MAX_REDIRECTS = 5
+# 索引两次写盘之间的最小间隔（秒）
+THUMBNAIL_INDEX_SAVE_INTERVAL = 5.0
+# 只代理这些主机（及其子域名）的图片，避免被用作任意地址的请求代理
+ALLOWED_IMAGE_HOSTS = ("civitai.com",)
+
+THUMBNAIL_ROUTE = "/api/easy_setting/thumbnail"
+# 浏览器可以永久缓存：同一个远程地址对应的图片不会变化
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+}
+
+# Civitai 图片地址中的尺寸参数，如 /width=450/ 或 /original=true/
+_CIVITAI_SIZE_SEGMENT = re.compile(r"/(?:width=\d+|original=true)/")
+
+
+def is_allowed_image_url(url: str) -> bool:
+    """检查地址是否允许被代理"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        return False
+    return any(host == allowed or host.endswith("." + allowed) for allowed in ALLOWED_IMAGE_HOSTS)
+
+
+def thumbnail_url(url: str) -> str:
+    """远程图片地址对应的本地代理地址"""
+    return f"{THUMBNAIL_ROUTE}?url={quote(url, safe='')}"
+
+
+def sized_source_url(url: str, size: int = THUMBNAIL_SIZE) -> str:
+    """让 Civitai 图床直接返回较小的图片，减少下载量（其他地址原样返回）"""
+    if urlsplit(url).hostname == "image.civitai.com":
+        return _CIVITAI_SIZE_SEGMENT.sub(f"/width={size}/", url, count=1)
+    return url
+
+
+def make_thumbnail(data: bytes, size: int = THUMBNAIL_SIZE) -> Tuple[bytes, str]:
+    """
+    缩小图片
+
+    Returns:
+        (图片数据, 扩展名)；未安装 PIL 或无法解码时返回原始数据
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, _sniff_extension(data)
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+                image.save(output, format="PNG", optimize=True)
+                return output.getvalue(), "png"
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.save(output, format="JPEG", quality=85)
+            return output.getvalue(), "jpg"
+    except Exception as e:
+        logger.debug(f"无法生成缩略图，保存原图: {e}")
+        return data, _sniff_extension(data)
+
+
+def _sniff_extension(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return "jpg"
+
+
+class ThumbnailCache:
+    """
+    按内容哈希存储的缩略图缓存
+
+    - 远程地址 -> 缩略图内容哈希 的索引保存在 index.json，记录最近访问时间
+    - 缩略图文件保存为 blobs/<前两位>/<sha256>.<扩展名>，相同图片只存一份
+    - 总大小超过上限时，从最久未访问的地址开始淘汰，没有引用的文件随之删除
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = THUMBNAIL_CACHE_MB << 20,
+        size: int = THUMBNAIL_SIZE,
+        save_interval: float = THUMBNAIL_INDEX_SAVE_INTERVAL
+    ) -> None:
+        self._directory = directory
+        self.max_bytes = max_bytes
+        self.size = size
+        self.save_interval = save_interval
+        # 地址键 -> [内容哈希, 扩展名, 字节数, 最近访问时间]
+        self._index: Optional[Dict[str, list]] = None
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            self._directory = os.path.join(get_data_dir(), "thumbnails")
+        return self._directory
+
+    def _url_key(self, url: str) -> str:
+        return hashlib.sha1(f"{self.size}:{url}".encode("utf-8")).hexdigest()
+
+    def _blob_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], f"{digest}.{ext}")
+
+    def _load(self) -> Dict[str, list]:
+        # 调用方持有锁
+        if self._index is None:
+            data = read_json_file(os.path.join(self.directory, "index.json"))
+            self._index = data if isinstance(data, dict) else {}
+        return self._index
+
+    def get(self, url: str) -> Optional[Tuple[str, str, str]]:
+        """
+        查找已缓存的缩略图
+
+        Returns:
+            (文件路径, Content-Type, 内容哈希)，没有缓存时返回 None
+        """
+        key = self._url_key(url)
+        with self._lock:
+            record = self._load().get(key)
+            if record is None:
+                return None
+            digest, ext = record[0], record[1]
+            path = self._blob_path(digest, ext)
+            if not os.path.exists(path):
+                # 文件被外部删除
+                del self._index[key]
+                self._dirty = True
+                return None
+            record[3] = time.time()
+            self._dirty = True
+        self._maybe_flush()
+        return path, CONTENT_TYPES.get(ext, "application/octet-stream"), digest
+
+    def fetch(self, url: str) -> Tuple[str, str, str]:
+        """
+        下载图片、生成缩略图并写入缓存
+
+        Returns:
+            与 get() 相同
+
+        Raises:
+            ValueError: 地址（或重定向后的地址）不允许代理、重定向次数过多或图片过大
+            requests.RequestException: 下载失败
+        """
+        if not is_allowed_image_url(url):
+            raise ValueError(f"Image host not allowed: {url}")
+
+        with self._open(sized_source_url(url, self.size)) as response:
+            response.raise_for_status()
+            chunks = []
+            total = 0
+            for chunk in response.iter_content(1 << 16):
+                total += len(chunk)
+                if total > THUMBNAIL_MAX_DOWNLOAD:
+                    raise ValueError(f"Image too large: {url}")
+                chunks.append(chunk)
+        data, ext = make_thumbnail(b"".join(chunks), self.size)
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._load()[self._url_key(url)] = [digest, ext, len(data), time.time()]
+            self._dirty = True
+            self._evict()
+        self._maybe_flush()
+        return path, CONTENT_TYPES.get(ext, "application/octet-stream"), digest
+
+    def _open(self, url: str):
+        """
+        发出下载请求，手动跟随重定向，每一跳的地址都要通过 is_allowed_image_url
+
+        Returns:
+            最终的 requests.Response（stream=True，调用方负责关闭）
+
+        Raises:
+            CivitaiUnavailable: 熔断中，没有发出请求
+        """
+        # 复用 Civitai 客户端的连接池，并经过同一个熔断：上游不可用时直接失败，不再等待超时
+        for _ in range(THUMBNAIL_MAX_REDIRECTS + 1):
+            response = civitai_client.request(
+                "GET", url, read_timeout=THUMBNAIL_TIMEOUT, stream=True, allow_redirects=False
+            )
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers["Location"])
+            if not is_allowed_image_url(url):
+                raise ValueError(f"Image redirected to a host that is not allowed: {url}")
+        raise ValueError(f"Too many redirects: {url}")
+
+    def _evict(self) -> None:
+        # 调用方持有锁
+        blobs: Dict[Tuple[str, str], int] = {}
+        for digest, ext, nbytes, _ in self._index.values():
+            blobs[(digest, ext)] = nbytes
+        total = sum(blobs.values())
+        if total <= self.max_bytes:
+            return
+
+        refs: Dict[Tuple[str, str], int] = {}
+        for digest, ext, _, _ in self._index.values():
+            refs[(digest, ext)] = refs.get((digest, ext), 0) + 1
+        # 保留最近写入的一项，即使它本身超过上限
+        for key, record in sorted(self._index.items(), key=lambda item: item[1][3])[:-1]:
+            if total <= self.max_bytes:
+                break
+            del self._index[key]
+            blob = (record[0], record[1])
+            refs[blob] -= 1
+            if refs[blob] == 0:
+                total -= blobs[blob]
+                try:
+                    os.remove(self._blob_path(*blob))
+                except OSError:
+                    pass
+
+    @property
+    def total_bytes(self) -> int:
+        """缓存中缩略图文件的总大小"""
+        with self._lock:
+            return sum({(r[0], r[1]): r[2] for r in self._load().values()}.values())
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """将索引写入磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {key: list(record) for key, record in self._index.items()}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            write_json_file(os.path.join(self.directory, "index.json"), snapshot)
+        except OSError as e:
+            logger.warning(f"无法写入缩略图索引: {e}")
+            with self._lock:
+                self._dirty = True
+
+
+# 全局缩略图缓存实例
+thumbnail_cache = ThumbnailCache()
+
+# 退出前保存索引中最近的访问时间
+atexit.register(thumbnail_cache.flush)